@@ -3,22 +3,19 @@ from typing import Dict
 
 import jwt
 
-from server.init import Settings
+from server.init import settings
 
 
 def token_response(token: str):
     return {"access_token": token}
 
 
-secret_key = Settings().secret_key
-
-
 def sign_jwt(user_id: str) -> Dict[str, str]:
     # Set the expiry time.
     payload = {"user_id": user_id, "expires": time.time() + 2400}
-    return token_response(jwt.encode(payload, secret_key, algorithm="HS256"))
+    return token_response(jwt.encode(payload, settings.SECRET_KEY, algorithm=settings.ALGORITHM))
 
 
 def decode_jwt(token: str) -> dict:
-    decoded_token = jwt.decode(token.encode(), secret_key, algorithms=["HS256"])
+    decoded_token = jwt.decode(token.encode(), settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
     return decoded_token if decoded_token["expires"] >= time.time() else {}
@@ -1,31 +1,69 @@
 from datetime import datetime, timezone
-from typing import List
+from typing import Optional
 from beanie import PydanticObjectId
 from fastapi import APIRouter, HTTPException, Body
 from models.Comment import Comment
+from models.Post import NOT_DELETED
 from models.User import User
 from middleware.response import CommonResponse
+from utils.cache import comment_cache
+from utils.cascade import cascade_worker
+from utils.comment_tree import list_comments
+from utils.export import ndjson_response, page_documents
+from utils.feed_cache import feed_cache
+from utils.invalidation import invalidate
+from utils.loader import comment_loader
+from utils.pagination import DEFAULT_PAGE_SIZE, clamp_limit
+from utils.time import format_datetime_now
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.get("", response_description="获取所有评论")
-async def get_comments() -> List[Comment]:
+@router.get("", response_description="分页获取评论列表")
+async def get_comments(cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
     try:
-        collection = Comment.get_motor_collection()
-        collection_exists = await collection.find_one()
-        
-        if not collection_exists:
-            return []
-
-        comments = await Comment.find_all().to_list()
-        return comments
+        # 带墓碑的评论等待级联删除，不再列出
+        comments, next_page = await page_documents(
+            Comment.get_motor_collection(), NOT_DELETED, None, cursor, clamp_limit(limit)
+        )
+        return CommonResponse(code=200, msg="success", data={"comments": comments, "nextCursor": next_page})
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
-        logger.error(f"Error in get_comments: {str(e)}")
+        logger.error("Error in get_comments: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/export", response_description="以 NDJSON 流式导出全部评论")
+async def export_comments():
+    return ndjson_response(Comment.get_motor_collection(), NOT_DELETED, None, "comments.ndjson")
+
+
+@router.get("/{id}/replies", response_description="分页获取评论的直接回复")
+async def get_comment_replies(id: str, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    try:
+        comment_id = PydanticObjectId(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid comment ID format")
+    try:
+        comment = await comment_cache.get(comment_id)
+        if not comment:
+            raise HTTPException(status_code=404, detail="Comment not found")
+        # 每条回复都带有自己的回复数，客户端按需继续展开子树
+        replies, next_page = await list_comments(comment.postId, comment_id, cursor, clamp_limit(limit))
+        return CommonResponse(
+            code=200,
+            msg="success",
+            data={"replies": replies, "nextCursor": next_page}
+        )
+    except HTTPException as http_exc:
+        raise http_exc
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logger.error("Error getting replies for comment %s: %s", id, e)
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.put("/{id}/like", response_description="点赞/取消点赞评论")
@@ -34,7 +72,7 @@ async def toggle_comment_like(id: str, currentuser_id: str):
         comment_id = PydanticObjectId(id)
         currentuser_id = PydanticObjectId(currentuser_id)
 
-        comment = await Comment.get(comment_id)
+        comment = await comment_loader.load(comment_id)
         if not comment:
             raise HTTPException(status_code=404, detail="Comment not found")
         user_collection = User.get_motor_collection()
@@ -51,7 +89,7 @@ async def toggle_comment_like(id: str, currentuser_id: str):
         await comment.save()
         return CommonResponse(code=200, msg="success", data={"comment": None})
     except Exception as e:
-        logger.error(f"Error toggling like: {str(e)}")
+        logger.error("Error toggling like: %s", e)
         raise HTTPException(status_code=500, detail="Invalid ID format")
 
 
@@ -60,11 +98,19 @@ async def toggle_comment_like(id: str, currentuser_id: str):
 async def delete_comment(id: str):
     try:
         comment_id = PydanticObjectId(id)
-        comment = await Comment.get(comment_id)
+        comment = await comment_loader.load(comment_id)
         if not comment:
             raise HTTPException(status_code=404, detail="Comment not found")
-        await comment.delete()
+        # 先写墓碑，读路径立即不可见；回复由后台任务级联删除
+        result = await Comment.get_motor_collection().update_one(
+            {"_id": comment_id, **NOT_DELETED}, {"$set": {"deletedAt": format_datetime_now()}}
+        )
+        invalidate("comment", comment_id)
+        invalidate("comments", comment.postId)
+        if result.modified_count:
+            feed_cache.invalidate_post(comment.postId)
+            cascade_worker.enqueue("comment", comment_id)
         return CommonResponse(code=200, msg="Delete success", data={"comment": None})
     except Exception as e:
-        logger.error(f"Error deleting comment: {str(e)}")
+        logger.error("Error deleting comment: %s", e)
         raise HTTPException(status_code=500, detail="Invalid comment ID format")
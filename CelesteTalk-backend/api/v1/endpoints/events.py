@@ -0,0 +1,46 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+import logging
+from middleware.response import CommonResponse
+from server.init import settings
+from utils.pubsub import FEED_TOPIC, broker, event_stream, is_valid_topic
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+# 单个连接最多订阅的主题数
+MAX_TOPICS = 100
+
+
+@router.get("/stream", response_description="订阅实时推送（SSE）")
+async def stream_events(topics: str = FEED_TOPIC):
+    # topics: 逗号分隔，如 "feed,post:<postId>,user:<userId>"
+    requested = [topic.strip() for topic in topics.split(",") if topic.strip()]
+    if not requested:
+        raise HTTPException(status_code=400, detail="At least one topic is required")
+    if len(requested) > MAX_TOPICS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_TOPICS} topics per connection")
+    invalid = [topic for topic in requested if not is_valid_topic(topic)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid topics: {', '.join(invalid)}")
+
+    async def body():
+        # 在开始发送响应时才订阅，保证断开时一定会执行退订
+        subscription = broker.subscribe(requested)
+        try:
+            async for chunk in event_stream(subscription, settings.EVENTS_HEARTBEAT):
+                yield chunk
+        finally:
+            # 客户端断开后退订
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/stats", response_description="实时推送统计")
+async def get_event_stats():
+    return CommonResponse(code=200, msg="success", data=broker.stats())
@@ -1,42 +1,45 @@
+from typing import Optional
 from fastapi import HTTPException, APIRouter
 from middleware.response import CommonResponse
 from models.Mail import Mail
 from models.Email import send_verify_code, generate_random_code,verify_code
+from utils.export import ndjson_response, page_documents
+from utils.pagination import DEFAULT_PAGE_SIZE, clamp_limit
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-@router.get("", response_description="获取所有验证码记录")
-async def get_mails():
+@router.get("", response_description="分页获取验证码记录")
+async def get_mails(cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
     try:
-        mails = await Mail.find_all().to_list()
-        if not mails:
-            return CommonResponse(
-                code=400,
-                msg="没有找到验证码记录",
-                data=[]
-            )
-        
-        # 直接返回列表数据
+        mails, next_page = await page_documents(
+            Mail.get_motor_collection(), {}, None, cursor, clamp_limit(limit)
+        )
         return CommonResponse(
             code=200,
             msg="获取验证码记录成功",
             data={
-                "total": len(mails),
-                "records": mails
+                "records": mails,
+                "nextCursor": next_page
             }
         )
-        
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
-        logger.error(f"获取验证码记录失败: {str(e)}")
+        logger.error("获取验证码记录失败: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"获取验证码记录失败: {str(e)}"
         )
 
 
+@router.get("/export", response_description="以 NDJSON 流式导出全部验证码记录")
+async def export_mails():
+    return ndjson_response(Mail.get_motor_collection(), {}, None, "mails.ndjson")
+
+
 @router.post("/verify", response_description="发送邮箱验证码")
 async def send_email_verify_code(data: dict):
     try:
@@ -61,7 +64,7 @@ async def send_email_verify_code(data: dict):
 
         # 保存到数据库
         await new_mail.insert()
-        logger.info(f"Mail record created successfully for {email}")
+        logger.info("Mail record created successfully for %s", email)
 
         # 发送邮件
         template_path = f"static/template/{type}-verify.html"
@@ -74,7 +77,7 @@ async def send_email_verify_code(data: dict):
         )
             
     except Exception as e:
-        logger.error(f"Error in send_email_verify_code: {str(e)}")
+        logger.error("Error in send_email_verify_code: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to send verification code: {str(e)}"
@@ -5,7 +5,8 @@ import logging
 from pydantic import ValidationError
 from middleware.response import CommonResponse
 from utils.file_handler import save_upload_file, get_media_type
-from models.User import User
+from utils.loader import user_loader
+from utils.time import format_datetime_now
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -31,12 +32,13 @@ async def create_post(
         user_id = data["_id"]
         type = data["type"]
         
-        user = await User.get(PydanticObjectId(user_id))
+        user = await user_loader.load(PydanticObjectId(user_id))
         
         if type == "avatar":
             user.avatar = file_path
         elif type == "header":
             user.headerImage = file_path
+        user.updatedAt = format_datetime_now()
         
         # 保存到数据库
         await user.save()
@@ -50,8 +52,8 @@ async def create_post(
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON format in data field")
     except ValidationError as ve:
-        logger.error(f"Validation error: {str(ve)}")
+        logger.error("Validation error: %s", ve)
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
-        logger.error(f"Error in create_post: {str(e)}")
+        logger.error("Error in create_post: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,82 @@
+from typing import Optional
+from beanie import PydanticObjectId
+from fastapi import APIRouter, HTTPException
+import logging
+from middleware.response import CommonResponse
+from models.Notification import Notification
+from utils.notifications import notification_text
+from utils.pagination import DEFAULT_PAGE_SIZE, clamp_limit, cursor_filter, cursor_sort, next_cursor
+from utils.post_data import author_data, load_authors, parse_ids
+from utils.read_routing import read_router
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+def notification_data(notification: dict, authors: dict) -> dict:
+    return {
+        "_id": str(notification["_id"]),
+        "type": notification["type"],
+        "targetId": str(notification["targetId"]) if notification.get("targetId") else None,
+        "actors": [author_data(authors.get(actor_id), actor_id) for actor_id in notification.get("actorIds", [])],
+        "actorCount": notification.get("actorCount", 0),
+        "text": notification_text(notification, authors),
+        "read": notification.get("read", False),
+        "createdAt": notification["createdAt"].isoformat(),
+        "updatedAt": notification["updatedAt"].isoformat(),
+    }
+
+
+def parse_user_id(userId: str) -> PydanticObjectId:
+    try:
+        return PydanticObjectId(userId)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid user ID format")
+
+
+@router.get("/{userId}", response_description="分页获取用户的通知收件箱")
+async def get_notifications(userId: str, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    # 按最近更新倒序；合并了新操作的未读通知会移到最前
+    user_id = parse_user_id(userId)
+    try:
+        limit = clamp_limit(limit)
+        collection = read_router.collection(Notification, "notifications")
+        query = {"userId": user_id}
+        query.update(cursor_filter(cursor, ascending=False, field="updatedAt"))
+        rows = await collection.find(query).sort(
+            cursor_sort(ascending=False, field="updatedAt")
+        ).limit(limit).to_list(length=None)
+        unread = await collection.count_documents({"userId": user_id, "read": False})
+        authors = await load_authors(actor_id for row in rows for actor_id in row.get("actorIds", []))
+        return CommonResponse(
+            code=200,
+            msg="success",
+            data={
+                "notifications": [notification_data(row, authors) for row in rows],
+                "unreadCount": unread,
+                "nextCursor": next_cursor(rows, limit, field="updatedAt")
+            }
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logger.error("Error getting notifications for user %s: %s", userId, e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{userId}/read", response_description="标记通知为已读")
+async def mark_notifications_read(userId: str, data: Optional[dict] = None):
+    # data{"ids": ["str"]}，不传 ids 时全部标记为已读；已读的通知不再合并新操作
+    user_id = parse_user_id(userId)
+    query = {"userId": user_id, "read": False}
+    if data and data.get("ids") is not None:
+        ids = parse_ids(data["ids"])
+        if None in ids:
+            raise HTTPException(status_code=400, detail="Invalid notification ID format")
+        query["_id"] = {"$in": ids}
+    try:
+        result = await Notification.get_motor_collection().update_many(query, {"$set": {"read": True}})
+        return CommonResponse(code=200, msg="success", data={"updated": result.modified_count})
+    except Exception as e:
+        logger.error("Error marking notifications read for user %s: %s", userId, e)
+        raise HTTPException(status_code=500, detail=str(e))
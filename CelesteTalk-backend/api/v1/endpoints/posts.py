@@ -1,26 +1,66 @@
-from datetime import timezone, timedelta
 from beanie import PydanticObjectId
-from fastapi import APIRouter, HTTPException, Form, UploadFile
+from fastapi import APIRouter, HTTPException, Form, UploadFile, Request, Response
 from fastapi.encoders import jsonable_encoder
 import json
-from math import exp
-from models.Post import Post, Media
+import time
+from typing import Optional
+from models.Post import NOT_DELETED, Post, Media
 from models.Comment import Comment
 from models.User import User
+from models.PostTag import PostTag
 import logging
 from pydantic import ValidationError
-from middleware.response import CommonResponse
+from middleware.response import CommonResponse, render_response
 from utils.time import format_datetime_now
 from utils.file_handler import save_upload_file, get_media_type
+from utils.cache import comment_list_cache, post_cache, user_cache
+from utils.comment_tree import list_comments
+from utils.cascade import cascade_worker
+from utils.counters import inc_user_counters
+from utils.pagination import DEFAULT_PAGE_SIZE, clamp_limit, cursor_filter, cursor_sort, next_cursor
+from utils.post_data import (
+    MAX_BATCH_SIZE, author_data, comment_counts, embed_references, hydrate_posts, last_change, load_authors,
+    load_reference_cards, parse_ids, reference_ids, reference_versions
+)
+from utils.read_models import PostRead
+from utils.http_cache import conditional_response, make_etag
+from utils.ranking import CANDIDATE_PIPELINE, candidate_columns, hot_scores, top_k_indices
+from utils.engagement_buffer import engagement_buffer
+from utils.feed_cache import feed_cache
+from utils.invalidation import invalidate
+from utils.loader import comment_loader, post_loader, user_loader
+from utils.notifications import notification_queue
+from utils.pubsub import FEED_TOPIC, broker, post_topic, user_topic
+from utils.read_routing import (
+    CAUSAL_TOKEN_HEADER, causal_read_session, causal_write_session, encode_causal_token, find_routed, read_router
+)
+from utils.text import normalize_tag
+from utils.trending import index_post_tags
+from utils.uploads import upload_manager
+from utils.view_counter import view_buffer
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+def publish_post_created(post: Post):
+    """向主页和作者主题推送新帖子"""
+    delta = {
+        "postId": str(post.id),
+        "authorId": str(post.authorId),
+        "isRepost": post.isRepost,
+        "originalPost": str(post.originalPost) if post.isRepost else None,
+        "createdAt": post.createdAt.isoformat()
+    }
+    broker.publish(FEED_TOPIC, "post.created", delta)
+    broker.publish(user_topic(post.authorId), "post.created", delta)
+
+
 @router.post("", response_description="发布帖子")
 async def create_post(
+    response: Response,
     files: list[UploadFile]  = [],
-    data: str = Form(..., description="包含authorId、content等信息的JSON字符串")
+    data: str = Form(..., description="包含authorId、content、mediaIds等信息的JSON字符串")
 ):
     try:
         # 解析JSON字符串
@@ -55,6 +95,12 @@ async def create_post(
                         type=media_type,
                         url=file_path
                     ))
+
+        # 引用已通过分片上传完成的媒体，发帖只写元数据
+        if post_data.get("mediaIds"):
+            media_list.extend(await upload_manager.media_for(
+                PydanticObjectId(post_data["_id"]), parse_ids(post_data["mediaIds"])
+            ))
         
         # 创建新帖子
         new_post = Post(
@@ -70,11 +116,19 @@ async def create_post(
         if "replyTo" in post_data:
             new_post.replyTo = PydanticObjectId(post_data["replyTo"])
             
-        # 保存到数据库
-        await new_post.create()
+        # 保存到数据库，返回写入令牌，作者带着令牌读取时即使读从节点也能看到这条帖子
+        async with causal_write_session() as session:
+            await new_post.create(session=session)
+            causal_token = encode_causal_token(session)
+        if causal_token:
+            response.headers[CAUSAL_TOKEN_HEADER] = causal_token
+        # 新帖子可能进入主页任意一页
+        feed_cache.invalidate_all()
+        await inc_user_counters(new_post.authorId, postsCount=1)
+        await index_post_tags(new_post)
         
         # 获取作者信息
-        author = await User.get(PydanticObjectId(post_data["_id"]))
+        author = await user_loader.load(PydanticObjectId(post_data["_id"]))
         
         post_data = jsonable_encoder(new_post)
         post_data["author"] = {
@@ -88,6 +142,9 @@ async def create_post(
             "shares": 0,
             "views": 0
         }
+
+        # 推送新帖子的增量，客户端按需拉取完整内容
+        publish_post_created(new_post)
         
         return CommonResponse(
             code=200,
@@ -98,26 +155,80 @@ async def create_post(
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON format in data field")
     except ValidationError as ve:
-        logger.error(f"Validation error: {str(ve)}")
+        logger.error("Validation error: %s", ve)
         raise HTTPException(status_code=400, detail=str(ve))
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logger.error("Error in create_post: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/batch", response_description="按ID批量获取帖子")
+async def get_posts_batch(data: dict):
+    # data{"ids": ["str", ...]}
+    raw_ids = data.get("ids")
+    if not isinstance(raw_ids, list) or not raw_ids:
+        raise HTTPException(status_code=400, detail="ids must be a non-empty list")
+    if len(raw_ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} ids per request")
+    try:
+        ids = parse_ids(raw_ids)
+        # 一次 $in 查询加载所有帖子，再批量补全作者和评论数
+        rows = await Post.get_motor_collection().find(
+            {"_id": {"$in": list({post_id for post_id in ids if post_id})}, **NOT_DELETED}
+        ).to_list(length=None)
+        posts = [PostRead.from_raw(row) for row in rows]
+        posts_data = {post_data["_id"]: post_data for post_data in await hydrate_posts(posts)}
+
+        # 按请求顺序返回，未命中的位置为 null
+        results = [posts_data.get(str(post_id)) if post_id else None for post_id in ids]
+        missing = [raw_id for raw_id, result in zip(raw_ids, results) if result is None]
+        return CommonResponse(
+            code=200,
+            msg="success",
+            data={"posts": results, "missing": missing}
+        )
     except Exception as e:
-        logger.error(f"Error in create_post: {str(e)}")
+        logger.error("Error in get_posts_batch: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/{postId}", response_description="获取指定帖子")
-async def get_post(postId: str):
+async def get_post(postId: str, request: Request, response: Response):
     try:
         post_id = PydanticObjectId(postId)
-        post = await Post.get(post_id)
-        if not post:
+        # 原始文档和评论数都走缓存，未变化时在解析和补全数据之前返回 304
+        raw = await post_cache.get_raw(post_id)
+        if not raw:
             raise HTTPException(status_code=404, detail="Post not found")
+
+        # 获取评论数，任一评论变更时失效
+        comments_count = await comment_list_cache.get(
+            post_id, "count", lambda: Comment.find(Comment.postId == post_id, NOT_DELETED).count()
+        )
+
+        # 响应中嵌入了作者资料和引用帖子的卡片，它们的版本也计入 ETag
+        author_raw = await user_cache.get_raw(raw["authorId"])
+        author_version = author_raw["updatedAt"] if author_raw else None
+        ref_versions = await reference_versions([raw])
+        etag = make_etag(
+            post_id, raw["updatedAt"], raw.get("views", 0),
+            comments_count, engagement_buffer.pending_version(post_id), author_version, *ref_versions
+        )
+        last_modified = last_change(
+            raw["updatedAt"], author_version, *(date for version in ref_versions for date in version[1:])
+        )
+        not_modified = conditional_response(request, response, "get_post", etag, last_modified)
+        if not_modified:
+            return not_modified
+
+        post = post_cache.parse(raw)
+        # 叠加本进程中尚未落库的点赞和转发
+        engagement_buffer.apply_pending(post)
         
         # 获取作者信息
-        author = await User.get(post.authorId)
-        
-        # 获取评论数
-        comments_count = await Comment.find(Comment.postId == post_id).count()
+        author = await user_cache.get(post.authorId)
         
         # 构建返回数据
         post_data = jsonable_encoder(post)
@@ -130,12 +241,15 @@ async def get_post(postId: str):
             "likes": len(post.likes),
             "comments": comments_count,
             "shares": post.repostCount,
-            "views": 0
+            "views": post.views
         }
+        embed_references(post_data, post, await load_reference_cards([post]))
         
         return CommonResponse(code=200, msg="success", data={"post": post_data})
+    except HTTPException as http_exc:
+        raise http_exc
     except Exception as e:
-        logger.error(f"Error getting post {postId}: {str(e)}")
+        logger.error("Error getting post %s: %s", postId, e)
         raise HTTPException(status_code=400, detail="Invalid post ID format")
 
 
@@ -144,7 +258,7 @@ async def delete_post(postId: str, data: dict):
     try:
         post_id = PydanticObjectId(postId)
         curr_user = PydanticObjectId(data["_id"])
-        post = await Post.get(post_id)
+        post = await post_loader.load(post_id)
         if not post:
             raise HTTPException(status_code=404, detail="Post not found")
         # 验证当前用户是否为帖子作者
@@ -153,7 +267,15 @@ async def delete_post(postId: str, data: dict):
                 status_code=403,
                 detail="You don't have permission to delete this post"
             )
-        await post.delete()
+        # 先写墓碑，读路径立即不可见；评论、转发、话题和文件由后台任务级联删除
+        result = await Post.get_motor_collection().update_one(
+            {"_id": post_id, **NOT_DELETED}, {"$set": {"deletedAt": format_datetime_now()}}
+        )
+        invalidate("post", post_id)
+        if result.modified_count:
+            await inc_user_counters(post.authorId, postsCount=-1)
+            feed_cache.invalidate_post(post_id)
+            cascade_worker.enqueue("post", post_id)
         return CommonResponse(
             code=200,
             msg="success",
@@ -163,28 +285,54 @@ async def delete_post(postId: str, data: dict):
         raise HTTPException(status_code=400, detail="Invalid post ID format")
 
 
+@router.post("/{postId}/view", response_description="记录帖子浏览")
+async def record_view(postId: str, request: Request, data: Optional[dict] = None):
+    try:
+        post_id = PydanticObjectId(postId)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid post ID format")
+    # 登录用户按用户ID去重，匿名访客按IP去重
+    viewer = (data or {}).get("_id") or (request.client.host if request.client else "anonymous")
+    # 只写入内存缓冲区，由后台任务批量落库
+    view_buffer.record(post_id, str(viewer))
+    return CommonResponse(code=200, msg="success", data=None)
+
+
 @router.put("/{postId}/like", response_description="点赞帖子")
 async def toggle_like(postId: str, data: dict):
     try:
         post_id = PydanticObjectId(postId)
         user_id = PydanticObjectId(data["_id"])
-        post = await Post.get(post_id)
+        post = await post_loader.load(post_id)
         if not post:
             raise HTTPException(status_code=404, detail="Post not found")
 
-        if user_id in post.likes:
-            return CommonResponse(code=401, msg="You have already liked this post", data={"post": post})
-        else:
-            post.likes.append(user_id)
+        # 以缓冲区中尚未落库的状态为准
+        liked = engagement_buffer.pending_like(post_id, user_id)
+        if liked is None:
+            liked = user_id in post.likes
+        if liked:
+            return CommonResponse(
+                code=401,
+                msg="You have already liked this post",
+                data={"post": engagement_buffer.apply_pending(post)}
+            )
 
+        # 写入缓冲区，由后台任务与其他点赞合并后批量落库
+        engagement_buffer.set_like(post_id, user_id, True)
+        notification_queue.emit(post.authorId, "like", user_id, post_id)
+        feed_cache.invalidate_post(post_id)
+        engagement_buffer.apply_pending(post)
+        broker.publish(post_topic(post_id), "post.liked", {
+            "postId": str(post_id), "userId": str(user_id), "likes": len(post.likes)
+        })
         post.updatedAt = format_datetime_now()
-        await post.save()
 
         # 获取作者信息
-        author = await User.get(post.authorId)
+        author = await user_loader.load(post.authorId)
 
         # 获取评论数
-        comments_count = await Comment.find(Comment.postId == post_id).count()
+        comments_count = await Comment.find(Comment.postId == post_id, NOT_DELETED).count()
 
         # 构建返回数据
         post_data = jsonable_encoder(post)
@@ -197,12 +345,12 @@ async def toggle_like(postId: str, data: dict):
             "likes": len(post.likes),
             "comments": comments_count,
             "shares": post.repostCount,
-            "views": 0
+            "views": post.views
         }
 
         return CommonResponse(code=200, msg="success", data={"post": post_data})
     except Exception as e:
-        logger.error(f"Error toggling like for post {postId}: {str(e)}")
+        logger.error("Error toggling like for post %s: %s", postId, e)
         raise HTTPException(status_code=400, detail="Invalid ID format")
     
     
@@ -211,23 +359,35 @@ async def toggle_like(postId: str, data: dict):
     try:
         post_id = PydanticObjectId(postId)
         user_id = PydanticObjectId(data["_id"])
-        post = await Post.get(post_id)
+        post = await post_loader.load(post_id)
         if not post:
             raise HTTPException(status_code=404, detail="Post not found")
 
-        if user_id in post.likes:
-            post.likes.remove(user_id)
-        else:
-            return CommonResponse(code=401, msg="You haven't liked this post", data={"post": post})
+        # 以缓冲区中尚未落库的状态为准
+        liked = engagement_buffer.pending_like(post_id, user_id)
+        if liked is None:
+            liked = user_id in post.likes
+        if not liked:
+            return CommonResponse(
+                code=401,
+                msg="You haven't liked this post",
+                data={"post": engagement_buffer.apply_pending(post)}
+            )
 
+        # 写入缓冲区，由后台任务与其他操作合并后批量落库
+        engagement_buffer.set_like(post_id, user_id, False)
+        feed_cache.invalidate_post(post_id)
+        engagement_buffer.apply_pending(post)
+        broker.publish(post_topic(post_id), "post.unliked", {
+            "postId": str(post_id), "userId": str(user_id), "likes": len(post.likes)
+        })
         post.updatedAt = format_datetime_now()
-        await post.save()
 
         # 获取作者信息
-        author = await User.get(post.authorId)
+        author = await user_loader.load(post.authorId)
 
         # 获取评论数
-        comments_count = await Comment.find(Comment.postId == post_id).count()
+        comments_count = await Comment.find(Comment.postId == post_id, NOT_DELETED).count()
 
         # 构建返回数据
         post_data = jsonable_encoder(post)
@@ -240,24 +400,25 @@ async def toggle_like(postId: str, data: dict):
             "likes": len(post.likes),
             "comments": comments_count,
             "shares": post.repostCount,
-            "views": 0
+            "views": post.views
         }
 
         return CommonResponse(code=200, msg="success", data={"post": post_data})
     except Exception as e:
-        logger.error(f"Error toggling like for post {postId}: {str(e)}")
+        logger.error("Error toggling like for post %s: %s", postId, e)
         raise HTTPException(status_code=400, detail="Invalid ID format")
     
     
 @router.post("/{postId}/repost", response_description="发布转发帖子")
 async def repost_post(
     postId: str,
-    data: dict
+    data: dict,
+    response: Response
 ):
     try:
         # 验证并获取原帖
         original_post_id = PydanticObjectId(postId)
-        original_post = await Post.get(original_post_id)
+        original_post = await post_loader.load(original_post_id)
         if not original_post:
             raise HTTPException(status_code=404, detail="Original post not found")
 
@@ -270,15 +431,28 @@ async def repost_post(
             createdAt=format_datetime_now(),
             updatedAt=format_datetime_now()
         )
-        await repost.insert()
-
-        # 更新原帖的转发计数
-        original_post.repostCount += 1
-        original_post.updatedAt = format_datetime_now()
-        await original_post.save()
+        async with causal_write_session() as session:
+            await repost.insert(session=session)
+            causal_token = encode_causal_token(session)
+        if causal_token:
+            response.headers[CAUSAL_TOKEN_HEADER] = causal_token
+        await inc_user_counters(repost.authorId, postsCount=1)
+        await index_post_tags(repost)
+
+        # 原帖的转发计数经缓冲区合并后批量更新
+        engagement_buffer.add_repost(original_post_id)
+        notification_queue.emit(original_post.authorId, "repost", repost.authorId, original_post_id)
+        # 转发帖是新帖子，同时改变了原帖的转发数
+        feed_cache.invalidate_all()
+        publish_post_created(repost)
+        broker.publish(post_topic(original_post_id), "post.reposted", {
+            "postId": str(original_post_id),
+            "repostId": str(repost.id),
+            "shares": engagement_buffer.apply_pending(original_post).repostCount
+        })
 
         # 获取作者信息
-        author = await User.get(PydanticObjectId(data["_id"]))
+        author = await user_loader.load(PydanticObjectId(data["_id"]))
         if not author:
             raise HTTPException(status_code=404, detail="Author not found")
 
@@ -302,35 +476,65 @@ async def repost_post(
             data={"post": repost_data}
         )
     except Exception as e:
-        logger.error(f"Error in repost_post: {str(e)}")
+        logger.error("Error in repost_post: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/user/{userId}", response_description="获取用户的帖子")
-async def get_user_posts(userId: str):
+async def get_user_posts(userId: str, request: Request, response: Response):
     try:
         # 验证用户ID格式
         user_id = PydanticObjectId(userId)
         
+        # 先读取用户和帖子的版本信息，生成列表的组合版本
+        user_version = await User.get_motor_collection().find_one(
+            {"_id": user_id}, {"updatedAt": 1}
+        )
+        if not user_version:
+            raise HTTPException(status_code=404, detail="User not found")
+        versions = await Post.get_motor_collection().find(
+            {"authorId": user_id, **NOT_DELETED}, {"updatedAt": 1, "views": 1, "originalPost": 1, "replyTo": 1}
+        ).sort("createdAt", -1).to_list(length=None)
+        
+        # 获取每个帖子的评论数
+        comments_counts = await comment_counts([version["_id"] for version in versions])
+        # 转发和回复嵌入的引用卡片
+        ref_versions = await reference_versions(versions)
+        
+        etag = make_etag(user_id, user_version["updatedAt"], *[
+            (
+                version["_id"], version["updatedAt"], version.get("views", 0),
+                comments_counts.get(version["_id"], 0), engagement_buffer.pending_version(version["_id"])
+            )
+            for version in versions
+        ], *ref_versions)
+        last_modified = last_change(
+            user_version["updatedAt"], *(version["updatedAt"] for version in versions),
+            *(date for version in ref_versions for date in version[1:])
+        )
+        not_modified = conditional_response(request, response, "get_user_posts", etag, last_modified)
+        if not_modified:
+            return not_modified
+        
         # 查询该用户的所有帖子,按创建时间倒序排列
-        posts = await Post.find(
-            Post.authorId == user_id
-        ).sort(-Post.createdAt).to_list()
+        rows = await Post.get_motor_collection().find(
+            {"authorId": user_id, **NOT_DELETED}
+        ).sort("createdAt", -1).to_list(length=None)
+        posts = [PostRead.from_raw(row) for row in rows]
         
         # 获取用户信息
-        user = await User.get(user_id)
+        user = await user_loader.load(user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # 获取评论数
-        comments_counts = await Comment.find(
-            {"postId": {"$in": [post.id for post in posts]}}
-        ).count()
+        # 一次批量加载所有转发和回复引用的帖子
+        cards = await load_reference_cards(posts)
         
         # 构建返回数据
         posts_with_authors = []
         for post in posts:
-            post_data = jsonable_encoder(post)
+            engagement_buffer.apply_pending(post)
+            post_data = post.to_dict()
             post_data["author"] = {
                 "username": user.username,
                 "handle": userId,
@@ -338,11 +542,11 @@ async def get_user_posts(userId: str):
             }
             post_data["stats"] = {
                 "likes": len(post.likes),
-                "comments": comments_counts,
+                "comments": comments_counts.get(post.id, 0),
                 "shares": post.repostCount,
-                "views": 0
+                "views": post.views
             }
-            posts_with_authors.append(post_data)
+            posts_with_authors.append(embed_references(post_data, post, cards))
         
         return CommonResponse(
             code=200,
@@ -351,11 +555,13 @@ async def get_user_posts(userId: str):
                 "posts": posts_with_authors
             }
         )
+    except HTTPException as http_exc:
+        raise http_exc
     except ValidationError as ve:
-        logger.error(f"Validation error for user {userId}: {str(ve)}")
+        logger.error("Validation error for user %s: %s", userId, ve)
         raise HTTPException(status_code=400, detail="Invalid user ID format")
     except Exception as e:
-        logger.error(f"Error getting posts for user {userId}: {str(e)}")
+        logger.error("Error getting posts for user %s: %s", userId, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -366,38 +572,28 @@ async def get_user_likes(userId: str):
         user_id = PydanticObjectId(userId)
         
         # 查询所有点赞用户中包含该用户 ID 的帖子
-        liked_posts = await Post.find(
-            {"likes": {"$in": [user_id]}}
-        ).sort(-Post.createdAt).to_list()
-        
-        # 获取所有作者 ID
-        author_ids = [post.authorId for post in liked_posts]
-        
-        # 查询所有作者信息
-        authors = await User.find(
-            {"_id": {"$in": author_ids}}
-        ).to_list()
+        liked_posts = await find_routed(
+            Post, "likes", {"likes": {"$in": [user_id]}, **NOT_DELETED}, sort=[("createdAt", -1)],
+            read_model=PostRead
+        )
         
-        # 创建作者字典
-        author_dict = {str(author.id): author for author in authors}
+        # 查询所有作者信息和评论数
+        author_dict = await load_authors(post.authorId for post in liked_posts)
+        counts = await comment_counts([post.id for post in liked_posts])
+        cards = await load_reference_cards(liked_posts)
         
         # 为每个帖子添加作者信息
         posts_with_authors = []
         for post in liked_posts:
-            post_data = jsonable_encoder(post)
-            author = author_dict.get(str(post.authorId))
-            post_data["author"] = {
-                "username": author.username if author else None,
-                "handle": str(post.authorId),
-                "avatar": author.avatar if author else None
-            }
+            post_data = post.to_dict()
+            post_data["author"] = author_data(author_dict.get(post.authorId), post.authorId)
             post_data["stats"] = {
                 "likes": len(post.likes),
-                "comments": await Comment.find(Comment.postId == post.id).count(),
+                "comments": counts.get(post.id, 0),
                 "shares": post.repostCount,
-                "views": 0
+                "views": post.views
             }
-            posts_with_authors.append(post_data)
+            posts_with_authors.append(embed_references(post_data, post, cards))
         
         return CommonResponse(
             code=200,
@@ -407,173 +603,158 @@ async def get_user_likes(userId: str):
             }
         )
     except ValidationError as ve:
-        logger.error(f"Validation error for user {userId}: {str(ve)}")
+        logger.error("Validation error for user %s: %s", userId, ve)
         raise HTTPException(status_code=400, detail="Invalid user ID format")
     except Exception as e:
-        logger.error(f"Error getting liked posts for user {userId}: {str(e)}")
+        logger.error("Error getting liked posts for user %s: %s", userId, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def build_home_feed(page: int, size: int, session=None) -> tuple:
+    """构建主页信息流，返回 (序列化后的响应体, 页面中的帖子ID)"""
+    # 只加载排序需要的紧凑列，而不是完整的帖子文档
+    candidates = await read_router.collection(Post, "feed").aggregate(
+        CANDIDATE_PIPELINE, session=session
+    ).to_list(length=None)
+
+    # 如果没有帖子，返回空列表
+    if not candidates:
+        return render_response({"posts": []}), []
+
+    # 向量化计算热度，只选出当前页需要的前 K 个帖子
+    ids, created, likes, reposts = candidate_columns(candidates)
+    scores = hot_scores(created, likes, reposts, int(time.time() * 1000))
+    winners = top_k_indices(scores, created, (page + 1) * size)[page * size:]
+    winner_ids = list(ids[winners])
+
+    # 只完整加载胜出的帖子，并保持排序
+    posts = await find_routed(
+        Post, "feed", {"_id": {"$in": winner_ids}, **NOT_DELETED}, session=session, read_model=PostRead
+    )
+    post_dict = {post.id: post for post in posts}
+    sorted_posts = [post_dict[post_id] for post_id in winner_ids if post_id in post_dict]
+
+    # 查询所有作者信息
+    author_dict = await load_authors(post.authorId for post in sorted_posts)
+    counts = await comment_counts([post.id for post in sorted_posts])
+    cards = await load_reference_cards(sorted_posts)
+
+    # 为每个帖子添加作者信息
+    posts_with_authors = []
+    for post in sorted_posts:
+        engagement_buffer.apply_pending(post)
+        post_data = {
+            "_id": str(post.id),
+            "authorId": str(post.authorId),
+            "content": post.content,
+            "createdAt": post.createdAt.isoformat(),
+            "isRepost": post.isRepost,
+            "originalPost": str(post.originalPost) if post.originalPost else None,
+            "media": [{"type": media.type, "url": media.url} for media in post.media] if post.media else [],
+            "likes": [str(like) for like in post.likes],
+            "repostCount": post.repostCount,
+            "replyTo": str(post.replyTo) if post.replyTo else None,
+            "updatedAt": post.updatedAt.isoformat(),
+            "author": author_data(author_dict.get(post.authorId), post.authorId),
+            "stats": {
+                "likes": len(post.likes),
+                "comments": counts.get(post.id, 0),
+                "shares": post.repostCount,
+                "views": post.views
+            }
+        }
+        posts_with_authors.append(embed_references(post_data, post, cards))
+
+    # 页面中嵌入的原帖被删除或变更时也要重建该页
+    page_ids = [post.id for post in sorted_posts] + reference_ids(sorted_posts)
+    return render_response({"posts": posts_with_authors}), page_ids
+
+
 @router.get("/home/", response_description="获取主页帖子")
-async def get_home_posts():
+async def get_home_posts(request: Request, page: int = 0, size: int = 50):
     try:
-        # 获取所有帖子,按创建时间倒序排列
-        posts = await Post.find().sort([
-            ("createdAt", -1)  # 按创建时间倒序
-        ]).to_list()
-        
-        # 如果没有帖子，返回空列表
-        if not posts:
-            return CommonResponse(
-                code=200,
-                msg="success",
-                data={
-                    "posts": []
-                }
-            )
-
-        # 获取所有作者 ID
-        author_ids = [post.authorId for post in posts]
-        
-        # 查询所有作者信息
-        authors = await User.find(
-            {"_id": {"$in": author_ids}}
-        ).to_list()
-        
-        # 创建作者字典
-        author_dict = {str(author.id): author for author in authors}
+        # 刚发过帖的作者带着写入令牌读取，绕过缓存并等待从节点追上这次写入
+        async with causal_read_session(request.headers.get(CAUSAL_TOKEN_HEADER)) as session:
+            if session is not None:
+                body, _ = await build_home_feed(page, size, session)
+                return Response(content=body, media_type="application/json")
+        # 信息流对所有匿名用户相同，直接返回缓存的响应体
+        body = await feed_cache.get((page, size), lambda: build_home_feed(page, size))
+        return Response(content=body, media_type="application/json")
 
-        # 为返回的帖子计算热度分数
-        now = format_datetime_now()
-        scored_posts = []
-        
-        for post in posts:
-            try:
-                # 计算帖子热度
-                likes_count = len(post.likes) if post.likes else 0
-                repost_count = post.repostCount if post.repostCount else 0
-                
-                # 热度计算公式: 点赞数 * 1 + 转发数 * 2
-                heat_score = likes_count + (repost_count * 2)
-                
-                # 将UTC时间转换为东八区时间
-                post_time = post.createdAt.replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=8)))
-                
-                # 计算时间差（小时）
-                time_diff = (now - post_time).total_seconds() / 3600
-                time_decay = exp(-time_diff / 72)  # 3天衰减周期
-                
-                final_score = heat_score * time_decay
-                
-                scored_posts.append({
-                    'post': post,
-                    'score': final_score
-                })
-                
-            except Exception as e:
-                logger.error(f"处理帖子评分时出错: {str(e)}")
-                continue
-        
-        # 按分数排序
-        sorted_posts = sorted(
-            scored_posts,
-            key=lambda x: x['score'],
-            reverse=True
+    except Exception as e:
+        logger.error("获取主页帖子失败: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"获取主页帖子失败: {str(e)}"
         )
-        
-        # 为每个帖子添加作者信息
-        posts_with_authors = []
-        for item in sorted_posts:
-            post = item['post']
-            author = author_dict.get(str(post.authorId))
-            post_data = {
-                "_id": str(post.id),
-                "authorId": str(post.authorId),
-                "content": post.content,
-                "createdAt": post.createdAt.isoformat(),
-                "isRepost": post.isRepost,
-                "media": [{"type": media.type, "url": media.url} for media in post.media] if post.media else [],
-                "likes": [str(like) for like in post.likes],
-                "repostCount": post.repostCount,
-                "replyTo": str(post.replyTo) if post.replyTo else None,
-                "updatedAt": post.updatedAt.isoformat(),
-                "author": {
-                    "username": author.username if author else None,
-                    "handle": str(post.authorId),
-                    "avatar": author.avatar if author else None
-                },
-                "stats": {
-                    "likes": len(post.likes),
-                    "comments": await Comment.find(Comment.postId == post.id).count(),
-                    "shares": post.repostCount,
-                    "views": 0
-                }
-            }
-            posts_with_authors.append(post_data)
-        
+
+
+@router.get("/tags/{tag}", response_description="按话题或提及分页获取帖子")
+async def get_tag_posts(tag: str, kind: str = "hashtag", cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    # kind: hashtag 为 #话题，mention 为 @用户名；按帖子创建时间倒序
+    if kind not in ("hashtag", "mention"):
+        raise HTTPException(status_code=400, detail="kind must be hashtag or mention")
+    try:
+        limit = clamp_limit(limit)
+        query = {"kind": kind, "tag": normalize_tag(tag)}
+        query.update(cursor_filter(cursor, ascending=False))
+        rows = await PostTag.get_motor_collection().find(
+            query, {"postId": 1, "createdAt": 1}
+        ).sort(cursor_sort(ascending=False)).limit(limit).to_list(length=None)
+        raws = await post_loader.load_many_raw([row["postId"] for row in rows])
+        posts = [PostRead.from_raw(raw) for raw in raws if raw]
         return CommonResponse(
             code=200,
             msg="success",
-            data={
-                "posts": posts_with_authors
-            }
+            data={"posts": await hydrate_posts(posts), "nextCursor": next_cursor(rows, limit)}
         )
-        
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
-        logger.error(f"获取主页帖子失败: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"获取主页帖子失败: {str(e)}"
-        )
+        logger.error("Error getting posts for tag %s: %s", tag, e)
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/search", response_description="搜索帖子")
-async def search_posts(data: dict):
+async def search_posts(data: dict, request: Request):
     try:
         # 使用正则表达式进行模糊搜索
-        posts = await Post.find(
-            {"content": {"$regex": data["kw"], "$options": "i"}}
-        ).sort(-Post.createdAt).to_list()
-        
-        # 获取所有作者 ID
-        author_ids = [post.authorId for post in posts]
-        
-        # 查询所有作者信息
-        authors = await User.find(
-            {"_id": {"$in": author_ids}}
-        ).to_list()
+        async with causal_read_session(request.headers.get(CAUSAL_TOKEN_HEADER)) as session:
+            posts = await find_routed(
+                Post, "search", {"content": {"$regex": data["kw"], "$options": "i"}, **NOT_DELETED},
+                sort=[("createdAt", -1)], session=session, read_model=PostRead
+            )
         
-        # 创建作者字典
-        author_dict = {str(author.id): author for author in authors}
+        # 查询所有作者信息和评论数
+        author_dict = await load_authors(post.authorId for post in posts)
+        counts = await comment_counts([post.id for post in posts])
+        cards = await load_reference_cards(posts)
         
         # 为每个帖子添加作者信息
         posts_with_authors = []
         for post in posts:
-            author = author_dict.get(str(post.authorId))
             post_data = {
                 "_id": str(post.id),
                 "authorId": str(post.authorId),
                 "content": post.content,
                 "createdAt": post.createdAt.isoformat(),
                 "isRepost": post.isRepost,
+                "originalPost": str(post.originalPost) if post.originalPost else None,
                 "media": [{"type": media.type, "url": media.url} for media in post.media] if post.media else [],
                 "likes": [str(like) for like in post.likes],
                 "repostCount": post.repostCount,
                 "replyTo": str(post.replyTo) if post.replyTo else None,
                 "updatedAt": post.updatedAt.isoformat(),
-                "author": {
-                    "username": author.username if author else None,
-                    "handle": str(post.authorId),
-                    "avatar": author.avatar if author else None
-                },
+                "author": author_data(author_dict.get(post.authorId), post.authorId),
                 "stats": {
                     "likes": len(post.likes),
-                    "comments": await Comment.find(Comment.postId == post.id).count(),
+                    "comments": counts.get(post.id, 0),
                     "shares": post.repostCount,
-                    "views": 0
+                    "views": post.views
                 }
             }
-            posts_with_authors.append(post_data)
+            posts_with_authors.append(embed_references(post_data, post, cards))
         
         return CommonResponse(
             code=200,
@@ -583,59 +764,49 @@ async def search_posts(data: dict):
             }
         )
     except Exception as e:
-        logger.error(f"Error searching posts: {str(e)}")
+        logger.error("Error searching posts: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/{postId}/comments", response_description="获取帖子的所有评论")
-async def get_post_comments(postId: str):
+@router.get("/{postId}/comments", response_description="分页获取帖子的顶层评论")
+async def get_post_comments(postId: str, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
     try:
         post_id = PydanticObjectId(postId)
-        comments = await Comment.find(
-            Comment.postId == post_id
-        ).sort(+Comment.createdAt).to_list()
-
-        # 获取所有作者 ID
-        author_ids = [comment.authorId for comment in comments]
-
-        # 查询所有作者信息
-        authors = await User.find(
-            {"_id": {"$in": author_ids}}
-        ).to_list()
-
-        # 创建作者字典
-        author_dict = {str(author.id): author for author in authors}
-
-        # 为每个评论添加作者信息和统计信息
-        comments_with_authors = []
-        for comment in comments:
-            author = author_dict.get(str(comment.authorId))
-            comment_data = jsonable_encoder(comment)
-            comment_data["author"] = {
-                "username": author.username,
-                "handle": str(comment.authorId),
-                "avatar": author.avatar
-            }
-            comment_data["stats"] = {
-                "likes": len(comment.likes) if comment.likes else 0,
-                "replies": 0,
-                "shares": 0 
-            }
-            comments_with_authors.append(comment_data)
-
-        return CommonResponse(code=200, msg="success", data={"comments": comments_with_authors})
-    except Exception as e:
-        logger.error(f"Error getting comments for post {post_id}: {str(e)}")
+    except Exception:
         raise HTTPException(status_code=400, detail="Invalid post ID format")
+    try:
+        comments, next_page = await list_comments(post_id, None, cursor, clamp_limit(limit))
+        return CommonResponse(
+            code=200,
+            msg="success",
+            data={"comments": comments, "nextCursor": next_page}
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logger.error("Error getting comments for post %s: %s", postId, e)
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/{postId}/comment", response_description="发表评论")
 async def create_comment(postId: str, data: dict):
     content = data.get("content")
     author_id = data.get("_id")
+    reply_to = data.get("replyTo") or None
     try:
         post_id = PydanticObjectId(postId)
         author_id = PydanticObjectId(author_id)
+        post_raw = await post_cache.get_raw(post_id)
+        if not post_raw:
+            raise HTTPException(status_code=404, detail="Post not found")
+
+        # 回复评论时，父评论必须属于同一帖子
+        if reply_to:
+            reply_to = PydanticObjectId(reply_to)
+            parent = await comment_loader.load(reply_to)
+            if not parent or parent.postId != post_id:
+                raise HTTPException(status_code=404, detail="Parent comment not found")
+
         new_comment = Comment(
             postId=post_id,
             authorId=author_id,
@@ -643,12 +814,25 @@ async def create_comment(postId: str, data: dict):
             createdAt=format_datetime_now(),
             updatedAt=format_datetime_now(),
             likes=[],
-            replyTo=None
+            replyTo=reply_to
         )
         await new_comment.insert()
+        # 回复通知父评论作者，帖子作者另收到评论通知（是同一人时只收到回复通知）
+        if reply_to:
+            notification_queue.emit(parent.authorId, "reply", author_id, post_id)
+        if not reply_to or parent.authorId != post_raw["authorId"]:
+            notification_queue.emit(post_raw["authorId"], "comment", author_id, post_id)
+        # 主页信息流中的评论数随之变化
+        feed_cache.invalidate_post(post_id)
+        broker.publish(post_topic(post_id), "comment.created", {
+            "postId": str(post_id),
+            "commentId": str(new_comment.id),
+            "authorId": str(author_id),
+            "replyTo": str(reply_to) if reply_to else None
+        })
 
         # 获取作者信息
-        author = await User.get(author_id)
+        author = await user_loader.load(author_id)
         if not author:
             raise HTTPException(status_code=404, detail="Author not found")
 
@@ -665,7 +849,9 @@ async def create_comment(postId: str, data: dict):
         }
 
         return CommonResponse(code=200, msg="success", data={"comment": comment_data})
+    except HTTPException as http_exc:
+        raise http_exc
     except Exception as e:
-        logger.error(f"Error creating comment: {str(e)}")
+        logger.error("Error creating comment: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,20 @@
+from typing import Optional
+from fastapi import APIRouter
+import logging
+from middleware.response import CommonResponse
+from utils.trending import trending_tracker
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get("", response_description="获取热门话题")
+async def get_trending(limit: Optional[int] = None):
+    # 直接返回后台定期计算的结果，不查询数据库
+    snapshot = trending_tracker.snapshot
+    tags = snapshot["tags"][:max(0, limit)] if limit is not None else snapshot["tags"]
+    return CommonResponse(
+        code=200,
+        msg="success",
+        data={"tags": tags, "windowMinutes": snapshot["windowMinutes"], "updatedAt": snapshot["updatedAt"]}
+    )
@@ -0,0 +1,102 @@
+from beanie import PydanticObjectId
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+import logging
+from middleware.response import CommonResponse
+from models.UploadSession import UploadSession
+from utils.uploads import UploadBusyError, UploadOffsetError, upload_manager
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+def session_data(session: UploadSession) -> dict:
+    data = jsonable_encoder(session)
+    data["chunkSize"] = upload_manager.chunk_size
+    return data
+
+
+def check_owner(session: UploadSession, user_id: str, action: str):
+    if str(session.ownerId) != user_id:
+        raise HTTPException(status_code=403, detail=f"You don't have permission to {action} this upload")
+
+
+async def load_session(uploadId: str) -> UploadSession:
+    try:
+        session_id = PydanticObjectId(uploadId)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid upload ID format")
+    session = await UploadSession.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found or expired")
+    return session
+
+
+def offset_conflict(error: UploadOffsetError) -> HTTPException:
+    # 409 附带服务端已接收的字节数，客户端从这里续传
+    return HTTPException(status_code=409, detail=f"{str(error)}, received={error.received}")
+
+
+@router.post("", response_description="创建分片上传会话")
+async def create_upload(data: dict):
+    # data{"_id": "str", "filename": "str", "contentType": "str", "size": int}
+    try:
+        session = await upload_manager.create(
+            PydanticObjectId(data["_id"]), data["filename"], data["contentType"], int(data["size"])
+        )
+        return CommonResponse(code=200, msg="success", data={"upload": session_data(session)})
+    except (KeyError, ValueError) as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logger.error("Error in create_upload: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{uploadId}", response_description="查询上传进度，断线后据此续传")
+async def get_upload(uploadId: str):
+    session = await load_session(uploadId)
+    return CommonResponse(code=200, msg="success", data={"upload": session_data(session)})
+
+
+@router.put("/{uploadId}", response_description="在指定偏移写入一个分片")
+async def put_chunk(uploadId: str, offset: int, userId: str, request: Request):
+    # 请求体为分片的原始字节，userId 为上传用户
+    session = await load_session(uploadId)
+    check_owner(session, userId, "write to")
+    chunk = bytearray()
+    async for piece in request.stream():
+        chunk.extend(piece)
+        if len(chunk) > upload_manager.chunk_size:
+            raise HTTPException(status_code=413, detail=f"Chunk larger than {upload_manager.chunk_size} bytes")
+    try:
+        received = await upload_manager.write_chunk(session, offset, bytes(chunk))
+        return CommonResponse(code=200, msg="success", data={"received": received, "size": session.size})
+    except UploadOffsetError as oe:
+        raise offset_conflict(oe)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logger.error("Error writing chunk for upload %s: %s", uploadId, e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{uploadId}/complete", response_description="完成上传，返回发帖时引用的 mediaId")
+async def complete_upload(uploadId: str, data: dict):
+    session = await load_session(uploadId)
+    check_owner(session, data.get("_id"), "complete")
+    try:
+        session = await upload_manager.complete(session)
+        return CommonResponse(
+            code=200,
+            msg="success",
+            data={"media": {"mediaId": str(session.id), "type": session.mediaType, "url": session.url}}
+        )
+    except UploadOffsetError as oe:
+        raise offset_conflict(oe)
+    except UploadBusyError as be:
+        raise HTTPException(status_code=409, detail=str(be))
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logger.error("Error completing upload %s: %s", uploadId, e)
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,10 +1,20 @@
+from typing import Optional
 from beanie import PydanticObjectId
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from models.Email import verify_code
 from models.User import User
 import logging
-from pydantic import ValidationError
 from utils.common import hash_password, verify_password
+from utils.post_data import MAX_BATCH_SIZE, parse_ids
+from utils.http_cache import conditional_response, make_etag
+from utils.cache import user_cache
+from utils.export import encode_document, ndjson_response, page_documents
+from utils.counters import COUNTER_FIELDS
+from utils.invalidation import invalidate
+from utils.loader import user_loader
+from utils.notifications import notification_queue
+from utils.pagination import DEFAULT_PAGE_SIZE, clamp_limit
+from utils.read_routing import find_routed
 from utils.time import format_datetime_now
 from middleware.response import CommonResponse
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -24,35 +34,30 @@ async def test():
     # return CommonResponse(code=200, msg="success", data={"test": "test"})
 
 
-@router.get("", response_description="获取所有用户列表")
-async def get_users():
+# 列表和导出都不返回密码哈希；列表也不返回关注/粉丝ID列表，数量见计数字段
+USER_EXPORT_PROJECTION = {"passwordHash": 0}
+USER_LIST_PROJECTION = {"passwordHash": 0, "following": 0, "followers": 0}
+
+
+@router.get("", response_description="分页获取用户列表")
+async def get_users(cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
     try:
-        # 检查集合是否存在
-        collection = User.get_motor_collection()
-        collection_exists = await collection.find_one()
-        if not collection_exists:
-            logger.warning("No documents found in users collection")
-            return []
-        # 直接使用Motor查询并转换为User对象
-        raw_results = await collection.find({}).to_list(length=None)
-        users = []
-        for raw_user in raw_results:
-            try:
-                # 使用新的 model_validate 方法替代 parse_obj
-                user = User.model_validate(raw_user)
-                users.append(user)
-            except ValidationError as ve:
-                logger.error(f"Validation error for user {raw_user.get('_id')}: {str(ve)}")
-                continue
-            except Exception as e:
-                logger.error(f"Error processing user {raw_user.get('_id')}: {str(e)}")
-                continue
-        return CommonResponse(code=200, msg="success", data={"users": users})
+        users, next_page = await page_documents(
+            User.get_motor_collection(), {}, USER_LIST_PROJECTION, cursor, clamp_limit(limit)
+        )
+        return CommonResponse(code=200, msg="success", data={"users": users, "nextCursor": next_page})
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
-        logger.error(f"Error in get_users: {str(e)}")
+        logger.error("Error in get_users: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/export", response_description="以 NDJSON 流式导出全部用户")
+async def export_users():
+    return ndjson_response(User.get_motor_collection(), {}, USER_EXPORT_PROJECTION, "users.ndjson")
+
+
 @router.post("/register", response_description="注册新用户")
 async def register_user(user_data: dict):
     client = AsyncIOMotorClient(settings.DATABASE_URL)
@@ -96,13 +101,13 @@ async def register_user(user_data: dict):
             except PyMongoError as e:
                 # 如果发生 MongoDB 错误，回滚事务
                 await session.abort_transaction()
-                logger.error(f"MongoDB error in register_user: {str(e)}")
+                logger.error("MongoDB error in register_user: %s", e)
                 raise HTTPException(status_code=500, detail="Database transaction failed")
 
             except Exception as e:
                 # 如果发生其他错误，回滚事务
                 await session.abort_transaction()
-                logger.error(f"Error in register_user: {str(e)}")
+                logger.error("Error in register_user: %s", e)
                 raise HTTPException(status_code=500, detail=str(e))
 #####################################################################
 @router.post("/login", response_description="用户登录")
@@ -127,6 +132,7 @@ async def login(credentials: dict):
 
         # 更新最后登录时间
         user.status.lastLoginAt = format_datetime_now()  # 注意这里要调用函数
+        user.updatedAt = user.status.lastLoginAt
         await user.save()
 
         # 返回用户信息
@@ -139,19 +145,56 @@ async def login(credentials: dict):
     except HTTPException as http_exc:
         raise http_exc
     except Exception as e:
-        logger.error(f"Error in login: {str(e)}")
+        logger.error("Error in login: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/batch", response_description="按ID批量获取用户信息")
+async def get_users_batch(data: dict):
+    # data{"ids": ["str", ...]}
+    raw_ids = data.get("ids")
+    if not isinstance(raw_ids, list) or not raw_ids:
+        raise HTTPException(status_code=400, detail="ids must be a non-empty list")
+    if len(raw_ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} ids per request")
+    try:
+        ids = parse_ids(raw_ids)
+        # 与用户列表相同的投影，不读取密码哈希和关注/粉丝ID列表
+        rows = await User.get_motor_collection().find(
+            {"_id": {"$in": list({user_id for user_id in ids if user_id})}}, USER_LIST_PROJECTION
+        ).to_list(length=None)
+        user_dict = {row["_id"]: row for row in rows}
+
+        # 按请求顺序返回，未命中的位置为 null
+        results = [encode_document(user_dict[user_id]) if user_id in user_dict else None for user_id in ids]
+        missing = [raw_id for raw_id, result in zip(raw_ids, results) if result is None]
+        return CommonResponse(
+            code=200,
+            msg="success",
+            data={"users": results, "missing": missing}
+        )
+    except Exception as e:
+        logger.error("Error in get_users_batch: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/{id}", response_description="获取指定用户信息")
-async def get_user(id: str):
+async def get_user(id: str, request: Request, response: Response):
     try:
         user_id = PydanticObjectId(id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid user ID format")
-    user = await User.get(user_id)
-    if not user:
+    # 原始文档走缓存，未变化时在解析之前返回 304
+    raw = await user_cache.get_raw(user_id)
+    if not raw:
         raise HTTPException(status_code=404, detail="User not found")
+    # updatedAt 精确到秒，同一秒内的计数变化由计数值区分
+    etag = make_etag(user_id, raw["updatedAt"], *(raw.get(field) for field in COUNTER_FIELDS))
+    not_modified = conditional_response(request, response, "get_user", etag, raw["updatedAt"])
+    if not_modified:
+        return not_modified
+
+    user = user_cache.parse(raw)
     return CommonResponse(
         code=200,
         msg="success",
@@ -189,26 +232,27 @@ async def change_password(data: dict):
                 # await user.save(session=session)  # 在事务中保存
                 await db.users.update_one(
                     {"email": email},
-                    {"$set": {"passwordHash": hash_password(new_password)}},
+                    {"$set": {"passwordHash": hash_password(new_password), "updatedAt": format_datetime_now()}},
                     session=session
                 )
-
-                return CommonResponse(
-                    code=200,
-                    msg="update password successful",
-                    data=None
-                )
             except PyMongoError as e:
                 # 如果发生 MongoDB 错误，回滚事务
                 await session.abort_transaction()
-                logger.error(f"MongoDB error in change_password: {str(e)}")
+                logger.error("MongoDB error in change_password: %s", e)
                 raise HTTPException(status_code=500, detail="Database transaction failed")
 
             except Exception as e:
                 # 如果发生其他错误，回滚事务
                 await session.abort_transaction()
-                logger.error(f"Error in change_password: {str(e)}")
+                logger.error("Error in change_password: %s", e)
                 raise HTTPException(status_code=500, detail=str(e))
+    # 事务提交后再失效缓存，避免提交前的读取把旧数据写回缓存
+    invalidate("user", user["_id"])
+    return CommonResponse(
+        code=200,
+        msg="update password successful",
+        data=None
+    )
 
 #####################################################################
 # 更新用户信息接口
@@ -222,7 +266,7 @@ async def update_profile(profile: dict):
         new_bio = profile.get("bio")
         new_settings = profile.get("settings")
         # 查找用户
-        current_user = await User.get(PydanticObjectId(id))
+        current_user = await user_loader.load(PydanticObjectId(id))
         if not current_user:
             raise HTTPException(status_code=400, detail="User not found")
 
@@ -242,6 +286,7 @@ async def update_profile(profile: dict):
         # 逐个更新字段，确保只更新提供的字段
         for key, value in update_fields.items():
             setattr(current_user, key, value)
+        current_user.updatedAt = format_datetime_now()
 
         await current_user.save()
         return CommonResponse(
@@ -250,7 +295,7 @@ async def update_profile(profile: dict):
             data={"user": current_user}
         )
     except Exception as e:
-        logger.error(f"Error in update_profile: {str(e)}")
+        logger.error("Error in update_profile: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -275,32 +320,36 @@ async def follow_user(follow_id: str, current_id: str):
                 if follow_id in current_user.get("following", []):
                     raise HTTPException(status_code=400, detail="User already followed")
                 # 更新当前用户的关注列表
+                now = format_datetime_now()
                 await db.users.update_one(
                     {"_id": current_id},
-                    {"$push": {"following": follow_id}},
+                    {"$push": {"following": follow_id}, "$inc": {"followingCount": 1}, "$set": {"updatedAt": now}},
                     session=session
                 )
                 # 更新被关注用户的粉丝列表
                 await db.users.update_one(
                     {"_id": follow_id},
-                    {"$push": {"followers": current_id}},
+                    {"$push": {"followers": current_id}, "$inc": {"followersCount": 1}, "$set": {"updatedAt": now}},
                     session=session
                 )
-                return CommonResponse(
-                    code=200,
-                    msg="follow user successful",
-                    data=None
-                )
             except PyMongoError as e:
                 # 如果发生 MongoDB 错误，回滚事务
                 await session.abort_transaction()
-                logger.error(f"MongoDB error in follow_user: {str(e)}")
+                logger.error("MongoDB error in follow_user: %s", e)
                 raise HTTPException(status_code=500, detail="Database transaction failed")
             except Exception as e:
                 # 如果发生其他错误，回滚事务
                 await session.abort_transaction()
-                logger.error(f"Error in follow_user: {str(e)}")
+                logger.error("Error in follow_user: %s", e)
                 raise HTTPException(status_code=500, detail=str(e))
+    # 事务提交后再失效缓存，避免提交前的读取把旧数据写回缓存
+    invalidate("user", current_id, follow_id)
+    notification_queue.emit(follow_id, "follow", current_id)
+    return CommonResponse(
+        code=200,
+        msg="follow user successful",
+        data=None
+    )
 
 @router.delete("/unfollow", response_description="取消关注用户")
 async def unfollow_user(unfollow_id: str, current_id: str):
@@ -323,32 +372,42 @@ async def unfollow_user(unfollow_id: str, current_id: str):
                 if user_id not in current_user.get("following", []):
                     raise HTTPException(status_code=400, detail="User not followed")
                 # 更新当前用户的关注列表
+                now = format_datetime_now()
                 await db.users.update_one(
                     {"_id": current_id},
-                    {"$pull": {"following": user_id}},
+                    {"$pull": {"following": user_id}, "$inc": {"followingCount": -1}, "$set": {"updatedAt": now}},
                     session=session
                 )
                 # 更新被取消关注用户的粉丝列表
                 await db.users.update_one(
                     {"_id": user_id},
-                    {"$pull": {"followers": current_id}},
+                    {"$pull": {"followers": current_id}, "$inc": {"followersCount": -1}, "$set": {"updatedAt": now}},
                     session=session
                 )
-                return CommonResponse(
-                    code=200,
-                    msg="unfollow user successful",
-                    data=None
-                )
             except PyMongoError as e:
                 # 如果发生 MongoDB 错误，回滚事务
                 await session.abort_transaction()
-                logger.error(f"MongoDB error in unfollow_user: {str(e)}")
+                logger.error("MongoDB error in unfollow_user: %s", e)
                 raise HTTPException(status_code=500, detail="Database transaction failed")
             except Exception as e:
                 # 如果发生其他错误，回滚事务
                 await session.abort_transaction()
-                logger.error(f"Error in unfollow_user: {str(e)}")
+                logger.error("Error in unfollow_user: %s", e)
                 raise HTTPException(status_code=500, detail=str(e))
+    # 事务提交后再失效缓存，避免提交前的读取把旧数据写回缓存
+    invalidate("user", current_id, user_id)
+    return CommonResponse(
+        code=200,
+        msg="unfollow user successful",
+        data=None
+    )
+
+async def load_user_list(user_ids: list) -> list:
+    """关注和粉丝列表可容忍复制延迟，按配置读从节点"""
+    users = await find_routed(User, "followers", {"_id": {"$in": user_ids}})
+    user_dict = {user.id: user for user in users}
+    return [user_dict[user_id] for user_id in user_ids if user_id in user_dict]
+
 
 #####################################################################
 # 获取用户关注列表接口
@@ -358,22 +417,18 @@ async def get_following_list(userId: str):
     try:
         user_id = PydanticObjectId(userId)
         # 查找用户
-        user = await User.get(user_id)
+        user = await user_loader.load(user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
-        # 获取关注列表
-        following_list = []
-        for following_id in user.following:
-            following_user = await User.get(following_id)
-            if following_user:
-                following_list.append(following_user)
+        # 获取关注列表，按关注顺序返回
+        following_list = await load_user_list(user.following)
         return CommonResponse(
             code=200,
             msg="get following list successful",
             data={"following_list": following_list}
         )
     except Exception as e:
-        logger.error(f"Error in get_following_list: {str(e)}")
+        logger.error("Error in get_following_list: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -384,20 +439,41 @@ async def get_follower_list(userId: str):
     try:
         user_id = PydanticObjectId(userId)
         # 查找用户
-        user = await User.get(user_id)
+        user = await user_loader.load(user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
-        # 获取粉丝列表
-        follower_list = []
-        for follower_id in user.followers:
-            follower_user = await User.get(follower_id)
-            if follower_user:
-                follower_list.append(follower_user)
+        # 获取粉丝列表，按关注顺序返回
+        follower_list = await load_user_list(user.followers)
         return CommonResponse(
             code=200,
             msg="get follower list successful",
             data={"follower_list": follower_list}
         )
     except Exception as e:
-        logger.error(f"Error in get_follower_list: {str(e)}")
+        logger.error("Error in get_follower_list: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{id}/stats", response_description="获取用户的计数信息")
+async def get_user_stats(id: str):
+    try:
+        user_id = PydanticObjectId(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid user ID format")
+    try:
+        # 只读取计数字段，不加载关注列表等大字段
+        user = await User.get_motor_collection().find_one(
+            {"_id": user_id}, {field: 1 for field in COUNTER_FIELDS}
+        )
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        return CommonResponse(
+            code=200,
+            msg="success",
+            data={"stats": {field: user.get(field, 0) for field in COUNTER_FIELDS}}
+        )
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        logger.error("Error getting stats for user %s: %s", id, e)
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from .endpoints import users, posts, comments, medias,mails
+from .endpoints import users, posts, comments, medias,mails, events, trending, uploads, notifications
 
 router = APIRouter()
 
@@ -30,3 +30,23 @@ router.include_router(
     prefix="/mails",
     tags=["mails"]
 )
+router.include_router(
+    events.router,
+    prefix="/events",
+    tags=["events"]
+)
+router.include_router(
+    trending.router,
+    prefix="/trending",
+    tags=["trending"]
+)
+router.include_router(
+    uploads.router,
+    prefix="/uploads",
+    tags=["uploads"]
+)
+router.include_router(
+    notifications.router,
+    prefix="/notifications",
+    tags=["notifications"]
+)
@@ -0,0 +1,122 @@
+import json
+import os
+import platform
+import subprocess
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASELINE_DIR = BENCH_DIR / "baselines"
+RESULT_DIR = BENCH_DIR / "results"
+
+# 默认回归阈值: 比基线慢 20% 视为回归
+DEFAULT_THRESHOLD = 1.2
+
+
+def percentile(samples: list, pct: float) -> float:
+    """计算百分位数（最近秩法），samples 需已排序"""
+    if not samples:
+        return 0.0
+    rank = max(0, min(len(samples) - 1, int(round(pct / 100 * len(samples) + 0.5)) - 1))
+    return samples[rank]
+
+
+def summarize(samples: list) -> dict:
+    """将耗时样本（秒）汇总为毫秒级统计"""
+    ordered = sorted(samples)
+    count = len(ordered)
+    return {
+        "count": count,
+        "mean_ms": (sum(ordered) / count * 1000) if count else 0.0,
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p90_ms": percentile(ordered, 90) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+        "max_ms": (ordered[-1] * 1000) if count else 0.0,
+    }
+
+
+def time_call(fn, number: int = 100, repeat: int = 5) -> dict:
+    """多轮计时一个同步函数，返回单次调用耗时统计"""
+    fn()  # 预热
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return summarize(samples)
+
+
+def git_revision() -> str:
+    """获取当前提交，便于在提交之间比对报告"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCH_DIR,
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def build_report(name: str, results: dict, **meta) -> dict:
+    return {
+        "name": name,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "meta": meta,
+        "results": results,
+    }
+
+
+def write_report(report: dict, path: Path = None) -> Path:
+    """写入 JSON 报告，键排序以便 diff"""
+    if path is None:
+        RESULT_DIR.mkdir(parents=True, exist_ok=True)
+        path = RESULT_DIR / f"{report['name']}-{report['revision']}.json"
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False)
+        f.write(os.linesep)
+    return path
+
+
+def load_report(path: Path):
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(results: dict, baseline: dict, metric: str = "p50_ms",
+            threshold: float = DEFAULT_THRESHOLD) -> list:
+    """与基线对比，返回超过阈值的回归项 [(名称, 基线值, 当前值, 比例)]"""
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get("results", {}).get(key)
+        if not base or not base.get(metric):
+            continue
+        ratio = current[metric] / base[metric]
+        if ratio > threshold:
+            regressions.append((key, base[metric], current[metric], ratio))
+    return regressions
+
+
+def print_table(results: dict, baseline: dict = None, metric: str = "p50_ms"):
+    """打印结果表格，有基线时附带变化比例"""
+    width = max([len(k) for k in results] + [10])
+    print(f"{'name':<{width}}  {'p50 ms':>10}  {'p99 ms':>10}  {'extra':>12}  {'vs base':>8}")
+    for key, value in results.items():
+        extra = ""
+        if "rps" in value:
+            extra = f"{value['rps']:.1f} rps"
+        delta = ""
+        if baseline:
+            base = baseline.get("results", {}).get(key)
+            if base and base.get(metric):
+                delta = f"{value[metric] / base[metric]:.2f}x"
+        print(f"{key:<{width}}  {value['p50_ms']:>10.4f}  {value['p99_ms']:>10.4f}  {extra:>12}  {delta:>8}")
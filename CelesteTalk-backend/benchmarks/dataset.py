@@ -0,0 +1,205 @@
+"""
+生成可复现的压测数据集
+
+    python -m benchmarks.dataset --size 10k --url mongodb://localhost:27017 --db celeste_bench --drop
+
+同一个 seed 总是生成相同的数据：用户关注关系服从幂律分布，
+帖子带媒体和点赞，另外生成评论和验证码记录。时间戳都从固定的 EPOCH 倒推，
+不随生成时间变化，依赖时间衰减的排序在不同次生成的数据集上结果一致。
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+from utils.common import hash_password
+
+SIZES = {
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+}
+BATCH_SIZE = 5000
+# 数据集的"当前时间"，所有时间戳由此倒推
+EPOCH = datetime(2025, 1, 1)
+# 所有压测用户的密码
+DEFAULT_PASSWORD = "bench-password"
+
+
+def power_law(rng: random.Random, alpha: float, scale: float, cap: int) -> int:
+    """帕累托分布采样，结果截断到 [0, cap]"""
+    return min(cap, int((rng.paretovariate(alpha) - 1) * scale))
+
+
+def zipf_weights(n: int, s: float = 1.1) -> list:
+    """按排名生成齐夫权重，排名越靠前越热门"""
+    return [1.0 / ((rank + 1) ** s) for rank in range(n)]
+
+
+def weighted_unique(rng: random.Random, population: list, weights: list, k: int) -> list:
+    """按权重抽取 k 个不重复元素"""
+    if k <= 0:
+        return []
+    # 用 dict 去重以保持抽样顺序，避免受哈希随机化影响
+    chosen = dict.fromkeys(rng.choices(population, weights=weights, k=k * 2))
+    return list(chosen)[:k]
+
+
+def placeholder_id(rng: random.Random) -> ObjectId:
+    """模拟模型为空引用字段生成的占位ObjectId"""
+    return ObjectId(rng.randbytes(12))
+
+
+def insert_batches(collection, docs):
+    batch = []
+    total = 0
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= BATCH_SIZE:
+            collection.insert_many(batch, ordered=False)
+            total += len(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+        total += len(batch)
+    return total
+
+
+def generate(db, posts_count: int, seed: int = 42, epoch: datetime = EPOCH) -> dict:
+    rng = random.Random(seed)
+    now = epoch
+    password_hash = hash_password(DEFAULT_PASSWORD)
+
+    users_count = max(100, posts_count // 10)
+    # 使用序号生成确定的ID，保证同一 seed 的数据集可复现
+    user_ids = [ObjectId(f"{i:024x}") for i in range(1, users_count + 1)]
+    popularity = zipf_weights(users_count)
+
+    # 关注关系：每个用户的关注数服从幂律，关注对象偏向热门用户
+    following = {uid: [] for uid in user_ids}
+    followers = {uid: [] for uid in user_ids}
+    for uid in user_ids:
+        targets = weighted_unique(rng, user_ids, popularity, power_law(rng, 1.5, 10, users_count - 1))
+        for target in targets:
+            if target == uid:
+                continue
+            following[uid].append(target)
+            followers[target].append(uid)
+
+    def user_docs():
+        for i, uid in enumerate(user_ids):
+            created = now - timedelta(days=rng.randint(30, 365))
+            yield {
+                "_id": uid,
+                "username": f"user{i}",
+                "email": f"user{i}@bench.example.com",
+                "passwordHash": password_hash,
+                "status": {"isActive": True, "isBanned": False, "lastLoginAt": now},
+                "settings": {
+                    "language": "en",
+                    "theme": "light",
+                    "notifications": {"email": True, "push": True}
+                },
+                "avatar": f"static/uploads/image/avatar-{i % 50}.png",
+                "headerImage": "",
+                "bio": f"bench user {i}",
+                "following": following[uid],
+                "followers": followers[uid],
+                "postsCount": 0,
+                "likesCount": 0,
+                "createdAt": created,
+                "updatedAt": created,
+            }
+
+    post_ids = [ObjectId(f"{0x100000000 + i:024x}") for i in range(posts_count)]
+    post_authors = rng.choices(user_ids, weights=popularity, k=posts_count)
+
+    def post_docs():
+        for i, pid in enumerate(post_ids):
+            created = now - timedelta(seconds=rng.randint(0, 30 * 24 * 3600))
+            media = []
+            roll = rng.random()
+            if roll < 0.25:
+                media = [
+                    {"type": "image", "url": f"static/uploads/image/bench-{rng.randint(0, 999)}.png"}
+                    for _ in range(rng.randint(1, 4))
+                ]
+            elif roll < 0.30:
+                media = [{"type": "video", "url": f"static/uploads/video/bench-{rng.randint(0, 99)}.mp4"}]
+            likes = weighted_unique(rng, user_ids, popularity, power_law(rng, 1.2, 3, users_count))
+            is_repost = i > 0 and rng.random() < 0.1
+            yield {
+                "_id": pid,
+                "authorId": post_authors[i],
+                "content": f"bench post {i} #topic{rng.randint(0, 200)}",
+                "createdAt": created,
+                "isRepost": is_repost,
+                "media": media,
+                "likes": likes,
+                "repostCount": power_law(rng, 2.0, 1, 1000),
+                "originalPost": post_ids[rng.randint(0, i - 1)] if is_repost else placeholder_id(rng),
+                "replyTo": placeholder_id(rng),
+                "updatedAt": created,
+            }
+
+    comments_total = 0
+
+    def comment_docs():
+        nonlocal comments_total
+        for pid in post_ids:
+            for _ in range(power_law(rng, 1.5, 2, 5000)):
+                created = now - timedelta(seconds=rng.randint(0, 30 * 24 * 3600))
+                comments_total += 1
+                yield {
+                    "postId": pid,
+                    "authorId": rng.choice(user_ids),
+                    "content": f"bench comment {comments_total}",
+                    "replyTo": placeholder_id(rng),
+                    "likes": weighted_unique(rng, user_ids, popularity, power_law(rng, 2.0, 1, 200)),
+                    "createdAt": created,
+                    "updatedAt": created,
+                }
+
+    def mail_docs():
+        for i in range(users_count):
+            created = now - timedelta(minutes=rng.randint(0, 60 * 24))
+            yield {
+                "email": f"user{i}@bench.example.com",
+                "code": f"{rng.randint(1000, 9999)}",
+                "type": rng.choice(["register", "reset-password"]),
+                "isUsed": rng.random() < 0.8,
+                "expireAt": created + timedelta(minutes=5),
+                "createdAt": created,
+            }
+
+    counts = {
+        "users": insert_batches(db.users, user_docs()),
+        "posts": insert_batches(db.posts, post_docs()),
+        "comments": insert_batches(db.comments, comment_docs()),
+        "mails": insert_batches(db.mails, mail_docs()),
+    }
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成压测数据集")
+    parser.add_argument("--size", choices=SIZES.keys(), default="10k")
+    parser.add_argument("--url", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="celeste_bench")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--epoch", type=datetime.fromisoformat, default=EPOCH,
+                        help="数据集的当前时间（UTC，如 2025-01-01T00:00:00），时间戳由此倒推")
+    parser.add_argument("--drop", action="store_true", help="生成前清空数据库")
+    args = parser.parse_args()
+
+    client = MongoClient(args.url)
+    if args.drop:
+        client.drop_database(args.db)
+    counts = generate(client[args.db], SIZES[args.size], args.seed, args.epoch)
+    print(f"dataset {args.size} (seed={args.seed}, epoch={args.epoch.isoformat()}) -> {args.db}: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+单个热门帖子在持续点赞压力下的基准
+
+    python -m benchmarks.engagement --rate 5000 --duration 10
+    python -m benchmarks.engagement --rate 5000 --duration 10 --direct
+
+默认经过点赞接口和写缓冲区；--direct 模拟改造前每次点赞单独一次 Mongo 往返。
+使用本地 mongod，会在指定库中创建一个用于压测的帖子。
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "celeste_bench")
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("EMAIL", "bench@example.com")
+os.environ.setdefault("PASSWORD", "bench")
+
+import httpx  # noqa: E402
+from bson import ObjectId  # noqa: E402
+
+from benchmarks.common import build_report, print_table, summarize, write_report  # noqa: E402
+
+
+class CountingCollection:
+    """统计对帖子集合的写操作次数"""
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.writes = 0
+
+    async def bulk_write(self, operations, **kwargs):
+        self.writes += 1
+        return await self._collection.bulk_write(operations, **kwargs)
+
+    async def update_one(self, *args, **kwargs):
+        self.writes += 1
+        return await self._collection.update_one(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+
+async def run(args) -> dict:
+    from server.app import app
+    from server.init import initiate_database
+    from models.Post import Post
+    from models.User import User
+    from utils.engagement_buffer import engagement_buffer
+    from utils.time import format_datetime_now
+
+    await initiate_database()
+    author = User(username="bench-hot", email="bench-hot@example.com", passwordHash="x")
+    await author.insert()
+    post = Post(authorId=author.id, content="hot post", isRepost=False, createdAt=format_datetime_now())
+    await post.insert()
+
+    collection = CountingCollection(Post.get_motor_collection())
+    latencies = []
+    errors = 0
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+        async def like_via_api(user_id):
+            response = await client.put(f"/api/v1/posts/{post.id}/like", json={"_id": str(user_id)})
+            return response.status_code < 400
+
+        async def like_direct(user_id):
+            # 改造前：每次点赞一次独立的更新
+            await collection.update_one(
+                {"_id": post.id},
+                {"$addToSet": {"likes": user_id}, "$set": {"updatedAt": format_datetime_now()}}
+            )
+            return True
+
+        like = like_direct if args.direct else like_via_api
+
+        async def one(user_id):
+            nonlocal errors
+            start = time.perf_counter()
+            try:
+                if not await like(user_id):
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+        # 计数包装只用于统计，缓冲区通过 Post.get_motor_collection() 写入
+        original = Post.get_motor_collection
+        Post.get_motor_collection = classmethod(lambda cls: collection)
+        engagement_buffer.start()
+        try:
+            total = int(args.rate * args.duration)
+            interval = 1.0 / args.rate
+            tasks = []
+            start = time.perf_counter()
+            for i in range(total):
+                # 按固定速率发起请求
+                delay = start + i * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(one(ObjectId())))
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - start
+            await engagement_buffer.stop()
+        finally:
+            Post.get_motor_collection = original
+
+    stored = await Post.get(post.id)
+    result = summarize(latencies)
+    result.update({
+        "rps": len(latencies) / elapsed,
+        "errors": errors,
+        "dbWrites": collection.writes,
+        "storedLikes": len(stored.likes),
+    })
+    await post.delete()
+    await author.delete()
+    return {("direct" if args.direct else "buffered"): result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="热门帖子点赞写入基准")
+    parser.add_argument("--rate", type=int, default=5000, help="每秒点赞数")
+    parser.add_argument("--duration", type=float, default=10.0, help="持续秒数")
+    parser.add_argument("--direct", action="store_true", help="每次点赞直接写库")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_table(results)
+    for name, value in results.items():
+        print(f"{name}: {value['dbWrites']} db writes, {value['storedLikes']} likes stored, {value['errors']} errors")
+    path = write_report(build_report("engagement", results, rate=args.rate, duration=args.duration))
+    print(f"report written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+实时推送的扇出延迟基准
+
+    python -m benchmarks.fanout --clients 10000 --messages 50
+    python -m benchmarks.fanout --clients 10000 --messages 50 --slow 0.1
+
+在进程内创建指定数量的 SSE 订阅，每个订阅由一个协程消费与接口相同的字节流
+（utils.pubsub.event_stream），统计从 publish 到每个客户端收到消息的延迟。
+--slow 指定一部分客户端不读取，用于验证慢客户端只会丢弃自己的旧消息。
+不需要数据库。
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "celeste_bench")
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("EMAIL", "bench@example.com")
+os.environ.setdefault("PASSWORD", "bench")
+
+from benchmarks.common import build_report, print_table, summarize, write_report  # noqa: E402
+
+
+def parse_sequences(chunk: bytes) -> list:
+    """从 SSE 字节流中取出基准消息的序号"""
+    sequences = []
+    for line in chunk.split(b"\n"):
+        if line.startswith(b"data: "):
+            data = json.loads(line[6:])
+            if "seq" in data:
+                sequences.append(data["seq"])
+    return sequences
+
+
+async def run(args) -> dict:
+    from utils.pubsub import FEED_TOPIC, Broker, event_stream
+
+    broker = Broker(max_queue=args.queue)
+    sent = {}
+    latencies = []
+    # 每条消息最后一个客户端收到的时间
+    last_received = {}
+    received = 0
+    done = asyncio.Event()
+    fast_clients = args.clients - int(args.clients * args.slow)
+    expected = fast_clients * args.messages
+
+    async def client(subscription):
+        nonlocal received
+        stream = event_stream(subscription, heartbeat=60.0)
+        try:
+            async for chunk in stream:
+                now = time.perf_counter()
+                for seq in parse_sequences(chunk):
+                    latencies.append(now - sent[seq])
+                    last_received[seq] = now
+                    received += 1
+                if received >= expected:
+                    done.set()
+        finally:
+            await stream.aclose()
+            broker.unsubscribe(subscription)
+
+    subscriptions = [broker.subscribe([FEED_TOPIC]) for _ in range(args.clients)]
+    # 慢客户端只订阅不读取
+    tasks = [asyncio.create_task(client(subscription)) for subscription in subscriptions[:fast_clients]]
+    await asyncio.sleep(0.1)
+
+    publish_times = []
+    start = time.perf_counter()
+    for seq in range(args.messages):
+        sent[seq] = time.perf_counter()
+        broker.publish(FEED_TOPIC, "post.created", {"seq": seq, "postId": f"{seq:024x}"})
+        publish_times.append(time.perf_counter() - sent[seq])
+        await asyncio.sleep(args.interval)
+    try:
+        await asyncio.wait_for(done.wait(), timeout=args.timeout)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - start
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    slow_dropped = sum(subscription.dropped for subscription in subscriptions[fast_clients:])
+
+    delivery = summarize(latencies)
+    delivery.update({
+        "clients": args.clients,
+        "received": received,
+        "expected": expected,
+        "rps": received / elapsed,
+    })
+    completion = summarize([last_received[seq] - sent[seq] for seq in last_received])
+    publish = summarize(publish_times)
+    publish["slowClientDrops"] = slow_dropped
+    return {"delivery": delivery, "fanout_complete": completion, "publish": publish}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="实时推送扇出延迟基准")
+    parser.add_argument("--clients", type=int, default=10000, help="连接的客户端数")
+    parser.add_argument("--messages", type=int, default=50, help="发布的消息数")
+    parser.add_argument("--interval", type=float, default=0.05, help="发布间隔（秒）")
+    parser.add_argument("--queue", type=int, default=100, help="每个连接的队列上限")
+    parser.add_argument("--slow", type=float, default=0.0, help="不读取消息的客户端比例")
+    parser.add_argument("--timeout", type=float, default=60.0, help="等待全部送达的最长时间")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_table(results)
+    delivery = results["delivery"]
+    print(f"delivered {delivery['received']}/{delivery['expected']} to {delivery['clients']} clients, "
+          f"{results['publish']['slowClientDrops']} messages dropped for slow clients")
+    path = write_report(build_report(
+        "fanout", results,
+        clients=args.clients, messages=args.messages, interval=args.interval, queue=args.queue, slow=args.slow
+    ))
+    print(f"report written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+主页信息流缓存的吞吐量基准
+
+    python -m benchmarks.dataset --size 10k --drop
+    python -m benchmarks.feed_cache --concurrency 64 --duration 10
+    python -m benchmarks.feed_cache --concurrency 64 --duration 10 --no-cache
+
+--write-rate 大于 0 时同时以该速率点赞随机帖子，触发缓存失效。
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "celeste_bench")
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("EMAIL", "bench@example.com")
+os.environ.setdefault("PASSWORD", "bench")
+
+import httpx  # noqa: E402
+
+from benchmarks.common import build_report, print_table, summarize, write_report  # noqa: E402
+
+
+async def run(args) -> dict:
+    from server.app import app
+    from server.init import initiate_database
+    from models.Post import Post
+    from models.User import User
+    import api.v1.endpoints.posts as posts_endpoint
+    from utils.engagement_buffer import engagement_buffer
+    from utils.feed_cache import feed_cache
+
+    await initiate_database()
+    if args.no_cache:
+        feed_cache.ttl = 0
+
+    # 统计实际重建次数
+    builds = 0
+    build_home_feed = posts_endpoint.build_home_feed
+
+    async def counted_build(page, size):
+        nonlocal builds
+        builds += 1
+        return await build_home_feed(page, size)
+
+    posts_endpoint.build_home_feed = counted_build
+
+    rng = random.Random(args.seed)
+    post_ids = [str(doc["_id"]) for doc in await Post.get_motor_collection().find({}, {"_id": 1}).limit(1000).to_list(length=None)]
+    user_ids = [str(doc["_id"]) for doc in await User.get_motor_collection().find({}, {"_id": 1}).limit(1000).to_list(length=None)]
+    if not post_ids:
+        raise SystemExit("empty database, run benchmarks.dataset first")
+
+    latencies = []
+    errors = 0
+    writes = 0
+    url = f"/api/v1/posts/home/?size={args.size}"
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        deadline = time.perf_counter() + args.duration
+
+        async def reader():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await client.get(url)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors += 1
+
+        async def writer():
+            nonlocal writes
+            while time.perf_counter() < deadline:
+                await client.put(
+                    f"/api/v1/posts/{rng.choice(post_ids)}/like", json={"_id": rng.choice(user_ids)}
+                )
+                writes += 1
+                await asyncio.sleep(1.0 / args.write_rate)
+
+        engagement_buffer.start()
+        tasks = [reader() for _ in range(args.concurrency)]
+        if args.write_rate > 0:
+            tasks.append(writer())
+        start = time.perf_counter()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+        await engagement_buffer.stop()
+
+    posts_endpoint.build_home_feed = build_home_feed
+    result = summarize(latencies)
+    result.update({
+        "rps": len(latencies) / elapsed,
+        "errors": errors,
+        "builds": builds,
+        "likes": writes,
+    })
+    result.update({f"cache.{key}": value for key, value in feed_cache.stats().items()})
+    return {("nocache" if args.no_cache else "cached"): result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="主页信息流缓存吞吐量基准")
+    parser.add_argument("--concurrency", type=int, default=64, help="并发读取的客户端数")
+    parser.add_argument("--duration", type=float, default=10.0, help="持续秒数")
+    parser.add_argument("--size", type=int, default=50, help="每页帖子数")
+    parser.add_argument("--write-rate", type=float, default=0.0, help="每秒点赞数，用于触发失效")
+    parser.add_argument("--no-cache", action="store_true", help="关闭缓存，每次请求都重建")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_table(results)
+    for name, value in results.items():
+        print(f"{name}: {value['rps']:.0f} qps, {value['builds']} rebuilds, {value['errors']} errors")
+    path = write_report(build_report(
+        "feed_cache", results,
+        concurrency=args.concurrency, duration=args.duration, size=args.size, write_rate=args.write_rate
+    ))
+    print(f"report written to {path}")
+
+
+if __name__ == "__main__":
+    main()
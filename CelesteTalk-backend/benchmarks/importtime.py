@@ -0,0 +1,103 @@
+"""
+应用导入耗时与冷启动基准
+
+    python -m benchmarks.importtime --runs 5
+    python -m benchmarks.importtime --runs 5 --target-ms 1000 --top 15
+
+每次在新进程中以 `python -X importtime -c "import server.app"` 导入应用，
+记录 server.app 的累计导入耗时和整个进程的墙钟时间（解释器启动 + 导入），
+并列出累计耗时最高的模块。冷启动超过目标时返回非零退出码，可用于 CI。
+不需要数据库：导入应用不应连接数据库或产生其他副作用。
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.common import build_report, print_table, summarize, write_report
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# 自动扩容时新实例的冷启动目标（解释器启动 + 导入应用），毫秒
+COLD_START_TARGET_MS = 1000
+
+
+def import_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+    env.setdefault("DATABASE_NAME", "celeste_bench")
+    env.setdefault("SECRET_KEY", "bench-secret")
+    env.setdefault("EMAIL", "bench@example.com")
+    env.setdefault("PASSWORD", "bench")
+    return env
+
+
+def parse_importtime(stderr: str) -> dict:
+    """解析 -X importtime 的输出，返回 {模块名: 累计耗时(秒)}"""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace("import time:", "|", 1).split("|")]
+        cumulative[name] = int(cumulative_us) / 1_000_000
+    return cumulative
+
+
+def measure_once(module: str) -> tuple:
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=import_env(), capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.splitlines()[-1] if completed.stderr else "import failed")
+    return wall, parse_importtime(completed.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="应用导入耗时基准")
+    parser.add_argument("--module", default="server.app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="列出累计耗时最高的模块数")
+    parser.add_argument("--target-ms", type=float, default=COLD_START_TARGET_MS, help="冷启动目标（毫秒）")
+    args = parser.parse_args()
+
+    # 第一次运行生成字节码缓存，不计入结果
+    measure_once(args.module)
+    walls, imports, profiles = [], [], []
+    for _ in range(args.runs):
+        wall, profile = measure_once(args.module)
+        walls.append(wall)
+        imports.append(profile.get(args.module, 0.0))
+        profiles.append(profile)
+
+    # 各模块取多次运行的中位数
+    modules = {}
+    for name in profiles[0]:
+        values = sorted(profile.get(name, 0.0) for profile in profiles)
+        modules[name] = values[len(values) // 2] * 1000
+    top = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:args.top]
+
+    results = {"cold_start": summarize(walls), "import": summarize(imports)}
+    print_table(results)
+    print(f"\ntop {args.top} modules by cumulative import time:")
+    for name, ms in top:
+        print(f"  {ms:8.1f} ms  {name}")
+
+    cold_start = results["cold_start"]["p50_ms"]
+    path = write_report(build_report(
+        "importtime", results, module=args.module, target_ms=args.target_ms,
+        top_modules={name: round(ms, 1) for name, ms in top}
+    ))
+    print(f"report written to {path}")
+    print(f"cold start p50 {cold_start:.0f} ms, target {args.target_ms:.0f} ms")
+    if cold_start > args.target_ms:
+        print("cold start is over target")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
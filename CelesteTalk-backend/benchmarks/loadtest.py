@@ -0,0 +1,205 @@
+"""
+基于 httpx + ASGI 的异步压测驱动
+
+    python -m benchmarks.dataset --size 10k --drop
+    python -m benchmarks.loadtest --requests 500 --concurrency 32
+    python -m benchmarks.loadtest --compare benchmarks/results/loadtest-<rev>.json
+
+直接在进程内驱动 FastAPI 应用（不经过网络），后端使用本地 mongod。
+每个接口输出吞吐量和 p50/p90/p99 延迟，报告为排序后的 JSON，可在提交之间 diff。
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from pathlib import Path
+
+# 必须在导入应用之前设置，server.init 在导入时读取配置
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "celeste_bench")
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("EMAIL", "bench@example.com")
+os.environ.setdefault("PASSWORD", "bench")
+
+import httpx  # noqa: E402
+
+from benchmarks.common import build_report, write_report, load_report, compare, print_table, summarize, \
+    DEFAULT_THRESHOLD  # noqa: E402
+from benchmarks.dataset import DEFAULT_PASSWORD  # noqa: E402
+
+# 1x1 PNG，用于媒体上传接口
+TINY_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+class Scenario:
+    def __init__(self, name: str, build, scale: float = 1.0):
+        # build(rng, ids) -> dict(method=..., url=..., **httpx kwargs)
+        self.name = name
+        self.build = build
+        # 全量接口（如列出所有用户）开销很大，按比例减少请求数
+        self.scale = scale
+
+
+SCENARIOS = [
+    # users
+    Scenario("users.get", lambda r, ids: dict(method="GET", url=f"/api/v1/users/{r.choice(ids['users'])}")),
+    Scenario("users.following", lambda r, ids: dict(method="GET", url=f"/api/v1/users/following/{r.choice(ids['users'])}")),
+    Scenario("users.follower", lambda r, ids: dict(method="GET", url=f"/api/v1/users/follower/{r.choice(ids['users'])}")),
+    Scenario("users.login", lambda r, ids: dict(
+        method="POST", url="/api/v1/users/login",
+        json={"email": r.choice(ids["emails"]), "password": DEFAULT_PASSWORD}
+    ), scale=0.2),
+    Scenario("users.list", lambda r, ids: dict(method="GET", url="/api/v1/users"), scale=0.01),
+    # posts
+    Scenario("posts.home", lambda r, ids: dict(method="GET", url="/api/v1/posts/home/"), scale=0.01),
+    Scenario("posts.get", lambda r, ids: dict(method="GET", url=f"/api/v1/posts/{r.choice(ids['posts'])}")),
+    Scenario("posts.user", lambda r, ids: dict(method="GET", url=f"/api/v1/posts/user/{r.choice(ids['users'])}")),
+    Scenario("posts.likes", lambda r, ids: dict(method="GET", url=f"/api/v1/posts/likes/{r.choice(ids['users'])}"), scale=0.1),
+    Scenario("posts.search", lambda r, ids: dict(
+        method="POST", url="/api/v1/posts/search", json={"kw": f"topic{r.randint(0, 200)}"}
+    ), scale=0.05),
+    Scenario("posts.like", lambda r, ids: dict(
+        method="PUT", url=f"/api/v1/posts/{r.choice(ids['posts'])}/like", json={"_id": r.choice(ids["users"])}
+    )),
+    # comments
+    Scenario("comments.by_post", lambda r, ids: dict(method="GET", url=f"/api/v1/posts/{r.choice(ids['posts'])}/comments")),
+    Scenario("comments.like", lambda r, ids: dict(
+        method="PUT", url=f"/api/v1/comments/{r.choice(ids['comments'])}/like",
+        params={"currentuser_id": r.choice(ids["users"])}
+    )),
+    Scenario("comments.list", lambda r, ids: dict(method="GET", url="/api/v1/comments"), scale=0.01),
+    # medias
+    Scenario("medias.upload", lambda r, ids: dict(
+        method="POST", url="/api/v1/medias",
+        files={"file": ("bench.png", TINY_PNG, "image/png")},
+        data={"data": f'{{"_id": "{r.choice(ids["users"])}", "type": "avatar"}}'}
+    ), scale=0.2),
+    # mails
+    Scenario("mails.list", lambda r, ids: dict(method="GET", url="/api/v1/mails"), scale=0.01),
+]
+
+
+async def sample_ids(sample_size: int) -> dict:
+    """从数据集中随机抽取请求使用的ID"""
+    from models.User import User
+    from models.Post import Post
+    from models.Comment import Comment
+
+    async def sample(model, field="_id"):
+        cursor = model.get_motor_collection().aggregate([
+            {"$sample": {"size": sample_size}},
+            {"$project": {field: 1}}
+        ])
+        return [str(doc[field]) for doc in await cursor.to_list(length=None)]
+
+    return {
+        "users": await sample(User),
+        "emails": await sample(User, "email"),
+        "posts": await sample(Post),
+        "comments": await sample(Comment),
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, ids: dict,
+                       total: int, concurrency: int, seed: int) -> dict:
+    rng = random.Random(f"{seed}:{scenario.name}")
+    requests = [scenario.build(rng, ids) for _ in range(max(1, int(total * scenario.scale)))]
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+    latencies = []
+    errors = 0
+    uploaded = []
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                request = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            method = request.pop("method")
+            url = request.pop("url")
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **request)
+                if response.status_code >= 400:
+                    errors += 1
+                elif scenario.name == "medias.upload":
+                    uploaded.append(response.json()["data"]["url"])
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(min(concurrency, len(requests)))])
+    elapsed = time.perf_counter() - start
+
+    # 清理上传接口写入的文件
+    for path in uploaded:
+        Path(path).unlink(missing_ok=True)
+
+    result = summarize(latencies)
+    result["errors"] = errors
+    result["rps"] = len(latencies) / elapsed if elapsed else 0.0
+    return result
+
+
+async def run(args) -> dict:
+    from server.app import app
+    from server.init import initiate_database
+
+    await initiate_database()
+    ids = await sample_ids(args.sample)
+
+    selected = [s for s in SCENARIOS if not args.only or any(s.name.startswith(p) for p in args.only)]
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for scenario in selected:
+            results[scenario.name] = await run_scenario(
+                client, scenario, ids, args.requests, args.concurrency, args.seed
+            )
+            print(f"  {scenario.name}: {results[scenario.name]['rps']:.1f} rps")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="接口压测")
+    parser.add_argument("--requests", type=int, default=500, help="每个接口的基准请求数")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--sample", type=int, default=1000, help="抽样ID数量")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", nargs="*", help="只运行指定前缀的场景，如 posts users.get")
+    parser.add_argument("--output", help="报告输出路径")
+    parser.add_argument("--compare", help="与指定报告对比")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    report = build_report(
+        "loadtest", results,
+        database=os.environ["DATABASE_NAME"],
+        requests=args.requests,
+        concurrency=args.concurrency,
+        seed=args.seed
+    )
+    path = write_report(report, args.output)
+
+    baseline = load_report(args.compare) if args.compare else None
+    print_table(results, baseline, metric="p99_ms")
+    print(f"report written to {path}")
+    if baseline:
+        regressions = compare(results, baseline, metric="p99_ms", threshold=args.threshold)
+        for name, base, current, ratio in regressions:
+            print(f"REGRESSION {name}: p99 {base:.2f}ms -> {current:.2f}ms ({ratio:.2f}x)")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
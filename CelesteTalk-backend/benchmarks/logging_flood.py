@@ -0,0 +1,111 @@
+"""
+日志洪峰下的处理器延迟基准
+
+    python -m benchmarks.logging_flood --records 20000 --tasks 100
+    python -m benchmarks.logging_flood --records 20000 --tasks 100 --sink /var/log/celeste-bench.log
+
+模拟错误风暴：多个协程同时在同一位置记录带异常堆栈的 ERROR 日志，
+统计调用方执行一次 logger.error 的耗时（即阻塞事件循环的时间）：
+- direct：改造前的同步 StreamHandler，格式化和写文件都在调用方完成
+- queue：QueueHandler + 后台线程写 JSON，不采样
+- queue_sampled：再加上按调用位置的限流采样
+不需要数据库。
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "celeste_bench")
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("EMAIL", "bench@example.com")
+os.environ.setdefault("PASSWORD", "bench")
+
+from benchmarks.common import build_report, print_table, summarize, write_report  # noqa: E402
+
+
+def build_handler(mode: str, stream, args):
+    from utils.log import build_pipeline
+
+    if mode == "direct":
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        return handler, None
+    burst = args.burst if mode == "queue_sampled" else 0
+    return build_pipeline(stream=stream, queue_size=args.queue, sample_burst=burst, sample_window=60.0)
+
+
+async def flood(logger: logging.Logger, records: int, tasks: int) -> list:
+    latencies = []
+    per_task = records // tasks
+
+    async def worker(worker_id: int):
+        for i in range(per_task):
+            try:
+                raise ValueError(f"invalid id {worker_id}-{i}")
+            except ValueError as e:
+                start = time.perf_counter()
+                logger.error("Error toggling like for post %s-%s: %s", worker_id, i, e, exc_info=True)
+                latencies.append(time.perf_counter() - start)
+            # 让出事件循环，模拟并发请求交替执行
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*[worker(i) for i in range(tasks)])
+    return latencies
+
+
+def run_mode(mode: str, args) -> dict:
+    sink = args.sink or os.path.join(tempfile.gettempdir(), f"celeste-log-flood-{mode}.log")
+    with open(sink, "w", encoding="utf-8") as stream:
+        handler, listener = build_handler(mode, stream, args)
+        logger = logging.getLogger(f"bench.flood.{mode}")
+        logger.propagate = False
+        logger.handlers = [handler]
+        logger.setLevel(logging.INFO)
+        if listener:
+            listener.start()
+
+        start = time.perf_counter()
+        latencies = asyncio.run(flood(logger, args.records, args.tasks))
+        elapsed = time.perf_counter() - start
+        # 记录后台线程写完所有日志的时间
+        if listener:
+            listener.stop()
+        drained = time.perf_counter() - start
+
+    result = summarize(latencies)
+    result.update({
+        "rps": len(latencies) / elapsed,
+        "drain_s": drained,
+        "dropped": getattr(handler, "dropped", 0),
+        "bytes": os.path.getsize(sink),
+    })
+    if not args.sink:
+        os.remove(sink)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日志洪峰下的处理器延迟基准")
+    parser.add_argument("--records", type=int, default=20000, help="记录的日志条数")
+    parser.add_argument("--tasks", type=int, default=100, help="并发协程数")
+    parser.add_argument("--queue", type=int, default=10000, help="日志队列上限")
+    parser.add_argument("--burst", type=int, default=10, help="采样模式下每个位置每分钟输出的条数")
+    parser.add_argument("--sink", help="日志写入的文件，默认使用临时文件")
+    parser.add_argument("--modes", nargs="+", default=["direct", "queue", "queue_sampled"])
+    args = parser.parse_args()
+
+    results = {mode: run_mode(mode, args) for mode in args.modes}
+    print_table(results)
+    for name, value in results.items():
+        print(f"{name}: p99 {value['p99_ms']:.3f} ms per call, {value['dropped']} dropped, "
+              f"{value['bytes']} bytes written, drained in {value['drain_s']:.2f}s")
+    path = write_report(build_report("logging_flood", results, records=args.records, tasks=args.tasks))
+    print(f"report written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+模型与工具函数的纯 Python 热点微基准
+
+    python -m benchmarks.micro                  # 运行并与基线对比
+    python -m benchmarks.micro --save-baseline  # 更新基线
+    python -m benchmarks.micro --only validate
+
+需要本地 mongod 完成 Beanie 初始化（不读写数据）。基线保存在 benchmarks/baselines/micro.json，
+单次耗时 p50 超过基线 threshold 倍时以非零状态退出。
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from beanie import init_beanie
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from benchmarks.common import BASELINE_DIR, DEFAULT_THRESHOLD, build_report, compare, load_report, \
+    print_table, time_call, write_report
+from models.Comment import Comment
+from models.Mail import Mail
+from models.Post import Post
+from models.User import User
+from utils.ranking import hot_scores, top_k_indices
+from utils.read_models import AUTHOR_PROJECTION, AuthorRead, CommentRead, PostRead
+from utils.time import add_minutes, format_datetime, format_datetime_now
+
+BASELINE_PATH = BASELINE_DIR / "micro.json"
+
+# 贴近真实规模的文档
+POST_LIKES = 10_000
+USER_FOLLOWERS = 50_000
+FEED_SIZE = 1_000
+# 信息流中普通帖子的点赞数
+FEED_POST_LIKES = 20
+
+
+async def init_models(url: str, db: str):
+    """Beanie 文档在解析前必须完成初始化"""
+    client = AsyncIOMotorClient(url)
+    await init_beanie(database=client[db], document_models=[User, Post, Comment, Mail])
+
+
+def ids(n: int) -> list:
+    return [ObjectId() for _ in range(n)]
+
+
+def raw_post(likes: int) -> dict:
+    """模拟从 MongoDB 读出的帖子文档"""
+    now = datetime.utcnow().replace(microsecond=0)
+    return {
+        "_id": ObjectId(),
+        "authorId": ObjectId(),
+        "content": "benchmark post " * 10,
+        "createdAt": now - timedelta(hours=5),
+        "isRepost": False,
+        "media": [{"type": "image", "url": "static/uploads/image/a.png"}] * 2,
+        "likes": ids(likes),
+        "repostCount": 12,
+        "originalPost": ObjectId(),
+        "replyTo": ObjectId(),
+        "updatedAt": now,
+    }
+
+
+def raw_user(followers: int) -> dict:
+    now = datetime.utcnow().replace(microsecond=0)
+    return {
+        "_id": ObjectId(),
+        "username": "bench",
+        "email": "bench@example.com",
+        "passwordHash": "$2b$12$" + "x" * 53,
+        "status": {"isActive": True, "isBanned": False, "lastLoginAt": now},
+        "settings": {"language": "en", "theme": "light", "notifications": {"email": True, "push": True}},
+        "avatar": "",
+        "headerImage": "",
+        "bio": "",
+        "following": ids(500),
+        "followers": ids(followers),
+        "postsCount": 0,
+        "likesCount": 0,
+        "createdAt": now,
+        "updatedAt": now,
+    }
+
+
+def raw_comment() -> dict:
+    now = datetime.utcnow().replace(microsecond=0)
+    return {
+        "_id": ObjectId(),
+        "postId": ObjectId(),
+        "authorId": ObjectId(),
+        "content": "benchmark comment",
+        "replyTo": ObjectId(),
+        "likes": ids(20),
+        "createdAt": now,
+        "updatedAt": now,
+    }
+
+
+def raw_mail() -> dict:
+    now = datetime.utcnow().replace(microsecond=0)
+    return {
+        "_id": ObjectId(),
+        "email": "bench@example.com",
+        "code": "1234",
+        "type": "register",
+        "isUsed": False,
+        "expireAt": now + timedelta(minutes=5),
+        "createdAt": now,
+    }
+
+
+def build_cases() -> dict:
+    """名称 -> (函数, 每轮调用次数)"""
+    post_doc = raw_post(POST_LIKES)
+    user_doc = raw_user(USER_FOLLOWERS)
+    comment_doc = raw_comment()
+    mail_doc = raw_mail()
+    post = Post.model_validate(dict(post_doc))
+    user = User.model_validate(dict(user_doc))
+    now_ms = int(time.time() * 1000)
+    # 每分钟一条帖子的候选列
+    feed_created = now_ms - np.arange(FEED_SIZE, dtype=np.int64) * 60_000
+    feed_likes = np.arange(FEED_SIZE, dtype=np.int64) % 50
+    feed_reposts = np.arange(FEED_SIZE, dtype=np.int64) % 7
+    now = format_datetime_now()
+    naive = datetime.utcnow()
+    # 一页信息流的原始文档，分别用 Beanie 模型和只读模型解码
+    feed_docs = [raw_post(FEED_POST_LIKES) for _ in range(FEED_SIZE)]
+    author_doc = {field: user_doc[field] for field in ("_id", *AUTHOR_PROJECTION)}
+    post_read = PostRead.from_raw(post_doc)
+
+    return {
+        # 每次加载文档都会执行的 model_validator(mode='before')
+        "hook.post": (lambda: Post.validate_data(dict(post_doc)), 10_000),
+        "hook.user": (lambda: User.validate_data(dict(user_doc)), 10_000),
+        "hook.comment": (lambda: Comment.validate_data(dict(comment_doc)), 10_000),
+        "hook.mail": (lambda: Mail.validate_data(dict(mail_doc)), 10_000),
+        # 完整的文档解析（含钩子）
+        "validate.post_10k_likes": (lambda: Post.model_validate(dict(post_doc)), 10),
+        "validate.user_50k_followers": (lambda: User.model_validate(dict(user_doc)), 5),
+        "validate.comment": (lambda: Comment.model_validate(dict(comment_doc)), 2_000),
+        "validate.mail": (lambda: Mail.model_validate(dict(mail_doc)), 2_000),
+        # 列表接口的只读模型：不执行钩子和逐字段校验
+        "read.post_10k_likes": (lambda: PostRead.from_raw(post_doc), 10),
+        "read.comment": (lambda: CommentRead.from_raw(comment_doc), 2_000),
+        "read.author": (lambda: AuthorRead.from_raw(author_doc), 10_000),
+        # 每页 1k 条帖子的解码耗时，除以 FEED_SIZE 即单个文档的解码成本
+        "decode.feed_1k.validate": (lambda: [Post.model_validate(dict(doc)) for doc in feed_docs], 2),
+        "decode.feed_1k.read": (lambda: [PostRead.from_raw(doc) for doc in feed_docs], 10),
+        # 响应序列化
+        "encode.post_10k_likes": (lambda: jsonable_encoder(post), 5),
+        "encode.post_read_10k_likes": (lambda: post_read.to_dict(), 5),
+        "encode.user_50k_followers": (lambda: jsonable_encoder(user), 2),
+        # 主页热度排序
+        "ranking.top_50_of_1k": (
+            lambda: top_k_indices(hot_scores(feed_created, feed_likes, feed_reposts, now_ms), feed_created, 50), 200
+        ),
+        # utils/time.py
+        "time.format_datetime_now": (format_datetime_now, 10_000),
+        "time.add_minutes": (lambda: add_minutes(now, 5), 10_000),
+        "time.add_minutes_naive": (lambda: add_minutes(naive, 5), 10_000),
+        "time.format_datetime": (lambda: format_datetime(naive), 10_000),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模型与工具函数微基准")
+    parser.add_argument("--only", nargs="*", help="只运行指定前缀的用例")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果写入基线")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--url", default=os.environ.get("DATABASE_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default="celeste_bench")
+    args = parser.parse_args()
+
+    asyncio.run(init_models(args.url, args.db))
+
+    results = {}
+    for name, (fn, number) in build_cases().items():
+        if args.only and not any(name.startswith(p) for p in args.only):
+            continue
+        results[name] = time_call(fn, number=number, repeat=args.repeat)
+
+    report = build_report("micro", results, repeat=args.repeat)
+    baseline = load_report(args.baseline)
+    print_table(results, baseline)
+
+    if args.save_baseline:
+        write_report(report, args.baseline)
+        print(f"baseline saved to {args.baseline}")
+        return
+
+    write_report(report)
+    if baseline:
+        regressions = compare(results, baseline, threshold=args.threshold)
+        for name, base, current, ratio in regressions:
+            print(f"REGRESSION {name}: {base:.4f}ms -> {current:.4f}ms ({ratio:.2f}x)")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
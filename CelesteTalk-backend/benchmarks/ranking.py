@@ -0,0 +1,85 @@
+"""
+主页热度排序的规模化基准: 逐帖子计算 + 全量排序 vs NumPy 向量化 + argpartition
+
+    python -m benchmarks.ranking
+    python -m benchmarks.ranking --sizes 10000 100000 1000000 --k 50
+
+不需要数据库，候选列由固定 seed 生成。
+"""
+import argparse
+import time
+from datetime import datetime, timezone, timedelta
+from math import exp
+
+import numpy as np
+
+from benchmarks.common import build_report, print_table, time_call, write_report
+from utils.ranking import DECAY_HOURS, hot_scores, top_k_indices
+
+CST_OFFSET = timezone(timedelta(hours=8))
+
+
+def legacy_rank(rows: list, now: datetime, k: int) -> list:
+    """改造前的实现：每个帖子构建字典、调用 exp 并做时区转换，再全量排序"""
+    scored_posts = []
+    for row in rows:
+        heat_score = row["likeCount"] + (row["repostCount"] * 2)
+        post_time = row["createdAt"].replace(tzinfo=timezone.utc).astimezone(CST_OFFSET)
+        time_diff = (now - post_time).total_seconds() / 3600
+        scored_posts.append({
+            'post': row,
+            'score': heat_score * exp(-time_diff / DECAY_HOURS)
+        })
+    return sorted(scored_posts, key=lambda x: x['score'], reverse=True)[:k]
+
+
+def make_candidates(size: int, seed: int):
+    rng = np.random.default_rng(seed)
+    now_ms = int(time.time() * 1000)
+    created = now_ms - rng.integers(0, 30 * 24 * 3600 * 1000, size=size, dtype=np.int64)
+    # 点赞和转发都是长尾分布，大部分帖子为 0
+    likes = rng.zipf(1.8, size=size).astype(np.int64) - 1
+    reposts = rng.zipf(2.5, size=size).astype(np.int64) - 1
+    return now_ms, created, likes, reposts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="主页排序规模化基准")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-legacy", action="store_true", help="跳过逐帖子实现（1M 时较慢）")
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        now_ms, created, likes, reposts = make_candidates(size, args.seed)
+
+        results[f"numpy.{size}"] = time_call(
+            lambda: top_k_indices(hot_scores(created, likes, reposts, now_ms), created, args.k),
+            number=1, repeat=args.repeat
+        )
+
+        if not args.skip_legacy:
+            now = datetime.fromtimestamp(now_ms / 1000, tz=CST_OFFSET)
+            rows = [
+                {
+                    "_id": i,
+                    "createdAt": datetime.utcfromtimestamp(int(c) / 1000),
+                    "likeCount": int(lk),
+                    "repostCount": int(rp),
+                }
+                for i, (c, lk, rp) in enumerate(zip(created, likes, reposts))
+            ]
+            results[f"legacy.{size}"] = time_call(
+                lambda: legacy_rank(rows, now, args.k), number=1, repeat=args.repeat
+            )
+
+    print_table(results)
+    path = write_report(build_report("ranking", results, k=args.k, seed=args.seed))
+    print(f"report written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+生产模式启动时间与吞吐量基准：1 个 worker 对比 N 个 worker
+
+    python -m benchmarks.dataset --size 10k --drop
+    python -m benchmarks.server --workers 1 4 --duration 10 --concurrency 128
+    python -m benchmarks.server --workers 1 4 --path /health
+
+每种 worker 数各启动一次 `main.py --prod`，记录从启动到健康检查通过的时间，
+再通过真实 TCP 连接压测指定接口，最后发送 SIGTERM 记录优雅关闭耗时。
+使用本地 mongod（DATABASE_URL / DATABASE_NAME 环境变量，默认 celeste_bench）。
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import build_report, print_table, summarize, write_report
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def server_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+    env.setdefault("DATABASE_NAME", "celeste_bench")
+    env.setdefault("SECRET_KEY", "bench-secret")
+    env.setdefault("EMAIL", "bench@example.com")
+    env.setdefault("PASSWORD", "bench")
+    return env
+
+
+def start_server(workers: int, port: int, log) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "main.py", "--prod", "--workers", str(workers), "--port", str(port), "--host", "127.0.0.1"],
+        cwd=BACKEND_DIR, env=server_env(), stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+def wait_ready(base_url: str, process: subprocess.Popen, timeout: float) -> float:
+    """轮询健康检查，返回启动耗时（秒）"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=0.5).status_code == 200:
+                return time.perf_counter() - start
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError("server did not become ready")
+
+
+async def drive(base_url: str, path: str, concurrency: int, duration: float) -> dict:
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+    result = summarize(latencies)
+    result.update({"rps": len(latencies) / elapsed, "errors": errors})
+    return result
+
+
+def bench_workers(workers: int, args) -> dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    log_path = BACKEND_DIR / "benchmarks" / "results" / f"server-{workers}w.log"
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, "w") as log:
+        process = start_server(workers, args.port, log)
+        try:
+            startup = wait_ready(base_url, process, args.startup_timeout)
+            result = asyncio.run(drive(base_url, args.path, args.concurrency, args.duration))
+        finally:
+            stop_start = time.perf_counter()
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            shutdown = time.perf_counter() - stop_start
+    result.update({"startup_s": startup, "shutdown_s": shutdown, "workers": workers})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生产模式 worker 数对比基准")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1], help="对比的 worker 数")
+    parser.add_argument("--path", default="/api/v1/posts/home/", help="压测的接口路径")
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    results = {}
+    for workers in args.workers:
+        results[f"workers_{workers}"] = bench_workers(workers, args)
+    print_table(results)
+    for name, value in results.items():
+        print(f"{name}: startup {value['startup_s']:.2f}s, shutdown {value['shutdown_s']:.2f}s, "
+              f"{value['rps']:.0f} rps, {value['errors']} errors")
+    path = write_report(build_report(
+        "server", results, path=args.path, concurrency=args.concurrency, duration=args.duration
+    ))
+    print(f"report written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,58 @@
+import argparse
+import importlib.util
+import logging
+import os
 import uvicorn
 
-if __name__ == "__main__":
-    uvicorn.run("server.app:app", host="0.0.0.0", port=8000, reload=True)
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Celeste Talk API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--prod", action="store_true", help="生产模式：多 worker、uvloop/httptools、不自动重载")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)),
+                        help="生产模式下的 worker 进程数，默认读取 WEB_CONCURRENCY 或 CPU 核数")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="关闭时等待进行中请求的最长秒数，超时后强制断开（包括 SSE 长连接）")
+    return parser.parse_args()
+
 
+def pre_fork_check():
+    """
+    在启动 worker 之前导入一次应用
 
+    配置缺失或导入错误在主进程中直接失败，而不是让每个 worker 反复崩溃重启；
+    同时生成字节码缓存，加快 worker 的导入。
+    """
+    import server.app  # noqa: F401
 
 
+def run_production(args):
+    pre_fork_check()
+    # uvloop 不支持 Windows，未安装时退回标准事件循环
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    if loop != "uvloop" or http != "httptools":
+        logger.warning("uvloop/httptools not available, using loop=%s http=%s", loop, http)
+    uvicorn.run(
+        "server.app:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=loop,
+        http=http,
+        lifespan="on",
+        timeout_graceful_shutdown=args.graceful_timeout,
+        proxy_headers=True,
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.prod:
+        run_production(args)
+    else:
+        uvicorn.run("server.app:app", host=args.host, port=args.port, reload=True)
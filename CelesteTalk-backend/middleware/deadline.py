@@ -0,0 +1,119 @@
+import json
+import logging
+import time
+import pymongo
+from pymongo.errors import PyMongoError
+from starlette.routing import Match
+from server.init import settings
+from utils.deadline import DeadlineExceeded, deadline_tracker, deadline_var
+
+logger = logging.getLogger(__name__)
+
+# 客户端传入的超时（秒），只能缩短路由预算
+TIMEOUT_HEADER = b"x-request-timeout"
+# Mongo 按剩余时间减去往返延迟设置 maxTimeMS，接口把超时异常转成 500 时离截止时间可能还差一个往返
+DEADLINE_SLACK = 0.1
+
+
+def client_timeout(scope) -> float:
+    for name, value in scope.get("headers", []):
+        if name == TIMEOUT_HEADER:
+            try:
+                timeout = float(value.decode("latin-1"))
+            except ValueError:
+                return None
+            return timeout if timeout > 0 else None
+    return None
+
+
+async def send_timeout(send):
+    body = json.dumps({"code": 504, "msg": "Request deadline exceeded", "data": None}).encode()
+    await send({"type": "http.response.start", "status": 504, "headers": [
+        (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())
+    ]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class DeadlineMiddleware:
+    """
+    为每个请求设置截止时间，并在 pymongo.timeout 中执行请求
+
+    预算取 REQUEST_TIMEOUTS 中按路由名配置的值（0 表示不限时，如 SSE 和导出），未配置的路由使用
+    REQUEST_TIMEOUT；客户端可用 X-Request-Timeout 请求头缩短。请求内的每个 Motor 调用都以剩余时间
+    作为 maxTimeMS 和套接字超时（Motor 在线程池中执行时会复制 contextvars），超时后服务端终止查询。
+    SMTP 等外部调用通过 utils.deadline.within_deadline 等待剩余时间。
+    超时抛出的异常和截止时间过后接口返回的 500 统一转为 504，并计入 deadlines 指标。
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    def _route_budget(self, scope) -> float:
+        if self._routes is None:
+            # 只匹配单独配置了预算的路由
+            routes = scope["app"].router.routes
+            self._routes = [
+                (route, settings.REQUEST_TIMEOUTS[route.name])
+                for route in routes if getattr(route, "name", None) in settings.REQUEST_TIMEOUTS
+            ]
+        for route, budget in self._routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return budget
+        return settings.REQUEST_TIMEOUT
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        budget = self._route_budget(scope)
+        requested = client_timeout(scope)
+        if requested is not None:
+            budget = min(budget, requested) if budget else requested
+        if not budget:
+            await self.app(scope, receive, send)
+            return
+
+        deadline = time.monotonic() + budget
+        state = {"started": False, "replaced": False, "timedOut": False}
+
+        def expired() -> bool:
+            return time.monotonic() >= deadline - DEADLINE_SLACK
+
+        async def send_with_deadline(message):
+            if message["type"] == "http.response.start":
+                if message["status"] == 500 and expired():
+                    # 丢弃接口的 500 响应，改为 504
+                    state["replaced"] = True
+                    return
+                state["started"] = True
+            elif state["replaced"]:
+                if not message.get("more_body", False):
+                    await self._timed_out(scope, send, state)
+                return
+            await send(message)
+
+        deadline_tracker.record_request()
+        token = deadline_var.set(deadline)
+        try:
+            with pymongo.timeout(budget):
+                await self.app(scope, receive, send_with_deadline)
+        except (DeadlineExceeded, PyMongoError) as e:
+            if isinstance(e, PyMongoError) and not e.timeout:
+                raise
+            if state["started"]:
+                # 响应已开始发送（如流式响应），只能断开
+                raise
+            logger.warning("request deadline of %ss exceeded: %s", budget, e)
+            await self._timed_out(scope, send, state)
+        finally:
+            deadline_var.reset(token)
+
+    async def _timed_out(self, scope, send, state: dict):
+        if state["timedOut"]:
+            return
+        state["timedOut"] = True
+        route = scope.get("route")
+        deadline_tracker.record_response_timeout(getattr(route, "path", None) or "unmatched")
+        await send_timeout(send)
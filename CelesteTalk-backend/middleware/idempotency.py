@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+import re
+from utils.idempotency import idempotency_store
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_HEADER = b"idempotency-key"
+REPLAYED_HEADER = b"idempotent-replayed"
+MAX_KEY_LENGTH = 255
+
+# 支持 Idempotency-Key 的写接口：发帖、点赞/取消点赞、转发、评论
+IDEMPOTENT_ROUTES = [
+    ("POST", re.compile(r"^/api/v1/posts/?$")),
+    ("PUT", re.compile(r"^/api/v1/posts/[^/]+/like$")),
+    ("DELETE", re.compile(r"^/api/v1/posts/[^/]+/like$")),
+    ("POST", re.compile(r"^/api/v1/posts/[^/]+/repost$")),
+    ("POST", re.compile(r"^/api/v1/posts/[^/]+/comment$")),
+]
+
+
+def idempotency_key(scope) -> str:
+    for name, value in scope.get("headers", []):
+        if name == IDEMPOTENCY_KEY_HEADER:
+            return value.decode("latin-1")[:MAX_KEY_LENGTH]
+    return None
+
+
+def is_idempotent_route(method: str, path: str) -> bool:
+    return any(method == route_method and pattern.match(path) for route_method, pattern in IDEMPOTENT_ROUTES)
+
+
+async def send_record(send, record: dict):
+    """重放保存的响应"""
+    headers = [tuple(header) for header in record["headers"]] + [(REPLAYED_HEADER, b"true")]
+    await send({"type": "http.response.start", "status": record["statusCode"], "headers": headers})
+    await send({"type": "http.response.body", "body": record["body"] or b""})
+
+
+async def send_conflict(send):
+    body = json.dumps({
+        "code": 409, "msg": "A request with this Idempotency-Key is still in progress", "data": None
+    }).encode()
+    await send({"type": "http.response.start", "status": 409, "headers": [
+        (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())
+    ]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """
+    带 Idempotency-Key 请求头的写请求只执行一次
+
+    - 已完成的请求直接重放保存的状态码、响应头和响应体（附带 Idempotent-Replayed: true）
+    - 本进程内的并发重复请求等待同一次执行的结果；其他 worker 中执行的请求通过轮询记录等待，
+      超过 IDEMPOTENCY_WAIT_TIMEOUT 返回 409
+    - 5xx 响应和异常不保存，客户端重试会重新执行
+    key 按 (方法, 路径) 区分，同一个 key 用于不同请求体时返回第一次的响应。
+    """
+
+    def __init__(self, app, store=idempotency_store):
+        self.app = app
+        self.store = store
+        # (key, method, path) -> 本进程内正在执行的请求的 future，结果为完成的记录或 None
+        self._inflight = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not is_idempotent_route(scope["method"], scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        key = idempotency_key(scope)
+        if not key:
+            await self.app(scope, receive, send)
+            return
+
+        ident = {"key": key, "method": scope["method"], "path": scope["path"]}
+        inflight_key = (key, scope["method"], scope["path"])
+        try:
+            record = await self._wait_or_claim(ident, inflight_key)
+        except Exception as e:
+            # 存储不可用时不阻塞写入，按普通请求执行
+            self.store.errors += 1
+            logger.error("idempotency store unavailable, executing without key: %s", e)
+            await self.app(scope, receive, send)
+            return
+        if record is not None:
+            if record["status"] == "complete":
+                self.store.replayed += 1
+                await send_record(send, record)
+            else:
+                await send_conflict(send)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[inflight_key] = future
+        try:
+            await self._execute(scope, receive, send, ident, future)
+        finally:
+            self._inflight.pop(inflight_key, None)
+
+    async def _wait_or_claim(self, ident: dict, inflight_key: tuple):
+        """占位成功返回 None，否则返回要重放的记录（pending 表示等待超时）"""
+        while True:
+            future = self._inflight.get(inflight_key)
+            if future is not None:
+                self.store.waited += 1
+                record = await asyncio.shield(future)
+                if record is not None:
+                    return record
+                # 执行失败已释放占位，重新占位执行
+                continue
+            existing = await self.store.claim(ident)
+            if existing is None:
+                return None
+            if existing["status"] == "complete":
+                return existing
+            record = await self.store.wait(ident)
+            if record is not None:
+                return record
+
+    async def _execute(self, scope, receive, send, ident: dict, future: asyncio.Future):
+        response = {"status": None, "headers": [], "body": bytearray(), "storable": True}
+
+        async def send_capturing(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [list(header) for header in message.get("headers", [])]
+            elif message["type"] == "http.response.body" and response["storable"]:
+                response["body"].extend(message.get("body", b""))
+                if len(response["body"]) > self.store.max_body:
+                    response["storable"] = False
+                    response["body"] = bytearray()
+            await send(message)
+
+        record = None
+        try:
+            await self.app(scope, receive, send_capturing)
+        except BaseException:
+            try:
+                await asyncio.shield(self.store.release(ident))
+            except Exception as e:
+                logger.error("failed to release idempotency key %s: %s", ident['key'], e)
+            raise
+        else:
+            # 响应已经发出，保存失败只影响之后的重放
+            try:
+                if response["status"] is not None and response["status"] < 500 and response["storable"]:
+                    record = await self.store.complete(
+                        ident, response["status"], response["headers"], bytes(response["body"])
+                    )
+                else:
+                    await self.store.release(ident)
+            except Exception as e:
+                self.store.errors += 1
+                logger.error("failed to store idempotent response for key %s: %s", ident['key'], e)
+        finally:
+            if not future.done():
+                future.set_result(record)
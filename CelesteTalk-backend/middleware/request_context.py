@@ -0,0 +1,45 @@
+import uuid
+from utils.log import request_id_var, request_scope_var
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+
+class RequestContextMiddleware:
+    """
+    为每个请求设置请求ID，写入日志上下文并通过 X-Request-ID 响应头返回
+
+    使用纯 ASGI 中间件，不缓冲响应体，对 SSE 等流式响应没有影响。
+    客户端或网关传入 X-Request-ID 时沿用该值。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")[:64]
+                break
+        if not request_id:
+            request_id = uuid.uuid4().hex
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((REQUEST_ID_HEADER, request_id.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        id_token = request_id_var.set(request_id)
+        # 保存 scope，路由匹配后可从中取到路由模板
+        scope_token = request_scope_var.set(scope)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(id_token)
+            request_scope_var.reset(scope_token)
@@ -1,4 +1,6 @@
+import json
 from typing import TypeVar, Optional, Generic
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, Field
 
 T = TypeVar('T')
@@ -9,4 +11,10 @@ class CommonResponse(BaseModel, Generic[T]):
     data: Optional[T] = Field(default=None)
 
     class Config:
-        arbitrary_types_allowed = True  # 允许任意类型
\ No newline at end of file
+        arbitrary_types_allowed = True  # 允许任意类型
+
+
+def render_response(data, code: int = 200, msg: str = "success") -> bytes:
+    """序列化为与 JSONResponse 相同的响应体，便于缓存"""
+    content = jsonable_encoder(CommonResponse(code=code, msg=msg, data=data))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
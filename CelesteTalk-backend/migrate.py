@@ -0,0 +1,65 @@
+"""
+执行数据迁移
+
+    python migrate.py status
+    python migrate.py run --all --dry-run
+    python migrate.py run users_counters --ops-per-second 500
+
+迁移在线执行，可以随时中断，再次执行从断点继续。
+"""
+import argparse
+import asyncio
+import logging
+from server.init import close_database, initiate_database, settings
+import utils.backfills  # noqa: F401  注册迁移
+from utils.migrations import MIGRATIONS, MigrationRunner
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Celeste Talk data migrations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="列出已注册的迁移和执行进度")
+    run = commands.add_parser("run", help="执行迁移，已完成的迁移会跳过")
+    run.add_argument("names", nargs="*", help="要执行的迁移名称")
+    run.add_argument("--all", action="store_true", help="按注册顺序执行所有迁移")
+    run.add_argument("--dry-run", action="store_true", help="只统计将要修改的文档数，不写入数据和断点")
+    run.add_argument("--restart", action="store_true", help="忽略断点和完成状态，从头执行")
+    run.add_argument("--batch-size", type=int, default=settings.MIGRATION_BATCH_SIZE)
+    run.add_argument("--ops-per-second", type=float, default=settings.MIGRATION_OPS_PER_SECOND,
+                     help="每秒最多的操作数（读取的文档加写操作），0 不限速")
+    return parser.parse_args()
+
+
+async def show_status(runner: MigrationRunner):
+    for item in await runner.status():
+        print(f"{item['name']:<28} {item['status']:<9} {item['collection']:<10} "
+              f"scanned={item['scanned']} modified={item['modified']} lastId={item['lastId']}")
+        if item["error"]:
+            print(f"    error: {item['error']}")
+
+
+async def run_migrations(runner: MigrationRunner, args):
+    names = list(MIGRATIONS) if args.all else args.names
+    unknown = [name for name in names if name not in MIGRATIONS]
+    if unknown or not names:
+        raise SystemExit(f"unknown migrations: {unknown}" if unknown else "no migrations given, use --all")
+    for name in names:
+        result = await runner.run(MIGRATIONS[name], dry_run=args.dry_run, restart=args.restart)
+        print(f"{name}: {result}")
+
+
+async def main(args):
+    await initiate_database()
+    try:
+        if args.command == "status":
+            await show_status(MigrationRunner(settings.MIGRATION_BATCH_SIZE, 0, settings.MIGRATION_LOCK_TIMEOUT))
+        else:
+            runner = MigrationRunner(args.batch_size, args.ops_per_second, settings.MIGRATION_LOCK_TIMEOUT)
+            await run_migrations(runner, args)
+    finally:
+        close_database()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main(parse_args()))
@@ -1,7 +1,9 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from pydantic import Field, model_validator
-from beanie import Document, PydanticObjectId
+from beanie import Delete, Document, Insert, PydanticObjectId, Replace, Save, SaveChanges, Update, after_event
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from utils.invalidation import invalidate
 from utils.time import format_datetime_now
 
 class Comment(Document):
@@ -10,9 +12,9 @@ class Comment(Document):
     authorId: PydanticObjectId = Field(..., description="评论作者ID")
     content: str = Field(..., description="评论内容")
     
-    # 非必填字段，但需要有效的ObjectId
-    replyTo: PydanticObjectId = Field(
-        default_factory=PydanticObjectId, 
+    # 非必填字段，为空表示顶层评论
+    replyTo: Optional[PydanticObjectId] = Field(
+        default=None,
         description="回复的评论ID"
     )
     likes: List[PydanticObjectId] = Field(
@@ -20,6 +22,11 @@ class Comment(Document):
         description="点赞用户ID列表"
     )
     
+    deletedAt: Optional[datetime] = Field(
+        default=None,
+        description="删除时间，非空表示已删除、等待后台级联清理"
+    )
+
     # 时间字段
     createdAt: datetime = Field(
         default_factory=format_datetime_now,
@@ -36,11 +43,8 @@ class Comment(Document):
         if not isinstance(data, dict):
             return data
         
-        # 确保replyTo始终是有效的ObjectId
-        if 'replyTo' not in data or data['replyTo'] is None:
-            data['replyTo'] = str(PydanticObjectId())  # 生成新的ObjectId
-            
-        # 其他默认值设置
+        # 默认值设置
+        data.setdefault('replyTo', None)
         data.setdefault('likes', [])
         
         # 时间戳
@@ -50,9 +54,29 @@ class Comment(Document):
 
         return data
 
+    @after_event(Insert, Replace, Save, SaveChanges, Update, Delete)
+    def invalidate_cache(self):
+        # 评论变更同时影响所属帖子的评论列表和评论数
+        invalidate("comment", self.id)
+        invalidate("comments", self.postId)
+
     class Settings:
         name = "comments"
         validate_on_save = True
+        indexes = [
+            # 按帖子分页顶层评论、按父评论分页回复；_id 用于同一时间的排序
+            IndexModel(
+                [("postId", ASCENDING), ("replyTo", ASCENDING), ("createdAt", ASCENDING), ("_id", ASCENDING)],
+                name="postId_replyTo_createdAt"
+            ),
+            # 管理列表按时间倒序分页
+            IndexModel([("createdAt", DESCENDING), ("_id", DESCENDING)], name="createdAt"),
+            # 清理滞留的墓碑
+            IndexModel(
+                [("deletedAt", ASCENDING)], name="deletedAt",
+                partialFilterExpression={"deletedAt": {"$type": "date"}}
+            ),
+        ]
 
     model_config = {
         "json_schema_extra": {
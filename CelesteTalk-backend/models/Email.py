@@ -1,32 +1,46 @@
 import random
 import logging
+from email.message import EmailMessage
+from functools import lru_cache
 
-from dotenv import load_dotenv
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
-from jinja2 import Template
 from pydantic import EmailStr
 
 from models.Mail import Mail
 from server.init import settings
+from utils.deadline import within_deadline
 from utils.time import format_datetime_now
 
-# 设置日志记录
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
-# 加载环境变量
-load_dotenv()
-# 配置邮件发送
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.EMAIL,
-    MAIL_PASSWORD=settings.PASSWORD,
-    MAIL_FROM=settings.EMAIL,
-    MAIL_PORT=465, 
-    MAIL_SERVER="smtp.qq.com",
-    MAIL_STARTTLS=False,  # 关闭STARTTLS
-    MAIL_SSL_TLS=True,  # 启用SSL/TLS
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True
-)
+
+MAIL_SERVER = "smtp.qq.com"
+MAIL_PORT = 465
+
+
+@lru_cache(maxsize=1)
+def get_mailer():
+    """首次发送邮件时才导入 fastapi_mail 并构建 SMTP 配置"""
+    from fastapi_mail import FastMail, ConnectionConfig
+    conf = ConnectionConfig(
+        MAIL_USERNAME=settings.EMAIL,
+        MAIL_PASSWORD=settings.PASSWORD,
+        MAIL_FROM=settings.EMAIL,
+        MAIL_PORT=MAIL_PORT,
+        MAIL_SERVER=MAIL_SERVER,
+        MAIL_STARTTLS=False,  # 关闭STARTTLS
+        MAIL_SSL_TLS=True,  # 启用SSL/TLS
+        USE_CREDENTIALS=True,
+        VALIDATE_CERTS=True,
+        TIMEOUT=int(settings.SMTP_TIMEOUT)
+    )
+    return FastMail(conf)
+
+
+@lru_cache(maxsize=None)
+def load_template(template_path: str):
+    """模板按路径缓存，只读取和编译一次"""
+    from jinja2 import Template
+    with open(template_path, encoding='utf-8') as file_:
+        return Template(file_.read())
 
 
 def generate_random_code():
@@ -34,9 +48,8 @@ def generate_random_code():
 
 
 async def send_verify_code(email: EmailStr, verify_code: str, template_path: str):
-    with open(template_path, encoding='utf-8') as file_:
-        template = Template(file_.read())
-    html_content = template.render(verify_code=verify_code)
+    from fastapi_mail import MessageSchema
+    html_content = load_template(template_path).render(verify_code=verify_code)
     message = MessageSchema(
         subject="验证码",
         recipients=[email],
@@ -44,19 +57,53 @@ async def send_verify_code(email: EmailStr, verify_code: str, template_path: str
         subtype="html"
     )
 
-    fm = FastMail(conf)
     try:
-        await fm.send_message(message)
+        # 最多等待 SMTP_TIMEOUT 秒，且不超过请求的截止时间
+        await within_deadline(get_mailer().send_message(message), settings.SMTP_TIMEOUT, operation="smtp")
         logger.info("验证码发送成功")
     except Exception as e:
         if "Malformed SMTP response" in str(e):
             # 如果是格式错误但邮件已发送，则忽略该错误
-            logger.warning(f"邮件已发送，但出现SMTP响应格式警告: {str(e)}")
+            logger.warning("邮件已发送，但出现SMTP响应格式警告: %s", e)
             return
-        logger.error(f"发送验证码时出错: {str(e)}")
+        logger.error("发送验证码时出错: %s", e)
         raise e
 
 
+async def send_batch(messages: list) -> list:
+    """
+    通过同一个 SMTP 连接依次发送多封 HTML 邮件，messages 为 [(收件地址, 主题, 正文)]
+
+    返回发送成功的收件地址；单封失败只记录日志，连接或登录失败时抛出异常。
+    aiosmtplib 随 fastapi_mail 安装。
+    """
+    import aiosmtplib
+    # timeout 作用于连接、登录和每封邮件的每条 SMTP 命令
+    smtp = aiosmtplib.SMTP(hostname=MAIL_SERVER, port=MAIL_PORT, use_tls=True, timeout=settings.SMTP_TIMEOUT)
+    await smtp.connect()
+    sent = []
+    try:
+        await smtp.login(settings.EMAIL, settings.PASSWORD)
+        for address, subject, html_content in messages:
+            message = EmailMessage()
+            message["From"] = settings.EMAIL
+            message["To"] = address
+            message["Subject"] = subject
+            message.set_content(html_content, subtype="html")
+            try:
+                await smtp.send_message(message)
+                sent.append(address)
+            except aiosmtplib.SMTPException as e:
+                logger.error("发送邮件到 %s 时出错: %s", address, e)
+    finally:
+        try:
+            await smtp.quit()
+        except aiosmtplib.SMTPException as e:
+            # 与 send_verify_code 相同，QUIT 时的格式错误不影响已发送的邮件
+            logger.warning("关闭SMTP连接时出现警告: %s", e)
+    return sent
+
+
 async def verify_code(email: str, code: str, type: str) -> bool:
     """验证码校验"""
     mail_records = await Mail.find({
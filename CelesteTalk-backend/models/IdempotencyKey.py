@@ -0,0 +1,30 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import Field
+from beanie import Document
+from pymongo import ASCENDING, IndexModel
+from utils.time import format_datetime_now
+
+
+class IdempotencyKey(Document):
+    # 每个 (Idempotency-Key, 方法, 路径) 一条记录，先占位再执行，完成后保存响应
+    key: str = Field(..., description="客户端传入的 Idempotency-Key")
+    method: str = Field(..., description="请求方法")
+    path: str = Field(..., description="请求路径")
+    status: str = Field(default="pending", enum=["pending", "complete"], description="执行状态")
+    lockedUntil: datetime = Field(..., description="占位的有效期，执行中的 worker 崩溃后其他请求可在此之后接手")
+    statusCode: Optional[int] = Field(default=None, description="保存的响应状态码")
+    headers: List[List[bytes]] = Field(default_factory=list, description="保存的响应头")
+    body: Optional[bytes] = Field(default=None, description="保存的响应体")
+    createdAt: datetime = Field(default_factory=format_datetime_now, description="创建时间")
+    expiresAt: datetime = Field(..., description="过期时间，过期后同一个 key 视为新请求")
+
+    class Settings:
+        name = "idempotency_keys"
+        indexes = [
+            IndexModel(
+                [("key", ASCENDING), ("method", ASCENDING), ("path", ASCENDING)],
+                name="key_method_path", unique=True
+            ),
+            IndexModel([("expiresAt", ASCENDING)], name="expiresAt_ttl", expireAfterSeconds=0),
+        ]
@@ -0,0 +1,19 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import Field
+from beanie import Document
+from pymongo import ASCENDING, IndexModel
+from utils.time import format_datetime_now
+
+
+class Lease(Document):
+    # 多个 worker 共享的定期任务每个一条记录，同一时刻只有持有者执行
+    name: str = Field(..., description="任务名称")
+    holder: Optional[str] = Field(default=None, description="持有租约的 worker")
+    expiresAt: datetime = Field(default_factory=format_datetime_now, description="租约到期时间，到期后其他 worker 可接手")
+
+    class Settings:
+        name = "leases"
+        indexes = [
+            IndexModel([("name", ASCENDING)], name="name", unique=True),
+        ]
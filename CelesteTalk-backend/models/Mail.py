@@ -1,6 +1,7 @@
 from datetime import datetime
 from pydantic import Field, model_validator
 from beanie import Document
+from pymongo import DESCENDING, IndexModel
 from utils.time import format_datetime_now, add_minutes
 
 class Mail(Document):
@@ -52,6 +53,10 @@ class Mail(Document):
     class Settings:
         name = "mails"  
         validate_on_save = True
+        indexes = [
+            # 管理列表按时间倒序分页
+            IndexModel([("createdAt", DESCENDING), ("_id", DESCENDING)], name="createdAt"),
+        ]
 
     class Config:
         json_schema_extra = {
@@ -0,0 +1,29 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import Field
+from beanie import Document, PydanticObjectId
+from pymongo import ASCENDING, IndexModel
+from utils.time import format_datetime_now
+
+
+class Migration(Document):
+    # 每个已注册的迁移一条记录，保存执行状态和断点，中断后从 lastId 之后继续
+    name: str = Field(..., description="迁移名称")
+    status: str = Field(
+        default="pending", enum=["pending", "running", "complete", "failed"], description="执行状态"
+    )
+    runId: Optional[PydanticObjectId] = Field(default=None, description="当前持有执行权的运行ID")
+    lockedUntil: Optional[datetime] = Field(default=None, description="执行权的有效期，进程崩溃后其他运行可在此之后接手")
+    lastId: Optional[PydanticObjectId] = Field(default=None, description="已处理完的最后一个文档_id")
+    scanned: int = Field(default=0, description="已扫描的文档数")
+    modified: int = Field(default=0, description="已修改的文档数")
+    error: Optional[str] = Field(default=None, description="最近一次失败的错误信息")
+    startedAt: Optional[datetime] = Field(default=None, description="开始时间")
+    completedAt: Optional[datetime] = Field(default=None, description="完成时间")
+    updatedAt: datetime = Field(default_factory=format_datetime_now, description="最近一次写入断点的时间")
+
+    class Settings:
+        name = "migrations"
+        indexes = [
+            IndexModel([("name", ASCENDING)], name="name", unique=True),
+        ]
@@ -0,0 +1,39 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import Field
+from beanie import Document, PydanticObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from utils.time import format_datetime_now
+
+
+class Notification(Document):
+    # 同一收件人、同一类型、同一目标的未读通知合并为一条，如 "X 和其他 37 人赞了你的帖子"
+    userId: PydanticObjectId = Field(..., description="收件人ID")
+    type: str = Field(..., enum=["like", "repost", "comment", "reply", "follow", "mention"], description="通知类型")
+    targetId: Optional[PydanticObjectId] = Field(default=None, description="相关的帖子ID，关注通知为空")
+    actorIds: List[PydanticObjectId] = Field(default_factory=list, description="最近的几位操作者，最新的在前")
+    actorCount: int = Field(default=0, description="合并的操作次数")
+    read: bool = Field(default=False, description="是否已读，已读后新的操作生成新通知")
+    emailPending: bool = Field(default=False, description="是否等待发送邮件摘要")
+    createdAt: datetime = Field(default_factory=format_datetime_now, description="创建时间")
+    updatedAt: datetime = Field(default_factory=format_datetime_now, description="最近一次合并的时间")
+
+    class Settings:
+        name = "notifications"
+        indexes = [
+            # 收件箱按最近更新倒序分页；_id 用于同一时间的排序
+            IndexModel(
+                [("userId", ASCENDING), ("updatedAt", DESCENDING), ("_id", DESCENDING)],
+                name="userId_updatedAt"
+            ),
+            # 每组只有一条未读通知，合并时按此 upsert
+            IndexModel(
+                [("userId", ASCENDING), ("type", ASCENDING), ("targetId", ASCENDING)],
+                name="unread_group", unique=True, partialFilterExpression={"read": False}
+            ),
+            # 邮件摘要任务只扫描等待发送的通知
+            IndexModel(
+                [("emailPending", ASCENDING), ("userId", ASCENDING)], name="emailPending",
+                partialFilterExpression={"emailPending": True}
+            ),
+        ]
@@ -1,10 +1,16 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel, Field, model_validator
-from beanie import Document, PydanticObjectId
+from pymongo import ASCENDING, IndexModel
+from beanie import Delete, Document, Insert, PydanticObjectId, Replace, Save, SaveChanges, Update, after_event
+from utils.invalidation import invalidate
 from utils.time import format_datetime_now
 
 
+# 读路径的查询条件：排除已删除（墓碑）的帖子和评论
+NOT_DELETED = {"deletedAt": None}
+
+
 class Media(BaseModel):
     type: str = Field(
         ...,  # 必填
@@ -25,9 +31,12 @@ class Post(Document):
     media: List[Media] = Field(default_factory=list, description="媒体列表")
     likes: List[PydanticObjectId] = Field(default_factory=list, description="点赞用户ID列表")
     repostCount: int = Field(default=0, description="转发数")
-    originalPost: PydanticObjectId = Field(default_factory=PydanticObjectId, description="原始帖子ID")
-    replyTo: PydanticObjectId = Field(default_factory=PydanticObjectId, description="回复的帖子ID")
+    views: int = Field(default=0, description="浏览数")
+    uniqueViews: int = Field(default=0, description="独立访客数（估算）")
+    originalPost: Optional[PydanticObjectId] = Field(default=None, description="原始帖子ID，仅转发帖有值")
+    replyTo: Optional[PydanticObjectId] = Field(default=None, description="回复的帖子ID，不是回复时为空")
     updatedAt: datetime = Field(default_factory=format_datetime_now, description="更新时间")
+    deletedAt: Optional[datetime] = Field(default=None, description="删除时间，非空表示已删除、等待后台级联清理")
 
     @model_validator(mode='before')
     @classmethod
@@ -48,15 +57,35 @@ class Post(Document):
         data.setdefault('media', [])
         data.setdefault('likes', [])
         data.setdefault('repostCount', 0)
-        data.setdefault('originalPost', str(PydanticObjectId()))
-        data.setdefault('replyTo', str(PydanticObjectId()))
+        data.setdefault('views', 0)
+        data.setdefault('uniqueViews', 0)
+        data.setdefault('replyTo', None)
+        # 旧数据为非转发帖填充了随机的原帖ID，读取时一并清除
+        if not data['isRepost']:
+            data['originalPost'] = None
+        data.setdefault('originalPost', None)
         data.setdefault('updatedAt', now)
 
         return data
 
+    @after_event(Insert, Replace, Save, SaveChanges, Update, Delete)
+    def invalidate_cache(self):
+        # 通过 Beanie 写入后失效缓存，集合级的原始更新需要自行调用 invalidate
+        invalidate("post", self.id)
+
     class Settings:
         name = "posts"
         validate_on_save = True
+        indexes = [
+            # 级联删除查找转发帖、清理时判断上传文件是否仍被引用
+            IndexModel([("originalPost", ASCENDING)], name="originalPost"),
+            IndexModel([("media.url", ASCENDING)], name="media_url"),
+            # 清理滞留的墓碑
+            IndexModel(
+                [("deletedAt", ASCENDING)], name="deletedAt",
+                partialFilterExpression={"deletedAt": {"$type": "date"}}
+            ),
+        ]
 
     model_config = {
         "json_schema_extra": {
@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import Field
+from beanie import Document, PydanticObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from utils.time import format_datetime_now
+
+
+class PostTag(Document):
+    # 每个 (帖子, 话题/提及) 一条记录，发帖时写入
+    tag: str = Field(..., description="话题或被提及的用户名，小写")
+    kind: str = Field(..., enum=["hashtag", "mention"], description="hashtag 或 mention")
+    postId: PydanticObjectId = Field(..., description="帖子ID")
+    authorId: PydanticObjectId = Field(..., description="帖子作者ID")
+    userId: Optional[PydanticObjectId] = Field(default=None, description="被提及用户的ID，未找到用户时为空")
+    createdAt: datetime = Field(default_factory=format_datetime_now, description="帖子创建时间")
+
+    class Settings:
+        name = "post_tags"
+        indexes = [
+            # 按话题倒序分页帖子；_id 用于同一时间的排序
+            IndexModel(
+                [("kind", ASCENDING), ("tag", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+                name="kind_tag_createdAt"
+            ),
+            # 删除帖子时清理
+            IndexModel([("postId", ASCENDING)], name="postId"),
+        ]
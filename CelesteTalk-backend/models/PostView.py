@@ -0,0 +1,15 @@
+from datetime import datetime
+from pydantic import Field
+from beanie import Document
+from utils.time import format_datetime_now
+
+
+class PostView(Document):
+    # _id 与帖子ID相同
+    sketch: bytes = Field(..., description="独立访客 HyperLogLog 草图")
+    uniqueViewers: int = Field(default=0, description="独立访客数（估算）")
+    rev: int = Field(default=0, description="版本号，用于并发合并草图")
+    updatedAt: datetime = Field(default_factory=format_datetime_now, description="更新时间")
+
+    class Settings:
+        name = "post_views"
@@ -0,0 +1,26 @@
+from datetime import datetime
+from pydantic import Field
+from beanie import Document
+from pymongo import ASCENDING, IndexModel
+
+
+class TagBucket(Document):
+    # 话题的分钟计数，完整的小时汇总为一条小时计数；过期后由 TTL 索引删除
+    tag: str = Field(..., description="话题，小写")
+    granularity: str = Field(..., enum=["minute", "hour"], description="minute 或 hour")
+    start: datetime = Field(..., description="时间段开始时间（UTC）")
+    hour: datetime = Field(..., description="所在小时的开始时间（UTC），用于汇总")
+    total: int = Field(default=0, description="时间段内使用该话题的帖子数")
+    expiresAt: datetime = Field(..., description="过期时间")
+
+    class Settings:
+        name = "tag_buckets"
+        indexes = [
+            IndexModel(
+                [("granularity", ASCENDING), ("tag", ASCENDING), ("start", ASCENDING)],
+                name="granularity_tag_start", unique=True
+            ),
+            # 热门榜按时间窗口聚合
+            IndexModel([("granularity", ASCENDING), ("start", ASCENDING)], name="granularity_start"),
+            IndexModel([("expiresAt", ASCENDING)], name="expiresAt_ttl", expireAfterSeconds=0),
+        ]
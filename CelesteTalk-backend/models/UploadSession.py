@@ -0,0 +1,34 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import Field
+from beanie import Document, PydanticObjectId
+from pymongo import ASCENDING, IndexModel
+from utils.time import format_datetime_now
+
+
+class UploadSession(Document):
+    # 分片上传会话，完成后 _id 即为发帖时引用的 mediaId
+    ownerId: PydanticObjectId = Field(..., description="上传用户ID")
+    filename: str = Field(..., description="原始文件名")
+    contentType: str = Field(..., description="文件MIME类型")
+    mediaType: str = Field(..., enum=["image", "video"], description="媒体类型")
+    size: int = Field(..., description="文件总字节数")
+    received: int = Field(default=0, description="已连续写入的字节数，续传从这里开始")
+    status: str = Field(
+        default="uploading", enum=["uploading", "completing", "complete"],
+        description="上传状态，completing 表示正在把临时文件移入上传目录"
+    )
+    writer: Optional[PydanticObjectId] = Field(default=None, description="正在写入分片的请求，写入前在数据库中认领")
+    writingUntil: Optional[datetime] = Field(default=None, description="分片写入认领的到期时间，写入中断后其他请求可在此之后接手")
+    url: Optional[str] = Field(default=None, description="完成后的文件路径")
+    createdAt: datetime = Field(default_factory=format_datetime_now, description="创建时间")
+    updatedAt: datetime = Field(default_factory=format_datetime_now, description="最后写入时间")
+    expiresAt: datetime = Field(..., description="过期时间，过期后会话被删除，未被帖子引用的文件由清理任务删除")
+
+    class Settings:
+        name = "upload_sessions"
+        indexes = [
+            IndexModel([("expiresAt", ASCENDING)], name="expiresAt_ttl", expireAfterSeconds=0),
+            # 清理任务判断文件是否仍被未过期的会话引用
+            IndexModel([("url", ASCENDING)], name="url", partialFilterExpression={"url": {"$type": "string"}}),
+        ]
@@ -1,7 +1,9 @@
 from datetime import datetime
 from typing import List,  Any
 from pydantic import BaseModel, Field, model_validator
-from beanie import Document, PydanticObjectId
+from pymongo import DESCENDING, IndexModel
+from beanie import Delete, Document, Insert, PydanticObjectId, Replace, Save, SaveChanges, Update, after_event
+from utils.invalidation import invalidate
 from utils.time import format_datetime_now
 
 class Status(BaseModel):
@@ -64,8 +66,10 @@ class User(Document):
     bio: str = Field(default="", description="用户简介")
     following: List[PydanticObjectId] = Field(default_factory=list)
     followers: List[PydanticObjectId] = Field(default_factory=list)
-    postsCount: int = Field(default=0)
-    likesCount: int = Field(default=0)
+    postsCount: int = Field(default=0, description="发帖数（含转发）")
+    likesCount: int = Field(default=0, description="点赞过的帖子数")
+    followersCount: int = Field(default=0, description="粉丝数")
+    followingCount: int = Field(default=0, description="关注数")
     createdAt: datetime = Field(default_factory=format_datetime_now)
     updatedAt: datetime = Field(default_factory=format_datetime_now)
 
@@ -99,6 +103,8 @@ class User(Document):
             data.setdefault('followers', [])
             data.setdefault('postsCount', 0)
             data.setdefault('likesCount', 0)
+            data.setdefault('followersCount', len(data['followers']))
+            data.setdefault('followingCount', len(data['following']))
             
             # 设置时间戳
             now = format_datetime_now()
@@ -107,9 +113,18 @@ class User(Document):
 
         return data
 
+    @after_event(Insert, Replace, Save, SaveChanges, Update, Delete)
+    def invalidate_cache(self):
+        # 通过 Beanie 写入后失效缓存，集合级的原始更新需要自行调用 invalidate
+        invalidate("user", self.id)
+
     class Settings:
         name = "users"
         validate_on_save = True
+        indexes = [
+            # 管理列表按注册时间倒序分页
+            IndexModel([("createdAt", DESCENDING), ("_id", DESCENDING)], name="createdAt"),
+        ]
 
     model_config = {
         "json_schema_extra": {
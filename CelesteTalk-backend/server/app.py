@@ -1,28 +1,118 @@
+from contextlib import asynccontextmanager
+import logging
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException
 from fastapi.responses import JSONResponse
 from starlette.middleware.cors import CORSMiddleware
-from server.init import initiate_database
+from server.init import initiate_database, close_database, settings
+from server.warmup import warm_up
+from middleware.deadline import DeadlineMiddleware
+from middleware.idempotency import IdempotencyMiddleware
+from middleware.request_context import RequestContextMiddleware
+from middleware.response import CommonResponse
+from utils import metrics
+from utils.cache import comment_cache, comment_list_cache, post_cache, user_cache
+from utils.cascade import cascade_worker, orphan_sweeper
+from utils.counters import counter_reconciler
+from utils.deadline import deadline_tracker
+from utils.engagement_buffer import engagement_buffer
+from utils.feed_cache import feed_cache
+from utils.idempotency import idempotency_store
+from utils.loader import comment_loader, post_loader, user_loader
+from utils.log import start_logging, stop_logging
+from utils.notifications import notification_digest, notification_queue
+from utils.pubsub import broker
+from utils.read_routing import CAUSAL_TOKEN_HEADER, read_router
+from utils.trending import tag_counter, trending_tracker
+from utils.uploads import upload_manager
+from utils.view_counter import view_buffer
 from api.v1.router import router as api_v1_router
 from fastapi.staticfiles import StaticFiles
 
+logger = logging.getLogger(__name__)
+
+metrics.register("cache.post", post_cache.cache.stats)
+metrics.register("cache.user", user_cache.cache.stats)
+metrics.register("cache.comment", comment_cache.cache.stats)
+metrics.register("cache.comments", comment_list_cache.stats)
+metrics.register("feedCache", feed_cache.stats)
+metrics.register("loader.post", post_loader.stats)
+metrics.register("loader.user", user_loader.stats)
+metrics.register("loader.comment", comment_loader.stats)
+metrics.register("buffer.view", view_buffer.stats)
+metrics.register("buffer.engagement", engagement_buffer.stats)
+metrics.register("events", broker.stats)
+metrics.register("buffer.tags", tag_counter.stats)
+metrics.register("trending", trending_tracker.stats)
+metrics.register("counters", counter_reconciler.stats)
+metrics.register("cascade", cascade_worker.stats)
+metrics.register("sweeper", orphan_sweeper.stats)
+metrics.register("uploads", upload_manager.stats)
+metrics.register("readRouting", read_router.stats)
+metrics.register("idempotency", idempotency_store.stats)
+metrics.register("notifications", notification_queue.stats)
+metrics.register("notificationDigest", notification_digest.stats)
+metrics.register("deadlines", deadline_tracker.stats)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动：连接数据库、预热、启动后台刷新任务，完成后 worker 才开始接收请求
+    start_logging(settings)
+    await initiate_database()
+    await warm_up()
+    view_buffer.start()
+    engagement_buffer.start()
+    tag_counter.start()
+    notification_queue.start()
+    notification_digest.start()
+    trending_tracker.start()
+    counter_reconciler.start()
+    cascade_worker.start()
+    orphan_sweeper.start()
+    yield
+    # 关闭：服务器已停止接收新请求并等待进行中的请求结束，
+    # 这里写入缓冲区中尚未落库的浏览数、点赞、转发、话题计数和通知，等待后台任务后关闭连接池
+    await engagement_buffer.stop()
+    await view_buffer.stop()
+    await tag_counter.stop()
+    await notification_queue.stop()
+    await notification_digest.stop()
+    await trending_tracker.stop()
+    await counter_reconciler.stop()
+    await orphan_sweeper.stop()
+    await cascade_worker.stop()
+    await feed_cache.wait_idle()
+    close_database()
+    logger.info("shutdown complete")
+    stop_logging()
+
+
 app = FastAPI(
     title="Celeste Talk API",
     description="FastAPI based chat application",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 # API版本路由
 app.include_router(api_v1_router, prefix="/api/v1")
+# 最内层：只保存接口本身的响应，CORS 和请求ID响应头在重放时由外层重新添加
+app.add_middleware(IdempotencyMiddleware)
+# 截止时间包含幂等键的读写；超时转成的 504 不会被保存
+app.add_middleware(DeadlineMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", CAUSAL_TOKEN_HEADER, "Idempotent-Replayed"],
 )
+# 最外层：请求ID对之后的所有中间件和接口的日志都可见
+app.add_middleware(RequestContextMiddleware)
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exception: HTTPException):
@@ -36,10 +126,11 @@ async def http_exception_handler(request: Request, exception: HTTPException):
     )
 
 
-
-@app.on_event("startup")
-async def start_database():
-    await initiate_database()
-
+@app.get("/health", response_description="健康检查")
+async def health():
+    return CommonResponse(code=200, msg="success", data={"status": "ok"})
 
 
+@app.get("/metrics", response_description="缓存、缓冲区和推送等运行指标")
+async def get_metrics():
+    return CommonResponse(code=200, msg="success", data=metrics.snapshot())
@@ -1,3 +1,4 @@
+from typing import Dict, List, Optional
 from beanie import init_beanie
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic_settings import BaseSettings
@@ -5,13 +6,16 @@ from models.User import User
 from models.Post import Post
 from models.Comment import Comment
 from models.Mail import Mail
+from models.PostView import PostView
+from models.PostTag import PostTag
+from models.TagBucket import TagBucket
+from models.UploadSession import UploadSession
+from models.IdempotencyKey import IdempotencyKey
+from models.Migration import Migration
+from models.Notification import Notification
+from models.Lease import Lease
 import logging
-import dns.resolver
-dns.resolver.default_resolver=dns.resolver.Resolver(configure=False)
-dns.resolver.default_resolver.nameservers=['8.8.8.8']
 
-# 设置日志
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
@@ -28,6 +32,115 @@ class Settings(BaseSettings):
     EMAIL: str
     PASSWORD: str
 
+    # 日志配置，在应用启动时生效，导入模块不修改全局日志
+    # LOG_LEVELS 按 logger 名称单独设置级别，如 {"pymongo": "WARNING", "utils.write_buffer": "DEBUG"}
+    # 同一位置的 WARNING 及以上日志每 LOG_SAMPLE_WINDOW 秒最多输出 LOG_SAMPLE_BURST 条
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: Dict[str, str] = {}
+    LOG_FORMAT: str = "json"
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_SAMPLE_BURST: int = 10
+    LOG_SAMPLE_WINDOW: float = 60.0
+
+    # 解析 mongodb+srv 地址使用的 DNS 服务器，如 ["8.8.8.8"]；为空时使用系统配置
+    DNS_NAMESERVERS: List[str] = []
+
+    # 浏览数缓冲配置 - 刷新间隔（秒）与最大未刷新条数，决定崩溃时的最大丢失量
+    VIEW_FLUSH_INTERVAL: float = 5.0
+    VIEW_MAX_PENDING: int = 10000
+
+    # 点赞/转发缓冲配置 - 合并窗口（秒）与最大未刷新条数
+    ENGAGEMENT_FLUSH_INTERVAL: float = 0.5
+    ENGAGEMENT_MAX_PENDING: int = 5000
+
+    # 用户计数校准 - 间隔（秒，0 关闭）与每批写入的用户数
+    COUNTER_RECONCILE_INTERVAL: float = 3600.0
+    COUNTER_RECONCILE_BATCH: int = 500
+
+    # 删除与清理 - 级联删除每批处理的文档数、认领墓碑后其他 worker 可重新认领的时间（秒）、
+    # 孤儿清理间隔（秒，0 关闭）、墓碑重试和新上传文件的宽限期（秒，需长于一次上传所需的时间）
+    CASCADE_BATCH_SIZE: int = 500
+    CASCADE_CLAIM_TIMEOUT: float = 600.0
+    GC_INTERVAL: float = 3600.0
+    GC_GRACE_PERIOD: float = 600.0
+
+    # 分片上传 - 单个文件和单个分片的最大字节数、同时写磁盘的分片数、会话有效期（秒，每次写入和完成时顺延，
+    # 完成后需在有效期内发帖引用）、分片临时目录（不能在静态目录下，多个 worker 需共享同一目录）
+    UPLOAD_MAX_SIZE: int = 512 * 1024 * 1024
+    UPLOAD_CHUNK_SIZE: int = 8 * 1024 * 1024
+    UPLOAD_MAX_CONCURRENT_WRITES: int = 4
+    UPLOAD_SESSION_TTL: float = 86400.0
+    UPLOAD_PART_DIR: str = "tmp/uploads"
+
+    # 幂等键 - 保存响应的时长（秒）、执行中占位的有效期（秒，需长于写接口的最长耗时）、
+    # 重复请求等待其他 worker 执行完成的最长时间（秒，超时返回 409）、可保存的最大响应体字节数
+    IDEMPOTENCY_TTL: float = 86400.0
+    IDEMPOTENCY_LOCK_TIMEOUT: float = 60.0
+    IDEMPOTENCY_WAIT_TIMEOUT: float = 10.0
+    IDEMPOTENCY_MAX_BODY: int = 1024 * 1024
+
+    # 数据迁移 - 每批读取的文档数、每秒最多的操作数（读取的文档加写操作，0 不限速）、
+    # 执行权的有效期（秒，进程崩溃后其他运行在此之后才能接手）
+    MIGRATION_BATCH_SIZE: int = 500
+    MIGRATION_OPS_PER_SECOND: float = 2000.0
+    MIGRATION_LOCK_TIMEOUT: float = 300.0
+
+    # 通知 - 事件合并后写入收件箱的间隔（秒）与最大未写入条数、每人保留的通知数、每条通知保留的操作者数；
+    # 邮件摘要的发送间隔（秒，0 关闭邮件）与每个 SMTP 连接发送的收件人数
+    NOTIFY_FLUSH_INTERVAL: float = 2.0
+    NOTIFY_MAX_PENDING: int = 5000
+    NOTIFY_INBOX_SIZE: int = 200
+    NOTIFY_MAX_ACTORS: int = 3
+    NOTIFY_DIGEST_INTERVAL: float = 900.0
+    NOTIFY_DIGEST_BATCH: int = 100
+
+    # 读路由 - 按查询类别（feed、search、likes、followers）设置读偏好，如 {"feed": "secondaryPreferred"}；
+    # 未列出的类别以及登录和写入都读主节点；从节点最大复制延迟（秒，MongoDB 要求不小于 90）
+    READ_PREFERENCES: Dict[str, str] = {}
+    READ_MAX_STALENESS: int = 90
+
+    # 话题统计 - 计数刷新间隔（秒）与最大未刷新条数、热门榜重新计算间隔（秒）、统计窗口（分钟，不超过 120）、榜单长度
+    TRENDING_FLUSH_INTERVAL: float = 5.0
+    TRENDING_MAX_PENDING: int = 10000
+    TRENDING_REFRESH_INTERVAL: float = 30.0
+    TRENDING_WINDOW_MINUTES: int = 60
+    TRENDING_SIZE: int = 20
+
+    # 主页信息流缓存 - 新鲜期、过期后仍可返回旧数据的时长（秒）、最多缓存的页数，FEED_CACHE_TTL=0 关闭缓存
+    FEED_CACHE_TTL: float = 5.0
+    FEED_CACHE_STALE: float = 30.0
+    FEED_CACHE_MAX_ENTRIES: int = 64
+
+    # 实时推送 - 每个连接最多排队的消息数（满了丢弃最旧的）、心跳间隔（秒）
+    EVENTS_QUEUE_SIZE: int = 100
+    EVENTS_HEARTBEAT: float = 15.0
+
+    # 文档缓存 - 本地 LRU 与共享层（REDIS_URL，需安装 redis）的有效期（秒）、不存在结果的有效期、本地最多条数
+    # 其他 worker 的写入不会通知本地层，跨 worker 的陈旧时间上限为 CACHE_LOCAL_TTL，设为 0 关闭缓存
+    REDIS_URL: Optional[str] = None
+    CACHE_LOCAL_TTL: float = 5.0
+    CACHE_SHARED_TTL: float = 60.0
+    CACHE_NEGATIVE_TTL: float = 2.0
+    CACHE_MAX_ENTRIES: int = 10000
+
+    # 条件请求 - 各路由的 Cache-Control 策略，如 {"get_post": "public, max-age=30"}
+    CACHE_CONTROL: Dict[str, str] = {}
+
+    # 请求截止时间 - 默认预算（秒，0 不限时）、按路由名覆盖的预算（0 不限时，用于 SSE、导出和上传），
+    # 客户端可用 X-Request-Timeout 缩短；SMTP 调用的超时（秒）
+    REQUEST_TIMEOUT: float = 10.0
+    REQUEST_TIMEOUTS: Dict[str, float] = {
+        "search_posts": 5.0,
+        "get_home_posts": 5.0,
+        "create_post": 60.0,
+        "send_email_verify_code": 20.0,
+        "put_chunk": 0,
+        "stream_events": 0,
+        "export_users": 0,
+        "export_comments": 0,
+        "export_mails": 0,
+    }
+    SMTP_TIMEOUT: float = 15.0
 
     class Config:
         env_file = ".env"
@@ -37,24 +150,44 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
+# 由 initiate_database 创建，应用关闭时由 close_database 关闭
+client = None
+
+
+def configure_dns():
+    """按配置替换 dnspython 的默认解析器，只在连接数据库前调用"""
+    if not settings.DNS_NAMESERVERS:
+        return
+    import dns.resolver
+    resolver = dns.resolver.Resolver(configure=False)
+    resolver.nameservers = settings.DNS_NAMESERVERS
+    dns.resolver.default_resolver = resolver
+
 
 async def initiate_database():
+    global client
     try:
+        configure_dns()
         client = AsyncIOMotorClient(settings.DATABASE_URL)
         # 验证连接
         await client.admin.command('ping')
-        logger.info(f"Successfully connected to MongoDB: {settings.DATABASE_NAME}")
-
-        # 检查数据库中的集合
-        db = client[settings.DATABASE_NAME]
-        collections = await db.list_collection_names()
-        logger.info(f"Available collections: {collections}")
+        logger.info("Successfully connected to MongoDB: %s", settings.DATABASE_NAME)
 
         await init_beanie(
             database=client[settings.DATABASE_NAME],
-            document_models=[User, Post, Comment,Mail]
+            document_models=[User, Post, Comment, Mail, PostView, PostTag, TagBucket, UploadSession, IdempotencyKey,
+                             Migration, Notification, Lease]
         )
         logger.info("Beanie initialization completed")
     except Exception as e:
-        logger.error(f"Database connection error: {str(e)}")
+        logger.error("Database connection error: %s", e)
         raise
+
+
+def close_database():
+    """关闭 MongoDB 连接池"""
+    global client
+    if client is not None:
+        client.close()
+        client = None
+        logger.info("MongoDB client closed")
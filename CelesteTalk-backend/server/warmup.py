@@ -0,0 +1,30 @@
+import logging
+import time
+import numpy as np
+from middleware.response import render_response
+from models.Post import Post
+from models.User import User
+from utils.ranking import hot_scores, top_k_indices
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_up():
+    """
+    在 worker 开始接收请求前预热
+
+    建立数据库连接并走一遍热点查询，触发 NumPy 排序和响应序列化的首次调用开销，
+    避免这些开销落在第一批用户请求上。
+    """
+    start = time.perf_counter()
+    # 建立连接池中的连接，并预热常用集合的查询路径
+    await Post.get_motor_collection().find_one({}, {"_id": 1})
+    await User.get_motor_collection().find_one({}, {"_id": 1})
+
+    # NumPy 首次调用会加载内部实现
+    created = np.arange(8, dtype=np.int64)
+    scores = hot_scores(created, np.ones(8, dtype=np.int64), np.zeros(8, dtype=np.int64), int(time.time() * 1000))
+    top_k_indices(scores, created, 4)
+
+    render_response({"posts": []})
+    logger.info("warm-up finished in %.1f ms", (time.perf_counter() - start) * 1000)
@@ -0,0 +1,11 @@
+import os
+
+# 测试不连接数据库和邮件服务，只需满足 Settings 的必填项
+for key, value in {
+    "DATABASE_URL": "mongodb://localhost:27017",
+    "DATABASE_NAME": "celeste_test",
+    "SECRET_KEY": "test",
+    "EMAIL": "test@example.com",
+    "PASSWORD": "test",
+}.items():
+    os.environ.setdefault(key, value)
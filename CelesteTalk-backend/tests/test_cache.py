@@ -0,0 +1,67 @@
+import asyncio
+from utils.cache import TieredCache
+
+
+class FakeSharedTier:
+    """与 RedisTier 相同的接口，代数比较在内存中完成"""
+
+    def __init__(self):
+        self.data = {}
+        self.generations = {}
+        self.errors = 0
+        self.stale_writes = 0
+
+    async def get(self, namespace, group, variant):
+        generation = str(self.generations.get((namespace, group), 0))
+        return self.data.get((namespace, group, variant)), generation
+
+    async def set(self, namespace, group, variant, value, stored_at, ttl, generation):
+        if str(self.generations.get((namespace, group), 0)) != generation:
+            self.stale_writes += 1
+            return False
+        self.data[(namespace, group, variant)] = (value, stored_at)
+        return True
+
+    async def invalidate(self, namespace, group):
+        self.generations[(namespace, group)] = self.generations.get((namespace, group), 0) + 1
+        for key in [key for key in self.data if key[:2] == (namespace, group)]:
+            del self.data[key]
+
+
+def build(shared, namespace):
+    return TieredCache(namespace, local_ttl=5, shared_ttl=60, negative_ttl=1, max_entries=100, shared=shared)
+
+
+def test_stale_load_is_not_written_to_shared_tier():
+    shared = FakeSharedTier()
+    # 两个 worker 各自的缓存，共享同一个共享层
+    reader, writer = build(shared, "test-a"), build(shared, "test-b")
+    writer.namespace = reader.namespace
+
+    async def main():
+        loading = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_load():
+            loading.set()
+            await release.wait()
+            return {"v": "old"}
+
+        read = asyncio.ensure_future(reader.get("doc", "doc", slow_load))
+        await loading.wait()
+        # 另一个 worker 在加载期间写入并失效了该文档
+        await shared.invalidate(writer.namespace, "doc")
+        release.set()
+        assert await read == {"v": "old"}
+        assert shared.data == {}
+        assert shared.stale_writes == 1
+
+        # 失效之后开始的加载正常写回
+        async def load():
+            return {"v": "new"}
+        fresh = build(shared, "test-c")
+        fresh.namespace = reader.namespace
+        assert await fresh.get("doc", "doc", load) == {"v": "new"}
+        assert shared.data[(reader.namespace, "doc", "doc")][0] == {"v": "new"}
+
+    asyncio.run(main())
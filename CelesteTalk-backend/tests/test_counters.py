@@ -0,0 +1,93 @@
+import asyncio
+from collections import Counter
+from models.Post import Post
+from models.User import User
+from utils.counters import CounterReconciler
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        self.docs = sorted(self.docs, key=lambda doc: doc[key])
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class FakeUsers:
+    def __init__(self, users):
+        self.users = users
+        self.writes = []
+
+    def find(self, query, projection):
+        after = query.get("_id", {}).get("$gt", 0)
+        docs = []
+        for user in self.users:
+            if user["_id"] <= after:
+                continue
+            docs.append({"_id": user["_id"], **{field: user[field] for field in projection if field in user}})
+        return Cursor(docs)
+
+    def aggregate(self, pipeline, **kwargs):
+        user_ids = pipeline[0]["$match"]["_id"]["$in"]
+        return Cursor([
+            {"_id": user["_id"], "followers": len(user.get("followers", [])),
+             "following": len(user.get("following", []))}
+            for user in self.users if user["_id"] in user_ids
+        ])
+
+    async def bulk_write(self, operations, ordered=True):
+        self.writes.append(operations)
+
+        class Result:
+            modified_count = len(operations)
+        return Result()
+
+
+class FakePosts:
+    """只按调用方传入的用户ID统计，记录每次聚合涉及的用户"""
+
+    def __init__(self, posts):
+        self.posts = posts
+        self.batches = []
+
+    def aggregate(self, pipeline, **kwargs):
+        match = pipeline[0]["$match"]
+        if "authorId" in match:
+            user_ids = match["authorId"]["$in"]
+            counts = Counter(post["authorId"] for post in self.posts if post["authorId"] in user_ids)
+        else:
+            user_ids = match["likes"]["$in"]
+            counts = Counter(like for post in self.posts for like in post["likes"] if like in user_ids)
+        self.batches.append(sorted(user_ids))
+        return Cursor([{"_id": user_id, "count": count} for user_id, count in counts.items()])
+
+
+def test_reconcile_walks_users_in_batches(monkeypatch):
+    users = FakeUsers([
+        {"_id": 1, "postsCount": 2, "likesCount": 0, "followersCount": 0, "followingCount": 0},
+        {"_id": 2, "postsCount": 9, "likesCount": 1, "followersCount": 3, "followingCount": 0, "followers": [1]},
+        {"_id": 3, "postsCount": 0, "likesCount": 0, "followersCount": 0, "followingCount": 0},
+    ])
+    posts = FakePosts([{"authorId": 1, "likes": [2]}, {"authorId": 1, "likes": [3]}])
+    monkeypatch.setattr(User, "get_motor_collection", classmethod(lambda cls: users))
+    monkeypatch.setattr(Post, "get_motor_collection", classmethod(lambda cls: posts))
+
+    corrected = asyncio.run(CounterReconciler(interval=60, batch_size=2).reconcile())
+
+    # 每次聚合只统计当前这批用户
+    assert posts.batches == [[1, 2], [1, 2], [3], [3]]
+    assert corrected == 2
+    first, second = users.writes
+    # 以旧值为条件按差值修正，未变化的字段不写入
+    assert first[0]._filter == {"_id": 2, "postsCount": 9, "followersCount": 3}
+    assert first[0]._doc["$inc"] == {"postsCount": -9, "followersCount": -2}
+    assert second[0]._doc["$inc"] == {"likesCount": 1}
+    assert "updatedAt" in second[0]._doc["$set"]
@@ -0,0 +1,48 @@
+import asyncio
+from types import SimpleNamespace
+from models.Post import Post
+from models.User import User
+from utils.engagement_buffer import EngagementBuffer
+
+
+class BlockingCollection:
+    """bulk_write 等待 release 后才返回，模拟写入中的窗口"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.writes = []
+
+    async def bulk_write(self, operations, ordered=True):
+        await self.release.wait()
+        self.writes.append(operations)
+
+
+def test_in_flight_batch_stays_readable(monkeypatch):
+    async def main():
+        posts, users = BlockingCollection(), BlockingCollection()
+        users.release.set()
+        monkeypatch.setattr(Post, "get_motor_collection", classmethod(lambda cls: posts))
+        monkeypatch.setattr(User, "get_motor_collection", classmethod(lambda cls: users))
+        buffer = EngagementBuffer(interval=60, max_pending=1000)
+        buffer.set_like("p1", "u1", True)
+        buffer.add_repost("p1")
+
+        flush = asyncio.ensure_future(buffer.flush())
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        # 写入未完成：缓冲区已清空，但这一批仍然可读
+        assert buffer.pending() == 0
+        assert buffer.pending_like("p1", "u1") is True
+        post = buffer.apply_pending(SimpleNamespace(id="p1", likes=[], repostCount=0))
+        assert post.likes == ["u1"] and post.repostCount == 1
+        # 写入期间的新操作覆盖正在写入的状态
+        buffer.set_like("p1", "u1", False)
+        assert buffer.apply_pending(SimpleNamespace(id="p1", likes=[], repostCount=0)).likes == []
+
+        posts.release.set()
+        await flush
+        assert len(posts.writes) == 1
+        assert buffer.pending_like("p1", "u1") is False
+        assert buffer.apply_pending(SimpleNamespace(id="p1", likes=["u1"], repostCount=1)).repostCount == 1
+
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+import asyncio
+import time
+import pymongo
+from pymongo import _csot
+from utils.deadline import deadline_var
+from utils.loader import DocumentLoader
+
+
+class FakeCursor:
+    def __init__(self, collection, query):
+        self.collection = collection
+        self.query = query
+
+    async def to_list(self, length=None):
+        # 记录批量查询执行时所在上下文的截止时间
+        self.collection.seen.append((_csot.get_timeout(), deadline_var.get()))
+        await asyncio.sleep(0.05)
+        return [{"_id": doc_id} for doc_id in self.query["_id"]["$in"]]
+
+
+class FakeCollection:
+    def __init__(self):
+        self.seen = []
+
+    def find(self, query):
+        return FakeCursor(self, query)
+
+
+class FakeModel:
+    collection = FakeCollection()
+
+    @classmethod
+    def get_motor_collection(cls):
+        return cls.collection
+
+
+async def request(loader, doc_id, budget):
+    # 与 DeadlineMiddleware 相同的方式设置请求的截止时间
+    token = deadline_var.set(time.monotonic() + budget)
+    try:
+        with pymongo.timeout(budget):
+            return await loader.load_raw(doc_id)
+    finally:
+        deadline_var.reset(token)
+
+
+def test_batch_does_not_inherit_caller_deadline():
+    FakeModel.collection = FakeCollection()
+    loader = DocumentLoader(FakeModel)
+
+    async def main():
+        return await asyncio.gather(
+            request(loader, 1, 0.01), request(loader, 2, 5), return_exceptions=True
+        )
+
+    short, long = asyncio.run(main())
+    # 两个请求合并为一次查询，查询不带任何一个请求的截止时间
+    assert loader.batches == 1
+    assert FakeModel.collection.seen == [(None, None)]
+    # 截止时间短的请求按自己的预算超时，另一个请求正常拿到结果
+    assert type(short).__name__ == "DeadlineExceeded"
+    assert long == {"_id": 2}
@@ -0,0 +1,67 @@
+import asyncio
+from pymongo.errors import BulkWriteError
+from models.Notification import Notification
+from models.User import User
+from utils.notifications import NotificationQueue
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class FakeUsers:
+    def __init__(self):
+        self.fail = True
+
+    def find(self, query, projection):
+        if self.fail:
+            self.fail = False
+            raise ConnectionError("users unavailable")
+        return Cursor([{"_id": user_id} for user_id in query["_id"]["$in"]])
+
+
+class FakeNotifications:
+    """第一次写入时第二个操作失败"""
+
+    def __init__(self):
+        self.writes = []
+
+    async def bulk_write(self, operations, ordered=True):
+        if not self.writes:
+            self.writes.append(operations[:1])
+            raise BulkWriteError({"writeErrors": [{"index": 1, "code": 2}]})
+        self.writes.append(operations)
+
+    def aggregate(self, pipeline):
+        return Cursor([])
+
+
+def test_failed_groups_are_requeued(monkeypatch):
+    async def main():
+        users, notifications = FakeUsers(), FakeNotifications()
+        monkeypatch.setattr(User, "get_motor_collection", classmethod(lambda cls: users))
+        monkeypatch.setattr(Notification, "get_motor_collection", classmethod(lambda cls: notifications))
+        queue = NotificationQueue(interval=60, max_pending=1000, inbox_size=100, max_actors=5)
+        queue.emit("u1", "like", "a1", "p1")
+        queue.emit("u2", "follow", "a1")
+
+        # 读取通知设置失败，全部放回
+        await queue.flush()
+        assert queue.failed == 1 and queue.pending() == 2
+
+        # 写入部分失败，只放回失败的组，并排在之后发生的事件之前
+        queue.emit("u2", "follow", "a2")
+        await queue.flush()
+        assert queue.failed == 2 and queue.pending() == 2
+        assert list(queue._groups) == [("u2", "follow", None)]
+        assert list(queue._groups[("u2", "follow", None)]) == ["a1", "a2"]
+
+        await queue.flush()
+        assert queue.pending() == 0
+        assert notifications.writes[-1][0]._doc["$inc"] == {"actorCount": 2}
+
+    asyncio.run(main())
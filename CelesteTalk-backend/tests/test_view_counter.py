@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+from pymongo.errors import BulkWriteError
+from models.Post import Post
+from models.PostView import PostView
+from utils.view_counter import DUPLICATE_KEY, ViewBuffer
+from utils.write_buffer import WriteBuffer
+
+
+class FakePosts:
+    def __init__(self, ids):
+        self.ids = ids
+        self.writes = []
+
+    def find(self, query, projection=None):
+        docs = [{"_id": post_id} for post_id in query["_id"]["$in"] if post_id in self.ids]
+
+        class Cursor:
+            async def to_list(self, length=None):
+                return docs
+        return Cursor()
+
+    async def bulk_write(self, operations, ordered=True):
+        self.writes.append(operations)
+
+
+class FakeViews(FakePosts):
+    """第一次合并草图时模拟其他 worker 抢先写入，触发重复键冲突"""
+
+    def __init__(self):
+        super().__init__(set())
+        self.conflicts = 1
+
+    async def bulk_write(self, operations, ordered=True):
+        if self.conflicts:
+            self.conflicts -= 1
+            raise BulkWriteError({"writeErrors": [{"index": 0, "code": DUPLICATE_KEY}]})
+        self.writes.append(operations)
+
+
+def test_write_buffer_requires_pending_and_flush():
+    class Incomplete(WriteBuffer):
+        def pending(self) -> int:
+            return 0
+
+    with pytest.raises(TypeError):
+        Incomplete("incomplete", interval=1, max_pending=1)
+
+
+def test_conflicted_sketch_is_flushed_again(monkeypatch):
+    async def main():
+        posts, views = FakePosts({"p1"}), FakeViews()
+        monkeypatch.setattr(Post, "get_motor_collection", classmethod(lambda cls: posts))
+        monkeypatch.setattr(PostView, "get_motor_collection", classmethod(lambda cls: views))
+        buffer = ViewBuffer(interval=60, max_pending=1000)
+        buffer.record("p1", "u1")
+
+        await buffer.flush()
+        # 浏览数已写入，冲突的草图仍计入待写入数
+        assert len(posts.writes) == 1
+        assert buffer.pending() == 1
+
+        await buffer.flush()
+        assert len(views.writes) == 1
+        assert buffer.pending() == 0
+        # 第二次只更新独立访客数，浏览数不重复累加
+        update = posts.writes[1][0]._doc
+        assert "$inc" not in update and "uniqueViews" in update["$set"]
+
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+"""
+已注册的数据迁移，由 migrate.py 按注册顺序执行
+
+旧版本的 Comment 和 Post 模型会为空的 replyTo/originalPost 生成随机占位ObjectId，
+现在这些字段可以为空，这里把占位ID改回 null；另外按批重新计算用户计数。
+"""
+from pymongo import UpdateOne
+from models.Comment import Comment
+from models.Post import Post
+from models.User import User
+from utils.counters import RECOUNT_PROJECTION, recount_users
+from utils.migrations import migration
+
+# 完成前清理任务不删除父评论不存在的回复，否则会把带占位ID的旧顶层评论当作孤儿删除
+COMMENT_REPLY_BACKFILL = "comments_reply_to_null"
+
+
+async def existing_ids(model, ids) -> set:
+    ids = list(set(ids))
+    if not ids:
+        return set()
+    docs = await model.get_motor_collection().find({"_id": {"$in": ids}}, {"_id": 1}).to_list(length=None)
+    return {doc["_id"] for doc in docs}
+
+
+@migration(COMMENT_REPLY_BACKFILL, Comment, query={"replyTo": {"$ne": None}},
+           projection={"replyTo": 1}, namespace="comment")
+async def comments_reply_to_null(batch: list) -> list:
+    """把指向不存在评论的 replyTo（旧版本生成的占位ID）改为 null，这些评论成为顶层评论"""
+    existing = await existing_ids(Comment, (comment["replyTo"] for comment in batch))
+    return [
+        UpdateOne({"_id": comment["_id"], "replyTo": comment["replyTo"]}, {"$set": {"replyTo": None}})
+        for comment in batch if comment["replyTo"] not in existing
+    ]
+
+
+@migration("posts_references_null", Post,
+           query={"$or": [{"isRepost": {"$ne": True}, "originalPost": {"$ne": None}}, {"replyTo": {"$ne": None}}]},
+           projection={"isRepost": 1, "originalPost": 1, "replyTo": 1}, namespace="post")
+async def posts_references_null(batch: list) -> list:
+    """非转发帖的 originalPost、指向不存在帖子的 replyTo 改为 null"""
+    existing = await existing_ids(Post, (post["replyTo"] for post in batch if post.get("replyTo") is not None))
+    operations = []
+    for post in batch:
+        current, changes = {}, {}
+        if not post.get("isRepost") and post.get("originalPost") is not None:
+            current["originalPost"] = post["originalPost"]
+            changes["originalPost"] = None
+        if post.get("replyTo") is not None and post["replyTo"] not in existing:
+            current["replyTo"] = post["replyTo"]
+            changes["replyTo"] = None
+        if changes:
+            operations.append(UpdateOne({"_id": post["_id"], **current}, {"$set": changes}))
+    return operations
+
+
+@migration("users_counters", User, projection=RECOUNT_PROJECTION, namespace="user")
+async def users_counters(batch: list) -> list:
+    """按数据重新计算一批用户的发帖数、获赞数、粉丝数和关注数，只修正不一致的字段"""
+    return await recount_users(batch)
@@ -0,0 +1,300 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+import bson
+from server.init import settings
+from utils.deadline import detach
+from utils.invalidation import on_invalidate
+from utils.loader import comment_loader, post_loader, user_loader
+
+logger = logging.getLogger(__name__)
+
+
+class LocalTier:
+    """进程内 LRU，按 (group, variant) 存放，按 group 整组失效"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # (group, variant) -> (value, stored_at, expires_at)
+        self._entries = OrderedDict()
+        self._groups = {}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() >= entry[2]:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key, value, stored_at: float, ttl: float):
+        self._entries[key] = (value, stored_at, time.time() + ttl)
+        self._entries.move_to_end(key)
+        self._groups.setdefault(key[0], set()).add(key[1])
+        while len(self._entries) > self.max_entries:
+            oldest, _ = self._entries.popitem(last=False)
+            self._discard_variant(oldest)
+
+    def invalidate(self, group):
+        for variant in self._groups.pop(group, ()):
+            self._entries.pop((group, variant), None)
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        self._discard_variant(key)
+
+    def _discard_variant(self, key):
+        variants = self._groups.get(key[0])
+        if variants is not None:
+            variants.discard(key[1])
+            if not variants:
+                del self._groups[key[0]]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# 代数未变时才写入：KEYS[1] 为数据 hash，KEYS[2] 为代数；ARGV 为读取时的代数、variant、值、有效期
+SET_IF_GENERATION = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+# 代数键的有效期（秒），需长于任何一次加载的耗时
+GENERATION_TTL = 86400
+
+
+class RedisTier:
+    """
+    多个 worker 共享的缓存层，需要安装 redis 并配置 REDIS_URL
+
+    每组数据存放在一个 hash 中（字段为 variant），整组失效只需一次 DEL。
+    值以 BSON 编码，保留 ObjectId 和 datetime 类型。
+    每组另有一个代数键，失效时递增；未命中时先读代数再加载，写回时以代数未变为条件（Lua 脚本原子执行），
+    任一 worker 在加载期间失效了该组，旧数据都不会写入共享层。
+    """
+
+    def __init__(self, url: str, prefix: str = "celeste:cache"):
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url)
+        self._set_if_generation = self._redis.register_script(SET_IF_GENERATION)
+        self.prefix = prefix
+        self.errors = 0
+        self.stale_writes = 0
+
+    def _key(self, namespace: str, group) -> str:
+        return f"{self.prefix}:{namespace}:{group}"
+
+    def _generation_key(self, namespace: str, group) -> str:
+        return f"{self.prefix}:{namespace}:{group}:gen"
+
+    async def get(self, namespace: str, group, variant: str) -> tuple:
+        """返回 (缓存项, 代数)，缓存项为 (值, 写入时间) 或 None；读取失败时代数为 None，不应写回"""
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.hget(self._key(namespace, group), variant)
+                pipe.get(self._generation_key(namespace, group))
+                data, generation = await pipe.execute()
+        except Exception as e:
+            self.errors += 1
+            logger.warning("shared cache read failed: %s", e)
+            return None, None
+        generation = generation.decode() if generation is not None else "0"
+        if data is None:
+            return None, generation
+        entry = bson.decode(data)
+        return (entry["v"], entry["t"]), generation
+
+    async def set(self, namespace: str, group, variant: str, value, stored_at: float, ttl: float, generation: str):
+        """代数仍为 generation 时写入，返回是否写入"""
+        try:
+            written = await self._set_if_generation(
+                keys=[self._key(namespace, group), self._generation_key(namespace, group)],
+                args=[generation, variant, bson.encode({"v": value, "t": stored_at}), max(1, int(ttl))]
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning("shared cache write failed: %s", e)
+            return False
+        if not written:
+            self.stale_writes += 1
+        return bool(written)
+
+    async def invalidate(self, namespace: str, group):
+        try:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.incr(self._generation_key(namespace, group))
+                pipe.expire(self._generation_key(namespace, group), GENERATION_TTL)
+                pipe.delete(self._key(namespace, group))
+                await pipe.execute()
+        except Exception as e:
+            self.errors += 1
+            logger.warning("shared cache invalidation failed: %s", e)
+
+
+class TieredCache:
+    """
+    本地 LRU + 可选共享层的两级缓存，支持负缓存（缓存不存在的结果）
+
+    本进程内的写入通过 utils.invalidation 立即失效本地和共享层；
+    其他 worker 的本地层不会收到通知，最多在 local_ttl 秒内返回旧数据。
+    共享层按代数写回，失效前开始的加载不会把旧数据写入共享层。
+    """
+
+    def __init__(self, namespace: str, local_ttl: float, shared_ttl: float, negative_ttl: float,
+                 max_entries: int, shared: RedisTier = None):
+        self.namespace = namespace
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self.negative_ttl = negative_ttl
+        self.local = LocalTier(max_entries)
+        self.shared = shared
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # 命中时数据的年龄，衡量返回数据的陈旧程度
+        self.served_age_total = 0.0
+        self.served_age_max = 0.0
+        # group -> 最近一次失效的时间，用于丢弃失效前开始的加载结果
+        self._invalidated_at = {}
+        self._tasks = set()
+        on_invalidate(namespace, self.invalidate)
+
+    @property
+    def enabled(self) -> bool:
+        return self.local_ttl > 0
+
+    def _served(self, value, stored_at: float):
+        age = max(0.0, time.time() - stored_at)
+        self.served_age_total += age
+        self.served_age_max = max(self.served_age_max, age)
+        if value is None:
+            self.negative_hits += 1
+        return value
+
+    async def get(self, group, variant: str, load):
+        """读取缓存，未命中时调用 load() 加载并写入，load 返回 None 表示不存在"""
+        if not self.enabled:
+            return await load()
+        key = (group, variant)
+        entry = self.local.get(key)
+        if entry is not None:
+            self.local_hits += 1
+            return self._served(entry[0], entry[1])
+
+        generation = None
+        if self.shared is not None:
+            entry, generation = await self.shared.get(self.namespace, group, variant)
+            if entry is not None:
+                value, stored_at = entry
+                self.shared_hits += 1
+                self.local.set(key, value, stored_at, self._ttl(value, self.local_ttl))
+                return self._served(value, stored_at)
+
+        self.misses += 1
+        started = time.time()
+        value = await load()
+        # 加载期间数据发生了变更，结果可能是旧的，不写入缓存
+        if self._invalidated_at.get(group, 0) >= started:
+            return value
+        self.local.set(key, value, started, self._ttl(value, self.local_ttl))
+        if generation is not None:
+            await self.shared.set(self.namespace, group, variant, value, started,
+                                  self._ttl(value, self.shared_ttl), generation)
+        return value
+
+    def _ttl(self, value, ttl: float) -> float:
+        return min(ttl, self.negative_ttl) if value is None else ttl
+
+    def invalidate(self, group):
+        self.invalidations += 1
+        now = time.time()
+        self._invalidated_at[group] = now
+        if len(self._invalidated_at) > self.local.max_entries:
+            # 只需保留可能仍在进行的加载对应的记录
+            horizon = now - 60
+            self._invalidated_at = {g: t for g, t in self._invalidated_at.items() if t >= horizon}
+        self.local.invalidate(group)
+        if self.shared is not None:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                # 没有运行中的事件循环（如脚本中直接保存文档），只失效本地层
+                return
+            # 不继承触发失效的请求的截止时间，请求超时也要完成共享层的失效
+            task = detach(self.shared.invalidate(self.namespace, group))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def stats(self) -> dict:
+        hits = self.local_hits + self.shared_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self.local),
+            "localHits": self.local_hits,
+            "sharedHits": self.shared_hits,
+            "negativeHits": self.negative_hits,
+            "misses": self.misses,
+            "hitRatio": hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "meanServedAge": self.served_age_total / hits if hits else 0.0,
+            "maxServedAge": self.served_age_max,
+            "sharedErrors": self.shared.errors if self.shared is not None else 0,
+            "sharedStaleWrites": self.shared.stale_writes if self.shared is not None else 0,
+        }
+
+
+class DocumentCache:
+    """按ID缓存原始文档，每次读取解析出独立的模型实例"""
+
+    def __init__(self, cache: TieredCache, loader):
+        self.cache = cache
+        self.loader = loader
+
+    async def get_raw(self, doc_id) -> dict:
+        """返回缓存中的原始文档，调用方不得修改"""
+        return await self.cache.get(doc_id, "doc", lambda: self.loader.load_raw(doc_id))
+
+    async def get(self, doc_id):
+        raw = await self.get_raw(doc_id)
+        return self.parse(raw)
+
+    def parse(self, raw: dict):
+        return self.loader._parse(raw)
+
+
+def build_shared_tier():
+    if not settings.REDIS_URL:
+        return None
+    try:
+        return RedisTier(settings.REDIS_URL)
+    except ImportError:
+        logger.warning("REDIS_URL is set but the redis package is not installed, shared cache disabled")
+        return None
+
+
+def build_cache(namespace: str, shared: RedisTier = None) -> TieredCache:
+    return TieredCache(
+        namespace,
+        local_ttl=settings.CACHE_LOCAL_TTL,
+        shared_ttl=settings.CACHE_SHARED_TTL,
+        negative_ttl=settings.CACHE_NEGATIVE_TTL,
+        max_entries=settings.CACHE_MAX_ENTRIES,
+        shared=shared
+    )
+
+
+shared_tier = build_shared_tier()
+post_cache = DocumentCache(build_cache("post", shared_tier), post_loader)
+user_cache = DocumentCache(build_cache("user", shared_tier), user_loader)
+comment_cache = DocumentCache(build_cache("comment", shared_tier), comment_loader)
+# 帖子的评论列表首页和评论数，按帖子ID整组失效
+comment_list_cache = build_cache("comments", shared_tier)
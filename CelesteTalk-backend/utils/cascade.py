@@ -0,0 +1,447 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from datetime import timedelta
+from pathlib import Path
+from typing import Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+from models.Comment import Comment
+from models.Post import NOT_DELETED, Post
+from models.PostTag import PostTag
+from models.PostView import PostView
+from models.UploadSession import UploadSession
+from models.User import User
+from server.init import settings
+from utils.backfills import COMMENT_REPLY_BACKFILL
+from utils.feed_cache import feed_cache
+from utils.file_handler import UPLOAD_DIR
+from utils.invalidation import invalidate
+from utils.lease import LeaderLease
+from utils.migrations import migration_complete
+from utils.time import format_datetime_now
+
+logger = logging.getLogger(__name__)
+
+
+async def delete_in_batches(collection, query: dict, batch_size: int) -> int:
+    """按批删除匹配的文档，每批之间让出事件循环，返回删除的条数"""
+    removed = 0
+    while True:
+        docs = await collection.find(query, {"_id": 1}).limit(batch_size).to_list(length=None)
+        if not docs:
+            return removed
+        result = await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+        removed += result.deleted_count
+        await asyncio.sleep(0)
+
+
+def upload_path(url: str) -> Optional[Path]:
+    """返回上传目录内的文件路径，目录外的路径返回 None，避免误删其他文件"""
+    path = Path(url).resolve()
+    return path if Path(UPLOAD_DIR).resolve() in path.parents else None
+
+
+async def referenced_urls(urls: list) -> set:
+    """返回仍被帖子媒体、用户头像/头图或未过期的上传会话引用的文件"""
+    found = set()
+    posts = await Post.get_motor_collection().find(
+        {"media.url": {"$in": urls}}, {"media.url": 1}
+    ).to_list(length=None)
+    for post in posts:
+        found.update(media.get("url") for media in post.get("media", []))
+    users = await User.get_motor_collection().find(
+        {"$or": [{"avatar": {"$in": urls}}, {"headerImage": {"$in": urls}}]},
+        {"avatar": 1, "headerImage": 1}
+    ).to_list(length=None)
+    for user in users:
+        found.update((user.get("avatar"), user.get("headerImage")))
+    # 已完成但还没有发帖引用的上传
+    sessions = await UploadSession.get_motor_collection().find(
+        {"url": {"$in": urls}}, {"url": 1}
+    ).to_list(length=None)
+    found.update(session["url"] for session in sessions)
+    return found
+
+
+async def remove_unreferenced(urls: list) -> int:
+    """删除不再被引用的上传文件，返回删除的文件数"""
+    urls = list(dict.fromkeys(url for url in urls if url))
+    if not urls:
+        return 0
+    referenced = await referenced_urls(urls)
+    removed = 0
+    for url in urls:
+        path = upload_path(url)
+        if url in referenced or path is None:
+            continue
+        try:
+            await asyncio.to_thread(os.remove, path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+class CascadeWorker:
+    """
+    在后台删除已打墓碑的帖子和评论及其依赖数据
+
+    接口只写入 deletedAt，读路径立即看不到该文档；本任务随后分批删除评论、回复、
+    话题索引、浏览草图和不再被引用的上传文件，最后删除文档本身。
+    墓碑就是持久化的待办记录：进程在级联完成前退出时，由 OrphanSweeper 重新执行。
+    执行前以 cascadeClaimedAt 认领墓碑，多个 worker 不会同时级联同一文档、重复扣减计数；
+    认领超过 claim_timeout 秒仍未完成（进程已退出）时可被重新认领。
+    """
+
+    def __init__(self, batch_size: int, claim_timeout: float):
+        self.batch_size = batch_size
+        self.claim_timeout = claim_timeout
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.removed_documents = 0
+        self.removed_files = 0
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def enqueue(self, kind: str, doc_id):
+        """kind 为 post 或 comment，文档必须已写入 deletedAt"""
+        self._queue.put_nowait((kind, doc_id))
+
+    async def claim(self, kind: str, doc_id) -> bool:
+        """认领一个墓碑，文档未删除、已不存在或正由其他 worker 级联时返回 False"""
+        model = Post if kind == "post" else Comment
+        now = format_datetime_now()
+        stale = now - timedelta(seconds=self.claim_timeout)
+        claimed = await model.get_motor_collection().find_one_and_update(
+            {"_id": doc_id, "deletedAt": {"$type": "date"},
+             "$or": [{"cascadeClaimedAt": None}, {"cascadeClaimedAt": {"$lt": stale}}]},
+            {"$set": {"cascadeClaimedAt": now}},
+            projection={"_id": 1}
+        )
+        return claimed is not None
+
+    async def process(self, kind: str, doc_id):
+        if not await self.claim(kind, doc_id):
+            self.skipped += 1
+            return
+        if kind == "post":
+            await self.cascade_post(doc_id)
+        else:
+            await self.cascade_comment(doc_id)
+
+    async def cascade_post(self, post_id):
+        posts = Post.get_motor_collection()
+        users = User.get_motor_collection()
+        post = await posts.find_one({"_id": post_id}, {"likes": 1, "media": 1, "deletedAt": 1})
+        if not post or not post.get("deletedAt"):
+            return
+
+        # 转发帖同样打上墓碑，再逐个级联
+        while True:
+            reposts = await posts.find(
+                {"originalPost": post_id, **NOT_DELETED}, {"authorId": 1}
+            ).limit(self.batch_size).to_list(length=None)
+            if not reposts:
+                break
+            repost_ids = [repost["_id"] for repost in reposts]
+            now = format_datetime_now()
+            await posts.update_many({"_id": {"$in": repost_ids}}, {"$set": {"deletedAt": now}})
+            authors = Counter(repost["authorId"] for repost in reposts)
+            await users.bulk_write([
+                UpdateOne({"_id": author_id}, {"$inc": {"postsCount": -count}, "$set": {"updatedAt": now}})
+                for author_id, count in authors.items()
+            ], ordered=False)
+            invalidate("post", *repost_ids)
+            invalidate("user", *authors)
+            feed_cache.invalidate_all()
+            for repost_id in repost_ids:
+                self.enqueue("post", repost_id)
+
+        removed = await delete_in_batches(Comment.get_motor_collection(), {"postId": post_id}, self.batch_size)
+        removed += await delete_in_batches(PostTag.get_motor_collection(), {"postId": post_id}, self.batch_size)
+        removed += (await PostView.get_motor_collection().delete_one({"_id": post_id})).deleted_count
+
+        # 点赞过该帖子的用户点赞数减一，扣减后从帖子上移除，中断后重新执行不会重复扣减
+        likers = post.get("likes", [])
+        for start in range(0, len(likers), self.batch_size):
+            chunk = likers[start:start + self.batch_size]
+            now = format_datetime_now()
+            await users.bulk_write([
+                UpdateOne({"_id": user_id}, {"$inc": {"likesCount": -1}, "$set": {"updatedAt": now}})
+                for user_id in chunk
+            ], ordered=False)
+            await posts.update_one({"_id": post_id}, {"$pull": {"likes": {"$in": chunk}}})
+            invalidate("user", *chunk)
+
+        removed += (await posts.delete_one({"_id": post_id})).deleted_count
+        invalidate("comments", post_id)
+        self.removed_documents += removed
+        self.removed_files += await remove_unreferenced([media.get("url") for media in post.get("media", [])])
+
+    async def cascade_comment(self, comment_id):
+        collection = Comment.get_motor_collection()
+        comment = await collection.find_one({"_id": comment_id}, {"postId": 1, "deletedAt": 1})
+        if not comment or not comment.get("deletedAt"):
+            return
+        post_id = comment["postId"]
+
+        # 逐层删除回复；中途退出时留下的孤儿回复由 OrphanSweeper 清理
+        removed = 0
+        frontier = [comment_id]
+        while frontier:
+            children = []
+            for start in range(0, len(frontier), self.batch_size):
+                chunk = frontier[start:start + self.batch_size]
+                docs = await collection.find(
+                    {"postId": post_id, "replyTo": {"$in": chunk}}, {"_id": 1}
+                ).to_list(length=None)
+                children.extend(doc["_id"] for doc in docs)
+            for start in range(0, len(children), self.batch_size):
+                result = await collection.delete_many({"_id": {"$in": children[start:start + self.batch_size]}})
+                removed += result.deleted_count
+                await asyncio.sleep(0)
+            frontier = children
+
+        removed += (await collection.delete_one({"_id": comment_id})).deleted_count
+        invalidate("comment", comment_id)
+        invalidate("comments", post_id)
+        feed_cache.invalidate_post(post_id)
+        self.removed_documents += removed
+
+    async def _run(self):
+        while True:
+            kind, doc_id = await self._queue.get()
+            try:
+                await self.process(kind, doc_id)
+                self.completed += 1
+            except Exception as e:
+                # 墓碑保留，由 OrphanSweeper 重试
+                self.failed += 1
+                logger.error("cascade delete of %s %s failed: %s", kind, doc_id, e)
+            finally:
+                self._queue.task_done()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._queue.qsize():
+            logger.info("cascade worker stopped with %s deletes left for the sweeper", self._queue.qsize())
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "removedDocuments": self.removed_documents,
+            "removedFiles": self.removed_files,
+        }
+
+
+class OrphanSweeper:
+    """
+    定期清理级联删除遗漏的数据
+
+    - 重新执行超过宽限期仍未完成的墓碑
+    - 删除所属帖子、父评论已不存在的评论，以及帖子已不存在的话题索引和浏览草图
+      （父评论的检查在 comments_reply_to_null 迁移完成后才执行）
+    - 删除超过宽限期且不再被任何帖子、用户或上传会话引用的上传文件
+    - 删除会话已过期的分片临时文件
+
+    多个 worker 中只有持有 orphan-sweeper 租约的一个执行清理。
+    """
+
+    def __init__(self, worker: CascadeWorker, interval: float, grace: float, batch_size: int):
+        self.worker = worker
+        self.interval = interval
+        self.grace = grace
+        self.batch_size = batch_size
+        # 租约在下一次清理前不会到期，持有者退出后由其他 worker 接手
+        self.lease = LeaderLease("orphan-sweeper", ttl=interval * 2)
+        self.runs = 0
+        self.failed = 0
+        self.last_result = None
+        self.last_run_at = None
+        self._task = None
+
+    async def sweep(self) -> dict:
+        """执行一次清理，返回各类数据的清理条数"""
+        comments = Comment.get_motor_collection()
+        posts = Post.get_motor_collection()
+        return {
+            "tombstones": await self._retry_tombstones(),
+            "comments": await self._sweep_orphans(comments, "postId", posts),
+            "replies": await self._sweep_orphan_replies(comments),
+            "tags": await self._sweep_orphans(PostTag.get_motor_collection(), "postId", posts),
+            "views": await self._sweep_orphans(PostView.get_motor_collection(), "_id", posts),
+            "files": await self._sweep_files(),
+            "uploadParts": await self._sweep_upload_parts(),
+        }
+
+    async def _retry_tombstones(self) -> int:
+        cutoff = format_datetime_now() - timedelta(seconds=self.grace)
+        retried = 0
+        for model, kind in ((Post, "post"), (Comment, "comment")):
+            docs = model.get_motor_collection().find(
+                {"deletedAt": {"$type": "date", "$lt": cutoff}}, {"_id": 1}
+            )
+            async for doc in docs:
+                await self.worker.process(kind, doc["_id"])
+                retried += 1
+        return retried
+
+    async def _sweep_orphan_replies(self, comments) -> int:
+        # 旧评论的 replyTo 可能是占位ID，回填为 null 之前无法与父评论已删除的回复区分
+        if not await migration_complete(COMMENT_REPLY_BACKFILL):
+            return 0
+        return await self._sweep_orphans(comments, "replyTo", comments)
+
+    async def _sweep_orphans(self, collection, field: str, target) -> int:
+        """删除 field 指向的文档已不存在的记录"""
+        removed = 0
+        refs = []
+        rows = collection.aggregate([
+            {"$match": {field: {"$ne": None}}},
+            {"$group": {"_id": f"${field}"}},
+        ], allowDiskUse=True)
+        async for row in rows:
+            refs.append(row["_id"])
+            if len(refs) >= self.batch_size:
+                removed += await self._remove_missing(collection, field, target, refs)
+                refs = []
+        if refs:
+            removed += await self._remove_missing(collection, field, target, refs)
+        return removed
+
+    async def _remove_missing(self, collection, field: str, target, refs: list) -> int:
+        existing = await target.find({"_id": {"$in": refs}}, {"_id": 1}).to_list(length=None)
+        existing = {doc["_id"] for doc in existing}
+        missing = [ref for ref in refs if ref not in existing]
+        if not missing:
+            return 0
+        return await delete_in_batches(collection, {field: {"$in": missing}}, self.batch_size)
+
+    def _list_uploads(self) -> list:
+        """列出超过宽限期的上传文件，路径格式与保存时返回的URL相同"""
+        cutoff = time.time() - self.grace
+        urls = []
+        for dirpath, _, filenames in os.walk(UPLOAD_DIR):
+            for filename in filenames:
+                # 上传的文件以 UUID 命名，跳过 .gitkeep 等占位文件
+                if filename.startswith("."):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        urls.append(path)
+                except FileNotFoundError:
+                    continue
+        return urls
+
+    async def _sweep_files(self) -> int:
+        urls = await asyncio.to_thread(self._list_uploads)
+        removed = 0
+        for start in range(0, len(urls), self.batch_size):
+            removed += await remove_unreferenced(urls[start:start + self.batch_size])
+        return removed
+
+    def _list_upload_parts(self) -> list:
+        """列出超过宽限期未写入的分片临时文件，文件名为会话ID"""
+        cutoff = time.time() - self.grace
+        parts = []
+        if not os.path.isdir(settings.UPLOAD_PART_DIR):
+            return parts
+        for filename in os.listdir(settings.UPLOAD_PART_DIR):
+            path = os.path.join(settings.UPLOAD_PART_DIR, filename)
+            try:
+                if ObjectId.is_valid(filename) and os.path.getmtime(path) < cutoff:
+                    parts.append(ObjectId(filename))
+            except FileNotFoundError:
+                continue
+        return parts
+
+    async def _sweep_upload_parts(self) -> int:
+        parts = await asyncio.to_thread(self._list_upload_parts)
+        removed = 0
+        for start in range(0, len(parts), self.batch_size):
+            chunk = parts[start:start + self.batch_size]
+            alive = await UploadSession.get_motor_collection().find(
+                {"_id": {"$in": chunk}, "status": {"$in": ["uploading", "completing"]}}, {"_id": 1}
+            ).to_list(length=None)
+            alive = {session["_id"] for session in alive}
+            for session_id in chunk:
+                if session_id in alive:
+                    continue
+                try:
+                    await asyncio.to_thread(os.remove, os.path.join(settings.UPLOAD_PART_DIR, str(session_id)))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    async def run_once(self):
+        try:
+            if not await self.lease.acquire():
+                return
+            self.last_result = await self.sweep()
+            self.runs += 1
+            self.last_run_at = time.time()
+            if any(self.last_result.values()):
+                logger.info("orphan sweep removed %s", self.last_result)
+        except Exception as e:
+            self.failed += 1
+            logger.error("orphan sweep failed: %s", e)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.lease.release()
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "failedRuns": self.failed,
+            "lease": self.lease.stats(),
+            "lastRunAt": self.last_run_at,
+            "lastResult": self.last_result,
+            "interval": self.interval,
+        }
+
+
+cascade_worker = CascadeWorker(
+    batch_size=settings.CASCADE_BATCH_SIZE,
+    claim_timeout=settings.CASCADE_CLAIM_TIMEOUT
+)
+orphan_sweeper = OrphanSweeper(
+    cascade_worker,
+    interval=settings.GC_INTERVAL,
+    grace=settings.GC_GRACE_PERIOD,
+    batch_size=settings.CASCADE_BATCH_SIZE
+)
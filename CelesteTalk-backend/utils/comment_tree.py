@@ -0,0 +1,58 @@
+from typing import Optional
+from beanie import PydanticObjectId
+from models.Comment import Comment
+from models.Post import NOT_DELETED
+from utils.cache import comment_list_cache
+from utils.pagination import cursor_filter, cursor_sort, next_cursor
+from utils.post_data import author_data, load_authors
+from utils.read_models import CommentRead
+
+
+async def reply_counts(post_id: PydanticObjectId, comment_ids: list) -> dict:
+    """统计每条评论的直接回复数，走 (postId, replyTo, createdAt) 索引"""
+    if not comment_ids:
+        return {}
+    pipeline = [
+        {"$match": {"postId": post_id, "replyTo": {"$in": comment_ids}, **NOT_DELETED}},
+        {"$group": {"_id": "$replyTo", "count": {"$sum": 1}}},
+    ]
+    rows = await Comment.get_motor_collection().aggregate(pipeline).to_list(length=None)
+    return {row["_id"]: row["count"] for row in rows}
+
+
+async def hydrate_comments(post_id: PydanticObjectId, comments: list) -> list:
+    """为只读评论（CommentRead）添加作者信息和统计信息"""
+    # 查询所有作者信息
+    author_dict = await load_authors(comment.authorId for comment in comments)
+
+    replies = await reply_counts(post_id, [comment.id for comment in comments])
+
+    comments_with_authors = []
+    for comment in comments:
+        comment_data = comment.to_dict()
+        comment_data["author"] = author_data(author_dict.get(comment.authorId), comment.authorId)
+        comment_data["stats"] = {
+            "likes": len(comment.likes) if comment.likes else 0,
+            "replies": replies.get(comment.id, 0),
+            "shares": 0
+        }
+        comments_with_authors.append(comment_data)
+    return comments_with_authors
+
+
+async def list_comments(post_id: PydanticObjectId, reply_to: Optional[PydanticObjectId],
+                        cursor: Optional[str], limit: int) -> tuple:
+    """按时间升序分页获取某一层评论，reply_to 为空时获取顶层评论"""
+    async def load_page() -> dict:
+        query = {"postId": post_id, "replyTo": reply_to, **NOT_DELETED}
+        query.update(cursor_filter(cursor))
+        rows = await Comment.get_motor_collection().find(query).sort(cursor_sort()).limit(limit).to_list(length=None)
+        comments = [CommentRead.from_raw(row) for row in rows]
+        return {"items": await hydrate_comments(post_id, comments), "next": next_cursor(comments, limit)}
+
+    # 只缓存首页，任一评论变更时整个帖子的评论缓存失效；作者资料的变更最多延迟 CACHE_LOCAL_TTL 秒
+    if cursor is None:
+        page = await comment_list_cache.get(post_id, f"list:{reply_to}:{limit}", load_page)
+    else:
+        page = await load_page()
+    return page["items"], page["next"]
@@ -16,7 +16,7 @@ def hash_password(password: str) -> str:
         # 返回加密后的密码字符串
         return hashed.decode('utf-8')
     except Exception as e:
-        logger.error(f"Password hashing error: {str(e)}")
+        logger.error("Password hashing error: %s", e)
         raise
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -30,6 +30,6 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         # 验证密码
         return bcrypt.checkpw(plain_password_bytes, hashed_password_bytes)
     except Exception as e:
-        logger.error(f"Password verification error: {str(e)}")
+        logger.error("Password verification error: %s", e)
         return False
 
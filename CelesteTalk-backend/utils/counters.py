@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import time
+from pymongo import UpdateOne
+from models.Post import NOT_DELETED, Post
+from models.User import User
+from server.init import settings
+from utils.invalidation import invalidate
+from utils.lease import LeaderLease
+from utils.time import format_datetime_now
+
+logger = logging.getLogger(__name__)
+
+# 用户文档上维护的计数字段
+COUNTER_FIELDS = ("postsCount", "likesCount", "followersCount", "followingCount")
+
+# 重新计算计数时读取的用户字段，关注列表由 recount_users 在聚合中只取长度
+RECOUNT_PROJECTION = {field: 1 for field in COUNTER_FIELDS}
+
+
+async def inc_user_counters(user_id, **deltas):
+    """以 $inc 原子地调整用户计数，如 inc_user_counters(user_id, postsCount=1)"""
+    # 用户的 ETag 和 Last-Modified 取自 updatedAt，计数变化时一并更新
+    await User.get_motor_collection().update_one(
+        {"_id": user_id}, {"$inc": deltas, "$set": {"updatedAt": format_datetime_now()}}
+    )
+    invalidate("user", user_id)
+
+
+async def recount_users(batch: list) -> list:
+    """
+    按数据重新计算一批用户（以 RECOUNT_PROJECTION 读取）的计数，返回修正不一致字段的写操作
+
+    只统计这批用户的发帖数、点赞数和关注列表长度。修正以读到的旧值为条件按差值 $inc：读取之后被 $inc
+    修改过的字段不会被覆盖，重复执行也不会重复修正。
+    """
+    user_ids = [user["_id"] for user in batch]
+    follows = await User.get_motor_collection().aggregate([
+        {"$match": {"_id": {"$in": user_ids}}},
+        {"$project": {
+            "followers": {"$size": {"$ifNull": ["$followers", []]}},
+            "following": {"$size": {"$ifNull": ["$following", []]}},
+        }},
+    ]).to_list(length=None)
+    follows = {row["_id"]: row for row in follows}
+    collection = Post.get_motor_collection()
+    posts = await collection.aggregate([
+        {"$match": {**NOT_DELETED, "authorId": {"$in": user_ids}}},
+        {"$group": {"_id": "$authorId", "count": {"$sum": 1}}},
+    ]).to_list(length=None)
+    likes = await collection.aggregate([
+        {"$match": {**NOT_DELETED, "likes": {"$in": user_ids}}},
+        {"$project": {"likes": 1}},
+        {"$unwind": "$likes"},
+        {"$match": {"likes": {"$in": user_ids}}},
+        {"$group": {"_id": "$likes", "count": {"$sum": 1}}},
+    ]).to_list(length=None)
+    posts = {row["_id"]: row["count"] for row in posts}
+    likes = {row["_id"]: row["count"] for row in likes}
+    now = format_datetime_now()
+    operations = []
+    for user in batch:
+        follow = follows.get(user["_id"])
+        if follow is None:
+            # 读取之后被删除的用户
+            continue
+        actual = {
+            "postsCount": posts.get(user["_id"], 0),
+            "likesCount": likes.get(user["_id"], 0),
+            "followersCount": follow["followers"],
+            "followingCount": follow["following"],
+        }
+        stored = {field: user.get(field) for field in COUNTER_FIELDS}
+        changed = [field for field in COUNTER_FIELDS if stored[field] != actual[field]]
+        if not changed:
+            continue
+        operations.append(UpdateOne(
+            {"_id": user["_id"], **{field: stored[field] for field in changed}},
+            # 旧数据可能缺少计数字段，这时 $inc 从 0 开始
+            {"$inc": {field: actual[field] - (stored[field] or 0) for field in changed},
+             "$set": {"updatedAt": now}}
+        ))
+    return operations
+
+
+class CounterReconciler:
+    """
+    定期按数据重新计算用户计数，修正 $inc 丢失或重复造成的偏差
+
+    按 _id 范围每次读取 batch_size 个用户的计数，再只为这批用户统计未删除帖子的发帖数和点赞数，
+    与 users_counters 回填共用 recount_users。读取之后被 $inc 修改过的字段留到下次校准；
+    数据已写入而计数的 $inc 尚未执行时读到的快照仍可能算出偏差，同样由下次校准修正。
+    多个 worker 中只有持有 counter-reconciler 租约的一个执行。
+    """
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        # 租约在下一次校准前不会到期，持有者退出后由其他 worker 接手
+        self.lease = LeaderLease("counter-reconciler", ttl=interval * 2)
+        self.runs = 0
+        self.corrected = 0
+        self.failed = 0
+        self.last_run_at = None
+        self._task = None
+
+    async def reconcile(self) -> int:
+        """执行一次校准，返回修正的用户数"""
+        collection = User.get_motor_collection()
+        corrected = 0
+        last_id = None
+        while True:
+            query = {} if last_id is None else {"_id": {"$gt": last_id}}
+            # 计数必须在统计之前读取，统计期间的 $inc 才会使条件不成立
+            batch = await collection.find(
+                query, RECOUNT_PROJECTION
+            ).sort("_id", 1).limit(self.batch_size).to_list(length=None)
+            if not batch:
+                return corrected
+            operations = await recount_users(batch)
+            if operations:
+                corrected += await self._write(operations, [user["_id"] for user in batch])
+            last_id = batch[-1]["_id"]
+            # 分批处理，让出事件循环
+            await asyncio.sleep(0)
+
+    async def _write(self, operations: list, user_ids: list) -> int:
+        result = await User.get_motor_collection().bulk_write(operations, ordered=False)
+        invalidate("user", *user_ids)
+        return result.modified_count
+
+    async def run_once(self):
+        try:
+            if not await self.lease.acquire():
+                return
+            corrected = await self.reconcile()
+            self.runs += 1
+            self.corrected += corrected
+            self.last_run_at = time.time()
+            if corrected:
+                logger.info("counter reconciliation corrected %s users", corrected)
+        except Exception as e:
+            self.failed += 1
+            logger.error("counter reconciliation failed: %s", e)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.lease.release()
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "corrected": self.corrected,
+            "lease": self.lease.stats(),
+            "failedRuns": self.failed,
+            "lastRunAt": self.last_run_at,
+            "interval": self.interval,
+        }
+
+
+counter_reconciler = CounterReconciler(
+    interval=settings.COUNTER_RECONCILE_INTERVAL,
+    batch_size=settings.COUNTER_RECONCILE_BATCH
+)
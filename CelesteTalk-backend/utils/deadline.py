@@ -0,0 +1,86 @@
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Optional
+from server.init import settings
+
+logger = logging.getLogger(__name__)
+
+# 当前请求的截止时间（time.monotonic()，与 pymongo.timeout 使用同一时钟），由 DeadlineMiddleware 设置
+deadline_var = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """请求的截止时间已过"""
+
+
+def remaining() -> Optional[float]:
+    """当前请求剩余的秒数，没有截止时间时返回 None"""
+    deadline = deadline_var.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+async def within_deadline(awaitable, timeout: float = None, operation: str = "operation"):
+    """
+    等待 Mongo 以外的外部调用（如 SMTP），最多等待 timeout 秒且不超过请求的截止时间，
+    超时取消调用并抛出 DeadlineExceeded
+    """
+    left = remaining()
+    if left is not None:
+        timeout = left if timeout is None else min(timeout, left)
+    if timeout is None:
+        return await awaitable
+    if timeout <= 0:
+        # 不再发起注定超时的调用
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        deadline_tracker.record_timeout(operation)
+        raise DeadlineExceeded(f"{operation} skipped, deadline already passed")
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        deadline_tracker.record_timeout(operation)
+        raise DeadlineExceeded(f"{operation} timed out after {timeout:.2f}s")
+
+
+def detach(coro) -> asyncio.Task:
+    """
+    在空的上下文中启动后台任务
+
+    asyncio.create_task 会复制当前上下文，请求中启动的刷新、重建等共享任务
+    否则会继承这个请求的截止时间（包括 pymongo.timeout），被一个请求的超时中断。
+    """
+    return contextvars.Context().run(asyncio.ensure_future, coro)
+
+
+class DeadlineTracker:
+    """统计设置了截止时间的请求和超时，超时按路由和外部调用分别计数"""
+
+    def __init__(self):
+        self.requests = 0
+        self.timeouts = 0
+        self.by_route = {}
+        self.by_operation = {}
+
+    def record_request(self):
+        self.requests += 1
+
+    def record_response_timeout(self, route: str):
+        self.timeouts += 1
+        self.by_route[route] = self.by_route.get(route, 0) + 1
+
+    def record_timeout(self, operation: str):
+        self.by_operation[operation] = self.by_operation.get(operation, 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "timeouts": self.timeouts,
+            "timeoutsByRoute": dict(self.by_route),
+            "timeoutsByOperation": dict(self.by_operation),
+            "defaultBudget": settings.REQUEST_TIMEOUT,
+        }
+
+
+deadline_tracker = DeadlineTracker()
@@ -0,0 +1,188 @@
+import logging
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from models.Post import Post
+from models.User import User
+from server.init import settings
+from utils.invalidation import invalidate
+from utils.time import format_datetime_now
+from utils.write_buffer import WriteBuffer
+
+logger = logging.getLogger(__name__)
+
+
+class EngagementBuffer(WriteBuffer):
+    """
+    合并热门帖子的点赞、取消点赞和转发计数，短窗口后以 bulk_write 写入
+
+    同一用户在窗口内对同一帖子的多次操作只保留最终状态，
+    $addToSet / $pull 可重复执行，转发数以 $inc 累加。
+    正在写入的一批在写入完成前仍可读，读接口叠加缓冲区和这一批，用户总能读到自己的操作。
+    缓冲区在每个 worker 进程内，WEB_CONCURRENCY>1 时其他 worker 在刷新落库前看不到这些操作。
+    """
+
+    def __init__(self, interval: float, max_pending: int):
+        super().__init__("engagement buffer", interval, max_pending)
+        # post_id -> {user_id: True(点赞) / False(取消点赞)}
+        self._likes = {}
+        # post_id -> 转发数增量
+        self._reposts = {}
+        # post_id -> 窗口内的变更次数，用于生成 ETag
+        self._versions = {}
+        # user_id -> 用户点赞数 likesCount 的增量
+        self._liker_deltas = {}
+        self._pending = 0
+        # 正在写入的一批：{"likes", "reposts", "versions"}，写入完成后清空
+        self._flushing = None
+
+    def pending(self) -> int:
+        return self._pending
+
+    def pending_like(self, post_id, user_id):
+        """返回尚未落库的点赞状态，没有待写入操作时返回 None"""
+        liked = self._likes.get(post_id, {}).get(user_id)
+        if liked is None and self._flushing is not None:
+            liked = self._flushing["likes"].get(post_id, {}).get(user_id)
+        return liked
+
+    def pending_version(self, post_id) -> int:
+        """帖子在当前窗口内未落库的变更次数，包括正在写入的一批"""
+        version = self._versions.get(post_id, 0)
+        if self._flushing is not None:
+            version += self._flushing["versions"].get(post_id, 0)
+        return version
+
+    def _touch(self, post_id):
+        self._versions[post_id] = self._versions.get(post_id, 0) + 1
+
+    def set_like(self, post_id, user_id, liked: bool):
+        """记录一次点赞状态的变化，调用方保证 liked 与当前状态不同"""
+        self._touch(post_id)
+        self._liker_deltas[user_id] = self._liker_deltas.get(user_id, 0) + (1 if liked else -1)
+        states = self._likes.setdefault(post_id, {})
+        if user_id not in states:
+            self._pending += 1
+        states[user_id] = liked
+        self._maybe_flush_early()
+
+    def add_repost(self, post_id, count: int = 1):
+        self._touch(post_id)
+        self._reposts[post_id] = self._reposts.get(post_id, 0) + count
+        self._pending += 1
+        self._maybe_flush_early()
+
+    def apply_pending(self, post: Post) -> Post:
+        """将未落库的操作（正在写入的一批和缓冲区）叠加到帖子上，用于构建响应"""
+        states = self._likes.get(post.id)
+        reposts = self._reposts.get(post.id, 0)
+        if self._flushing is not None:
+            flushing = self._flushing["likes"].get(post.id)
+            if flushing:
+                # 缓冲区中更新的状态覆盖正在写入的一批
+                states = {**flushing, **states} if states else flushing
+            reposts += self._flushing["reposts"].get(post.id, 0)
+        if states:
+            likes = [user_id for user_id in post.likes if states.get(user_id) is not False]
+            existing = set(likes)
+            likes.extend(user_id for user_id, liked in states.items() if liked and user_id not in existing)
+            post.likes = likes
+        post.repostCount += reposts
+        return post
+
+    def _requeue(self, likes: dict, reposts: dict):
+        """写入失败时放回缓冲区，不覆盖窗口内更新的点赞状态"""
+        for post_id, states in likes.items():
+            self._touch(post_id)
+            current = self._likes.setdefault(post_id, {})
+            for user_id, liked in states.items():
+                if user_id not in current:
+                    current[user_id] = liked
+                    self._pending += 1
+        for post_id, count in reposts.items():
+            self._touch(post_id)
+            self._reposts[post_id] = self._reposts.get(post_id, 0) + count
+            self._pending += 1
+
+    async def _flush_liker_counts(self, deltas: dict):
+        """按状态变化累加用户的 likesCount；$inc 不幂等，失败时不重试，由定期校准修正"""
+        now = format_datetime_now()
+        operations = [
+            UpdateOne({"_id": user_id}, {"$inc": {"likesCount": delta}, "$set": {"updatedAt": now}})
+            for user_id, delta in deltas.items() if delta
+        ]
+        if not operations:
+            return
+        try:
+            await User.get_motor_collection().bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error("engagement buffer failed to update likesCount for %s users: %s", len(operations), e)
+        finally:
+            invalidate("user", *deltas)
+
+    async def _flush(self) -> int:
+        likes, reposts = self._likes, self._reposts
+        self._likes, self._reposts, self._pending = {}, {}, 0
+        # 刷新会更新 updatedAt，新窗口的版本号从 0 开始
+        self._flushing = {"likes": likes, "reposts": reposts, "versions": self._versions}
+        self._versions = {}
+        try:
+            return await self._write(likes, reposts)
+        finally:
+            # 写入成功后已落库；失败的部分已放回缓冲区
+            self._flushing = None
+
+    async def _write(self, likes: dict, reposts: dict) -> int:
+        deltas, self._liker_deltas = self._liker_deltas, {}
+        await self._flush_liker_counts(deltas)
+
+        now = format_datetime_now()
+        operations = []
+        # 每个操作对应的 (类型, 帖子ID)，用于失败时定位
+        targets = []
+        for post_id in set(likes) | set(reposts):
+            states = likes.get(post_id, {})
+            liked = [user_id for user_id, state in states.items() if state]
+            unliked = [user_id for user_id, state in states.items() if not state]
+            update = {"$set": {"updatedAt": now}}
+            if liked:
+                update["$addToSet"] = {"likes": {"$each": liked}}
+            if post_id in reposts:
+                update["$inc"] = {"repostCount": reposts[post_id]}
+            operations.append(UpdateOne({"_id": post_id}, update))
+            targets.append(("main", post_id))
+            # 同一字段不能在一次更新中同时 $addToSet 和 $pull，拆成两个操作
+            if unliked:
+                operations.append(UpdateOne(
+                    {"_id": post_id},
+                    {"$pull": {"likes": {"$in": unliked}}, "$set": {"updatedAt": now}}
+                ))
+                targets.append(("unlike", post_id))
+
+        try:
+            await Post.get_motor_collection().bulk_write(operations, ordered=False)
+        except BulkWriteError as bwe:
+            # 只重试失败的操作
+            failed_likes, failed_reposts = {}, {}
+            for error in bwe.details.get("writeErrors", []):
+                kind, post_id = targets[error["index"]]
+                failed_likes[post_id] = likes.get(post_id, {})
+                if kind == "main" and post_id in reposts:
+                    failed_reposts[post_id] = reposts[post_id]
+            self._requeue(failed_likes, failed_reposts)
+            raise
+        except Exception:
+            # 点赞状态可以安全重试；转发数 $inc 可能已部分写入，不重试以免重复计数
+            self._requeue(likes, {})
+            if reposts:
+                logger.error("engagement buffer lost up to %s repost increments", sum(reposts.values()))
+            raise
+        finally:
+            # bulk_write 绕过了模型钩子，可能已部分写入，一律失效缓存
+            invalidate("post", *(set(likes) | set(reposts)))
+        return sum(len(states) for states in likes.values()) + len(reposts)
+
+
+engagement_buffer = EngagementBuffer(
+    interval=settings.ENGAGEMENT_FLUSH_INTERVAL,
+    max_pending=settings.ENGAGEMENT_MAX_PENDING
+)
@@ -0,0 +1,60 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from utils.pagination import cursor_filter, cursor_sort, next_cursor
+
+# 每次从游标读取的文档数，同时也是写出一次响应块包含的最多行数
+EXPORT_BATCH_SIZE = 500
+
+
+def _encode(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_document(doc: dict) -> dict:
+    """把原始文档转换为可直接返回的 JSON 数据"""
+    return jsonable_encoder(doc, custom_encoder={ObjectId: str, bytes: _encode})
+
+
+async def page_documents(collection, query: dict, projection: Optional[dict],
+                         cursor: Optional[str], limit: int) -> tuple:
+    """按 (createdAt, _id) 倒序分页读取原始文档，返回 (文档列表, 下一页游标)"""
+    query = {**query, **cursor_filter(cursor, ascending=False)}
+    docs = await collection.find(query, projection).sort(cursor_sort(ascending=False)).limit(limit).to_list(length=None)
+    return [encode_document(doc) for doc in docs], next_cursor(docs, limit)
+
+
+async def iter_ndjson(collection, query: dict, projection: Optional[dict], batch_size: int = EXPORT_BATCH_SIZE):
+    """按 _id 顺序遍历游标，每批文档编码为一块 NDJSON，内存占用与集合大小无关"""
+    cursor = collection.find(query, projection).sort("_id", 1).batch_size(batch_size)
+    try:
+        lines = []
+        async for doc in cursor:
+            lines.append(json.dumps(doc, default=_encode, ensure_ascii=False, separators=(",", ":")))
+            if len(lines) >= batch_size:
+                yield ("\n".join(lines) + "\n").encode("utf-8")
+                lines = []
+        if lines:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+    finally:
+        # 客户端中途断开时释放服务端游标
+        await cursor.close()
+
+
+def ndjson_response(collection, query: dict, projection: Optional[dict], filename: str) -> StreamingResponse:
+    """以 application/x-ndjson 流式导出集合，每行一个文档"""
+    return StreamingResponse(
+        iter_ndjson(collection, query, projection),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
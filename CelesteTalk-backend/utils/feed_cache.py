@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from server.init import settings
+from utils.deadline import detach, within_deadline
+
+logger = logging.getLogger(__name__)
+
+
+class FeedEntry:
+    __slots__ = ("body", "post_ids", "expires_at")
+
+    def __init__(self, body: bytes, post_ids: frozenset, expires_at: float):
+        self.body = body
+        self.post_ids = post_ids
+        self.expires_at = expires_at
+
+
+class FeedCache:
+    """
+    缓存主页信息流序列化后的响应体，按 (page, size) 分别缓存
+
+    - 过期后只有一个协程重建（single-flight），其余请求在过期后 stale 秒内直接拿旧数据
+    - 帖子变更时把包含它的页面标记为过期（软过期），下一次请求触发后台重建
+    - ttl 为 0 时关闭缓存
+    """
+
+    def __init__(self, ttl: float, stale: float, max_entries: int):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # key -> 正在进行的重建任务
+        self._inflight = {}
+        # 重建期间发生过失效的 key，重建结果直接视为过期
+        self._dirty = set()
+        # 保留后台任务的引用，避免被回收
+        self._background = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    async def get(self, key, build) -> bytes:
+        """
+        返回 key 对应的响应体，build() 返回 (响应体 bytes, 页面中的帖子ID集合)
+        """
+        if not self.enabled:
+            body, _ = await build()
+            return body
+
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if now < entry.expires_at:
+                self.hits += 1
+                return entry.body
+            if now < entry.expires_at + self.stale:
+                # stale-while-revalidate：返回旧数据，后台重建
+                self.stale_hits += 1
+                self._refresh(key, build)
+                return entry.body
+
+        self.misses += 1
+        # shield：请求被取消或超过截止时间时不影响其他等待同一重建的请求
+        return (await within_deadline(asyncio.shield(self._refresh(key, build)), operation="feed rebuild")).body
+
+    def _refresh(self, key, build) -> asyncio.Future:
+        task = self._inflight.get(key)
+        if task is None:
+            # 重建由多个请求共享，不继承发起请求的截止时间
+            task = detach(self._rebuild(key, build))
+            self._inflight[key] = task
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+            # 后台重建失败时记录日志，等待中的请求自行收到异常
+            task.add_done_callback(self._log_failure)
+        return task
+
+    async def _rebuild(self, key, build) -> FeedEntry:
+        try:
+            body, post_ids = await build()
+            expires_at = time.monotonic() + self.ttl
+            if key in self._dirty:
+                # 重建期间有帖子变更，结果可以返回但不视为新鲜
+                expires_at = time.monotonic()
+            entry = FeedEntry(body, frozenset(post_ids), expires_at)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry
+        finally:
+            self._dirty.discard(key)
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    def _log_failure(task: asyncio.Future):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("feed cache rebuild failed: %s", task.exception())
+
+    def invalidate_post(self, post_id):
+        """帖子变更：软过期包含该帖子的页面"""
+        now = time.monotonic()
+        for entry in self._entries.values():
+            if post_id in entry.post_ids:
+                entry.expires_at = min(entry.expires_at, now)
+        self._dirty.update(self._inflight)
+
+    def invalidate_all(self):
+        """新帖子可能进入任意一页，软过期所有页面"""
+        now = time.monotonic()
+        for entry in self._entries.values():
+            entry.expires_at = min(entry.expires_at, now)
+        self._dirty.update(self._inflight)
+
+    async def wait_idle(self):
+        """等待进行中的后台重建结束，用于关闭应用"""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "staleHits": self.stale_hits,
+            "misses": self.misses,
+            "rebuilding": len(self._inflight),
+            "ttl": self.ttl,
+            "stale": self.stale,
+        }
+
+
+feed_cache = FeedCache(
+    ttl=settings.FEED_CACHE_TTL,
+    stale=settings.FEED_CACHE_STALE,
+    max_entries=settings.FEED_CACHE_MAX_ENTRIES
+)
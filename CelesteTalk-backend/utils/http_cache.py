@@ -0,0 +1,69 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import Request, Response
+from server.init import settings
+
+DEFAULT_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """根据版本信息生成弱 ETag"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def to_utc(dt: datetime) -> datetime:
+    """从 MongoDB 读出的时间不带时区，均为 UTC"""
+    if not dt.tzinfo:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def cache_control(route: str) -> str:
+    """读取路由的 Cache-Control 策略，可通过 CACHE_CONTROL 配置覆盖"""
+    return settings.CACHE_CONTROL.get(route, DEFAULT_CACHE_CONTROL)
+
+
+def validator_headers(route: str, etag: str, last_modified: Optional[datetime]) -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control(route)}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(to_utc(last_modified).replace(microsecond=0), usegmt=True)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """按 RFC 7232 判断条件请求：If-None-Match 优先于 If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        # 弱比较：忽略 W/ 前缀
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag.removeprefix("W/") in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if not since.tzinfo:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP 日期精确到秒
+        return to_utc(last_modified).replace(microsecond=0) <= since
+    return False
+
+
+def conditional_response(request: Request, response: Response, route: str,
+                         etag: str, last_modified: Optional[datetime]) -> Optional[Response]:
+    """
+    资源未变化时返回 304 响应；否则把校验头写入 response 并返回 None，
+    由调用方继续构建完整响应
+    """
+    headers = validator_headers(route, etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
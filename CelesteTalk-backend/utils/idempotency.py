@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from datetime import timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from models.IdempotencyKey import IdempotencyKey
+from server.init import settings
+from utils.time import format_datetime_now
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyStore:
+    """
+    Idempotency-Key 的占位和响应存储
+
+    第一个请求插入 pending 记录占位（唯一索引保证只有一个成功），执行完成后保存响应；
+    重复请求直接返回保存的响应，或等待执行中的请求完成。占位带有效期，
+    执行中的 worker 崩溃后，其他请求在 lockedUntil 之后接手重新执行。记录由 TTL 索引清理。
+    """
+
+    def __init__(self, ttl: float, lock_timeout: float, wait_timeout: float, max_body: int):
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.max_body = max_body
+        self.executed = 0
+        self.replayed = 0
+        self.waited = 0
+        self.takeovers = 0
+        self.conflicts = 0
+        self.errors = 0
+
+    @property
+    def collection(self):
+        return IdempotencyKey.get_motor_collection()
+
+    async def claim(self, ident: dict):
+        """占位成功返回 None；已有记录时返回该记录（已完成，或其他请求正在执行）"""
+        for _ in range(3):
+            now = format_datetime_now()
+            lock = {"lockedUntil": now + timedelta(seconds=self.lock_timeout),
+                    "expiresAt": now + timedelta(seconds=self.ttl)}
+            try:
+                await self.collection.insert_one({
+                    **ident, **lock, "status": "pending", "statusCode": None,
+                    "headers": [], "body": None, "createdAt": now
+                })
+                return None
+            except DuplicateKeyError:
+                pass
+            # 接手崩溃的 worker 留下的过期占位
+            taken = await self.collection.find_one_and_update(
+                {**ident, "status": "pending", "lockedUntil": {"$lt": now}}, {"$set": lock}
+            )
+            if taken is not None:
+                self.takeovers += 1
+                return None
+            existing = await self.collection.find_one(ident)
+            if existing is not None:
+                return existing
+            # 记录在两次查询之间被释放或过期，重新占位
+        raise RuntimeError("Could not claim idempotency key")
+
+    async def complete(self, ident: dict, status_code: int, headers: list, body: bytes) -> dict:
+        self.executed += 1
+        return await self.collection.find_one_and_update(
+            ident,
+            {"$set": {"status": "complete", "statusCode": status_code, "headers": headers, "body": body}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def release(self, ident: dict):
+        """执行失败时删除占位，客户端重试会重新执行"""
+        await self.collection.delete_one({**ident, "status": "pending"})
+
+    async def wait(self, ident: dict):
+        """
+        等待其他 worker 中执行的同一请求完成，返回完成的记录；
+        占位被释放时返回 None，超过 wait_timeout 仍在执行时返回 pending 记录
+        """
+        self.waited += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+        delay = 0.05
+        while True:
+            record = await self.collection.find_one(ident)
+            if record is None or record["status"] == "complete":
+                return record
+            if loop.time() >= deadline:
+                self.conflicts += 1
+                return record
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    def stats(self) -> dict:
+        return {
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "waited": self.waited,
+            "takeovers": self.takeovers,
+            "conflicts": self.conflicts,
+            "errors": self.errors,
+        }
+
+
+idempotency_store = IdempotencyStore(
+    ttl=settings.IDEMPOTENCY_TTL,
+    lock_timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT,
+    wait_timeout=settings.IDEMPOTENCY_WAIT_TIMEOUT,
+    max_body=settings.IDEMPOTENCY_MAX_BODY
+)
@@ -0,0 +1,21 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 命名空间 -> 失效回调列表；模型钩子只依赖本模块，避免与缓存模块循环导入
+_listeners = {}
+
+
+def on_invalidate(namespace: str, callback):
+    """注册失效回调，callback(group) 在数据变更后被调用"""
+    _listeners.setdefault(namespace, []).append(callback)
+
+
+def invalidate(namespace: str, *groups):
+    """通知缓存某个命名空间下的一组或多组数据已变更"""
+    for callback in _listeners.get(namespace, ()):
+        for group in groups:
+            try:
+                callback(group)
+            except Exception as e:
+                logger.error("cache invalidation for %s:%s failed: %s", namespace, group, e)
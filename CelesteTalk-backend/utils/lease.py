@@ -0,0 +1,64 @@
+import logging
+import os
+import socket
+from datetime import timedelta
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from models.Lease import Lease
+from utils.time import format_datetime_now
+
+logger = logging.getLogger(__name__)
+
+# 本进程的标识，重启后不同
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{ObjectId()}"
+
+
+class LeaderLease:
+    """
+    让定期任务在多个 worker 中只由一个执行
+
+    每次执行前调用 acquire()：租约空闲、已到期或本进程持有时取得并续期 ttl 秒，否则跳过本次执行。
+    持有者退出时 release()，其他 worker 在下一次执行时接手；进程崩溃时最多 ttl 秒后接手。
+    一次执行超过 ttl 秒时可能与接手的 worker 重叠，任务本身仍需按文档认领或写入可重复执行。
+    """
+
+    def __init__(self, name: str, ttl: float):
+        self.name = name
+        self.ttl = ttl
+        self.acquired = 0
+        self.skipped = 0
+        self.held = False
+
+    async def acquire(self) -> bool:
+        now = format_datetime_now()
+        try:
+            await Lease.get_motor_collection().find_one_and_update(
+                {"name": self.name, "$or": [{"holder": {"$in": [WORKER_ID, None]}}, {"expiresAt": {"$lt": now}}]},
+                {"$set": {"holder": WORKER_ID, "expiresAt": now + timedelta(seconds=self.ttl)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # 其他 worker 持有未到期的租约
+            if self.held:
+                logger.info("lease %s taken over by another worker", self.name)
+            self.held = False
+            self.skipped += 1
+            return False
+        self.held = True
+        self.acquired += 1
+        return True
+
+    async def release(self):
+        if not self.held:
+            return
+        self.held = False
+        try:
+            await Lease.get_motor_collection().update_one(
+                {"name": self.name, "holder": WORKER_ID},
+                {"$set": {"holder": None}}
+            )
+        except Exception as e:
+            logger.warning("failed to release lease %s: %s", self.name, e)
+
+    def stats(self) -> dict:
+        return {"held": self.held, "acquired": self.acquired, "skipped": self.skipped}
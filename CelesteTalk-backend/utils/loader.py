@@ -0,0 +1,109 @@
+import asyncio
+import contextvars
+import logging
+from beanie.odm.utils.parsing import parse_obj
+from models.Comment import Comment
+from models.Post import Post
+from models.User import User
+from utils.deadline import detach, within_deadline
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentLoader:
+    """
+    按事件循环的一轮合并同一集合的 get 调用
+
+    同一轮内的所有 load(id) 去重后只发一次 $in 查询，再把结果分发给各个调用方。
+    每个调用方拿到各自独立解析的文档，修改或保存互不影响；不跨轮缓存，
+    因此不会读到本轮之前已被修改的旧数据。已删除（带 deletedAt 墓碑）的文档返回 None。需要跨请求缓存时使用 utils.cache。
+    批量查询在空的上下文中执行，不继承第一个调用方的截止时间；每个调用方按自己的截止时间等待结果。
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.batches = 0
+        self.requested = 0
+        self.loaded = 0
+        # id -> 等待该文档的 future 列表
+        self._pending = {}
+        self._scheduled = False
+        # 保留批量查询任务的引用，避免被回收
+        self._tasks = set()
+
+    def _enqueue(self, doc_id) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(doc_id, []).append(future)
+        self.requested += 1
+        if not self._scheduled:
+            # 等当前这一轮中已就绪的协程都登记完再发查询
+            self._scheduled = True
+            loop.call_soon(self._dispatch, context=contextvars.Context())
+        return future
+
+    def _wait(self, awaitable):
+        return within_deadline(awaitable, operation=f"{self.model.__name__} load")
+
+    def _parse(self, raw: dict):
+        # 模型的 before 校验器会修改传入的字典，先复制一份
+        return parse_obj(self.model, dict(raw)) if raw is not None else None
+
+    async def load_raw(self, doc_id) -> dict:
+        """返回原始文档，多个调用方共享同一个字典，不得修改"""
+        return await self._wait(self._enqueue(doc_id))
+
+    async def load(self, doc_id):
+        """与 Model.get(doc_id) 相同，文档不存在时返回 None"""
+        return self._parse(await self._wait(self._enqueue(doc_id)))
+
+    async def load_many_raw(self, doc_ids) -> list:
+        """按顺序返回多个原始文档，不存在的位置为 None，调用方不得修改"""
+        return await self._wait(asyncio.gather(*[self._enqueue(doc_id) for doc_id in doc_ids]))
+
+    async def load_many(self, doc_ids) -> list:
+        """按顺序返回多个文档，不存在的位置为 None，与其他调用合并为一次查询"""
+        raws = await self._wait(asyncio.gather(*[self._enqueue(doc_id) for doc_id in doc_ids]))
+        return [self._parse(raw) for raw in raws]
+
+    def _dispatch(self):
+        batch, self._pending, self._scheduled = self._pending, {}, False
+        task = detach(self._load(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _load(self, batch: dict):
+        self.batches += 1
+        self.loaded += len(batch)
+        try:
+            docs = await self.model.get_motor_collection().find(
+                {"_id": {"$in": list(batch)}}
+            ).to_list(length=None)
+        except Exception as e:
+            logger.error("%s loader query failed: %s", self.model.__name__, e)
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        # 已删除（墓碑）的文档视为不存在
+        docs = {doc["_id"]: doc for doc in docs if not doc.get("deletedAt")}
+        for doc_id, futures in batch.items():
+            raw = docs.get(doc_id)
+            for future in futures:
+                # 调用方已取消
+                if not future.done():
+                    future.set_result(raw)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requested": self.requested,
+            "loaded": self.loaded,
+        }
+
+
+user_loader = DocumentLoader(User)
+post_loader = DocumentLoader(Post)
+comment_loader = DocumentLoader(Comment)
@@ -0,0 +1,160 @@
+import contextvars
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# 当前请求的ID和 ASGI scope，由 RequestContextMiddleware 设置
+request_id_var = contextvars.ContextVar("request_id", default=None)
+request_scope_var = contextvars.ContextVar("request_scope", default=None)
+
+_listener = None
+
+
+def current_route():
+    """返回当前请求匹配到的路由模板，未匹配时返回原始路径"""
+    scope = request_scope_var.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("path")
+
+
+class ContextFilter(logging.Filter):
+    """在调用方线程中把请求上下文写入日志记录，写日志的线程读不到 contextvars"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.requestId = request_id_var.get()
+        record.route = current_route()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    对重复的 WARNING 及以上日志按调用位置限流
+
+    每个调用位置在 window 秒内最多输出 burst 条，其余丢弃；
+    窗口结束后输出的第一条记录带上 suppressed 字段，记录上个窗口丢弃的条数。
+    """
+
+    def __init__(self, burst: int, window: float):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.suppressed = 0
+        # (logger, 文件, 行号) -> [窗口开始时间, 已输出条数, 已丢弃条数]
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING or self.burst <= 0:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                dropped = site[2] if site else 0
+                self._sites[key] = [now, 1, 0]
+                if dropped:
+                    record.suppressed = dropped
+                return True
+            if site[1] < self.burst:
+                site[1] += 1
+                return True
+            site[2] += 1
+            self.suppressed += 1
+            return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """队列满时直接丢弃记录，从不阻塞调用方"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只合并消息参数，异常堆栈留给写日志的线程格式化
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录输出一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "requestId": getattr(record, "requestId", None),
+            "route": getattr(record, "route", None),
+        }
+        suppressed = getattr(record, "suppressed", None)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(requestId)s %(route)s] %(message)s"
+
+
+def build_pipeline(stream=None, fmt: str = "json", queue_size: int = 10000,
+                   sample_burst: int = 10, sample_window: float = 60.0) -> tuple:
+    """构建 (QueueHandler, QueueListener)，监听线程负责格式化和写出"""
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(sample_burst, sample_window))
+    handler.addFilter(ContextFilter())
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    listener = QueueListener(log_queue, output, respect_handler_level=True)
+    return handler, listener
+
+
+def start_logging(settings):
+    """按配置替换根日志的处理器，并启动后台写日志线程"""
+    global _listener
+    stop_logging()
+    handler, listener = build_pipeline(
+        fmt=settings.LOG_FORMAT,
+        queue_size=settings.LOG_QUEUE_SIZE,
+        sample_burst=settings.LOG_SAMPLE_BURST,
+        sample_window=settings.LOG_SAMPLE_WINDOW
+    )
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.LOG_LEVEL.upper())
+    for name, level in settings.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level.upper())
+    listener.start()
+    _listener = listener
+
+
+def stop_logging():
+    """停止后台线程，写出队列中剩余的记录"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,23 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 指标名称 -> 返回当前统计字典的函数
+_sources = {}
+
+
+def register(name: str, stats):
+    """注册一个指标来源，stats() 返回可 JSON 序列化的字典"""
+    _sources[name] = stats
+
+
+def snapshot() -> dict:
+    """汇总所有已注册来源的当前统计，单个来源出错不影响其他来源"""
+    result = {}
+    for name, stats in _sources.items():
+        try:
+            result[name] = stats()
+        except Exception as e:
+            logger.error("Error collecting metrics from %s: %s", name, e)
+            result[name] = None
+    return result
@@ -0,0 +1,222 @@
+import asyncio
+import logging
+from datetime import timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from models.Migration import Migration
+from utils.invalidation import invalidate
+from utils.time import format_datetime_now
+
+logger = logging.getLogger(__name__)
+
+# 每处理这么多批输出一次进度
+LOG_EVERY_BATCHES = 20
+
+
+class MigrationLockedError(RuntimeError):
+    """迁移正由其他进程执行"""
+
+
+class BatchMigration:
+    """
+    按 _id 升序分批处理一个集合的迁移
+
+    plan(batch) 收到一批原始文档（只含 projection 中的字段），返回要对同一集合执行的写操作
+    （UpdateOne 等）。写入之后才保存断点，进程在两者之间崩溃时这一批会重新执行，
+    所以写操作的过滤条件应包含要修改的旧值，重复执行时不会再次修改。
+    """
+
+    def __init__(self, name: str, model, plan, query: dict = None, projection: dict = None,
+                 namespace: str = None, description: str = ""):
+        self.name = name
+        self.model = model
+        self.plan = plan
+        self.query = query or {}
+        self.projection = projection
+        # 写入后按文档ID失效的缓存命名空间
+        self.namespace = namespace
+        self.description = description
+
+    def batch_query(self, last_id) -> dict:
+        if last_id is None:
+            return self.query
+        after = {"_id": {"$gt": last_id}}
+        return {"$and": [self.query, after]} if self.query else after
+
+
+# 名称 -> 迁移，按注册顺序执行
+MIGRATIONS = {}
+
+
+def migration(name: str, model, query: dict = None, projection: dict = None, namespace: str = None):
+    """注册迁移的装饰器，被装饰的函数即 plan(batch)，函数文档作为迁移说明"""
+    def decorator(plan):
+        if name in MIGRATIONS:
+            raise ValueError(f"Migration {name} is already registered")
+        description = (plan.__doc__ or "").strip()
+        MIGRATIONS[name] = BatchMigration(name, model, plan, query, projection, namespace, description)
+        return plan
+    return decorator
+
+
+class Throttle:
+    """限制每秒的操作数（读取的文档数加写操作数），rate <= 0 不限速"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.slept = 0.0
+        self._until = None
+
+    async def wait(self, ops: int):
+        if self.rate <= 0 or ops <= 0:
+            return
+        now = asyncio.get_running_loop().time()
+        # 落后于速率时不累积额度，避免之后突发
+        self._until = max((self._until or now) + ops / self.rate, now)
+        delay = self._until - now
+        if delay > 0:
+            self.slept += delay
+            await asyncio.sleep(delay)
+
+
+class MigrationRunner:
+    """
+    执行已注册的迁移，进度记录在 migrations 集合
+
+    每批按 _id 范围读取 batch_size 个文档，用一次 bulk_write 写入后保存断点（lastId），
+    中断或失败后再次执行从断点继续；已完成的迁移不再执行，restart 时从头开始。
+    同一迁移同时只有一个运行持有执行权，执行权随断点续期，进程崩溃后 lock_timeout 秒内不能接手。
+    dry_run 只读取和计算写操作，不写入数据也不保存断点。
+    """
+
+    def __init__(self, batch_size: int, ops_per_second: float, lock_timeout: float):
+        self.batch_size = batch_size
+        self.ops_per_second = ops_per_second
+        self.lock_timeout = lock_timeout
+
+    @property
+    def collection(self):
+        return Migration.get_motor_collection()
+
+    async def status(self) -> list:
+        """返回所有已注册迁移的说明和执行进度"""
+        records = {record["name"]: record for record in await self.collection.find({}).to_list(length=None)}
+        result = []
+        for name, migration in MIGRATIONS.items():
+            record = records.get(name) or {}
+            result.append({
+                "name": name,
+                "collection": migration.model.get_collection_name(),
+                "description": migration.description,
+                "status": record.get("status", "pending"),
+                "scanned": record.get("scanned", 0),
+                "modified": record.get("modified", 0),
+                "lastId": record.get("lastId"),
+                "error": record.get("error"),
+                "completedAt": record.get("completedAt"),
+            })
+        return result
+
+    async def run(self, migration: BatchMigration, dry_run: bool = False, restart: bool = False) -> dict:
+        """执行一个迁移，返回本次执行后的进度"""
+        record = await self.collection.find_one({"name": migration.name})
+        if record is not None and record["status"] == "complete" and not restart:
+            return {"name": migration.name, "status": "complete", "skipped": True,
+                    "scanned": record["scanned"], "modified": record["modified"]}
+        if dry_run:
+            resume = record is not None and not restart
+            progress = {"lastId": record["lastId"] if resume else None, "scanned": 0, "modified": 0}
+            await self._run_batches(migration, progress, None)
+            return {"name": migration.name, "status": "dry-run", **progress}
+
+        record = await self._claim(migration.name, restart)
+        run_id = record["runId"]
+        progress = {key: record[key] for key in ("lastId", "scanned", "modified")}
+        if progress["lastId"] is not None:
+            logger.info("migration %s resuming after %s", migration.name, progress['lastId'])
+        try:
+            await self._run_batches(migration, progress, run_id)
+        except BaseException as e:
+            # 断点保留，再次执行从 lastId 之后继续
+            await asyncio.shield(self.collection.update_one(
+                {"name": migration.name, "runId": run_id},
+                {"$set": {"status": "failed", "error": str(e) or type(e).__name__, "runId": None,
+                          "lockedUntil": None, "updatedAt": format_datetime_now()}}
+            ))
+            logger.error("migration %s failed after %s documents: %s", migration.name, progress['scanned'], e)
+            raise
+        now = format_datetime_now()
+        await self.collection.update_one(
+            {"name": migration.name, "runId": run_id},
+            {"$set": {"status": "complete", "runId": None, "lockedUntil": None,
+                      "completedAt": now, "updatedAt": now}}
+        )
+        return {"name": migration.name, "status": "complete", **progress}
+
+    async def _claim(self, name: str, restart: bool) -> dict:
+        """取得执行权：记录不存在、未在执行或执行权已过期时成功"""
+        now = format_datetime_now()
+        fresh = {"lastId": None, "scanned": 0, "modified": 0, "startedAt": now, "completedAt": None}
+        update = {
+            "$set": {"status": "running", "runId": ObjectId(), "error": None, "updatedAt": now,
+                     "lockedUntil": now + timedelta(seconds=self.lock_timeout)},
+        }
+        if restart:
+            update["$set"].update(fresh)
+        else:
+            update["$setOnInsert"] = fresh
+        try:
+            return await self.collection.find_one_and_update(
+                {"name": name, "$or": [{"status": {"$ne": "running"}}, {"lockedUntil": {"$lt": now}}]},
+                update,
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            raise MigrationLockedError(f"Migration {name} is already running")
+
+    async def _checkpoint(self, name: str, run_id, progress: dict):
+        now = format_datetime_now()
+        result = await self.collection.update_one(
+            {"name": name, "runId": run_id},
+            {"$set": {**progress, "updatedAt": now, "lockedUntil": now + timedelta(seconds=self.lock_timeout)}}
+        )
+        if result.matched_count == 0:
+            raise MigrationLockedError(f"Migration {name} was taken over by another run")
+
+    async def _run_batches(self, migration: BatchMigration, progress: dict, run_id):
+        """run_id 为 None 时是 dry run，modified 统计将要执行的写操作数"""
+        collection = migration.model.get_motor_collection()
+        throttle = Throttle(self.ops_per_second)
+        batches = 0
+        while True:
+            batch = await collection.find(
+                migration.batch_query(progress["lastId"]), migration.projection
+            ).sort("_id", 1).limit(self.batch_size).to_list(length=None)
+            if not batch:
+                return
+            operations = await migration.plan(batch)
+            if operations and run_id is not None:
+                result = await collection.bulk_write(operations, ordered=False)
+                progress["modified"] += result.modified_count
+                if migration.namespace:
+                    invalidate(migration.namespace, *(doc["_id"] for doc in batch))
+            elif operations:
+                progress["modified"] += len(operations)
+            progress["scanned"] += len(batch)
+            progress["lastId"] = batch[-1]["_id"]
+            if run_id is not None:
+                await self._checkpoint(migration.name, run_id, progress)
+            batches += 1
+            if batches % LOG_EVERY_BATCHES == 0:
+                logger.info(
+                    "migration %s: scanned %s, modified %s, last _id %s",
+                    migration.name, progress["scanned"], progress["modified"], progress["lastId"]
+                )
+            await throttle.wait(len(batch) + len(operations or ()))
+
+
+async def migration_complete(name: str) -> bool:
+    return await Migration.get_motor_collection().find_one({"name": name, "status": "complete"}) is not None
+
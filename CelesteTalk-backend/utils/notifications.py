@@ -0,0 +1,342 @@
+import asyncio
+import logging
+import time
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from models.Email import load_template, send_batch
+from models.Notification import Notification
+from models.User import User
+from server.init import settings
+from utils.lease import LeaderLease
+from utils.pagination import cursor_sort
+from utils.post_data import load_authors
+from utils.pubsub import broker, inbox_topic
+from utils.time import format_datetime_now
+from utils.write_buffer import WriteBuffer
+
+logger = logging.getLogger(__name__)
+
+DIGEST_TEMPLATE = "static/template/notification-digest.html"
+# 每封摘要邮件最多列出的通知数
+DIGEST_MAX_ITEMS = 20
+
+NOTIFICATION_VERBS = {
+    "like": "赞了你的帖子",
+    "repost": "转发了你的帖子",
+    "comment": "评论了你的帖子",
+    "reply": "回复了你的评论",
+    "follow": "关注了你",
+    "mention": "在帖子中提到了你",
+}
+
+
+def notification_text(notification: dict, authors: dict) -> str:
+    """如 "alice 和其他 37 人赞了你的帖子"，操作者已注销时显示为 "有人" """
+    actor_ids = notification.get("actorIds") or []
+    author = authors.get(actor_ids[0]) if actor_ids else None
+    name = author.username if author else "有人"
+    others = notification.get("actorCount", 1) - 1
+    verb = NOTIFICATION_VERBS.get(notification["type"], notification["type"])
+    return f"{name} 和其他 {others} 人{verb}" if others > 0 else f"{name} {verb}"
+
+
+def notification_preferences(user: dict) -> dict:
+    """读取通知设置，旧数据缺少设置时与 User 模型的默认值一致，全部开启"""
+    preferences = (user.get("settings") or {}).get("notifications") or {}
+    return {"email": preferences.get("email", True), "push": preferences.get("push", True)}
+
+
+class NotificationQueue(WriteBuffer):
+    """
+    合并写接口产生的通知事件，定期批量写入收件箱
+
+    事件按 (收件人, 类型, 目标帖子) 合并：窗口内的多次操作只产生一次 upsert，合并到该组的未读通知上，
+    actorCount 累加，actorIds 保留最近 max_actors 位操作者；同一用户取消后再次点赞会被重复计数。
+    写入时读取收件人的通知设置：开启推送的收到 inbox:<id> 实时消息，开启邮件的标记为等待发送摘要。
+    每个收件人只保留最近 inbox_size 条通知。写入失败的组放回缓冲区由下次刷新重试，
+    无法确定是否已写入的错误（如连接中断）也会重试，这时 actorCount 可能被重复累加。
+    进程崩溃时最多丢失一个刷新周期内的事件。
+    """
+
+    def __init__(self, interval: float, max_pending: int, inbox_size: int, max_actors: int):
+        super().__init__("notification queue", interval, max_pending)
+        self.inbox_size = inbox_size
+        self.max_actors = max_actors
+        # (收件人, 类型, 目标) -> {操作者: None}，按发生顺序
+        self._groups = {}
+        self._pending = 0
+        self.emitted = 0
+        self.pushed = 0
+        self.trimmed = 0
+
+    def pending(self) -> int:
+        return self._pending
+
+    def emit(self, user_id, type: str, actor_id, target_id=None):
+        """记录一个通知事件，自己对自己的操作不通知"""
+        if user_id is None or user_id == actor_id:
+            return
+        actors = self._groups.setdefault((user_id, type, target_id), {})
+        if actor_id in actors:
+            # 移到最新的位置
+            del actors[actor_id]
+        else:
+            self._pending += 1
+        actors[actor_id] = None
+        self.emitted += 1
+        self._maybe_flush_early()
+
+    def _requeue(self, groups: dict):
+        """写入失败时把事件放回缓冲区，排在之后发生的同组事件之前"""
+        for key, actors in groups.items():
+            newer = self._groups.get(key, {})
+            merged = {actor_id: None for actor_id in actors if actor_id not in newer}
+            self._pending += len(merged)
+            merged.update(newer)
+            self._groups[key] = merged
+
+    async def _preferences(self, user_ids: list) -> dict:
+        rows = await User.get_motor_collection().find(
+            {"_id": {"$in": user_ids}}, {"settings.notifications": 1}
+        ).to_list(length=None)
+        return {row["_id"]: notification_preferences(row) for row in rows}
+
+    async def _flush(self) -> int:
+        groups, self._groups, self._pending = self._groups, {}, 0
+        try:
+            preferences = await self._preferences(list({user_id for user_id, _, _ in groups}))
+        except Exception:
+            self._requeue(groups)
+            raise
+        now = format_datetime_now()
+        # 与 operations 一一对应，写入失败时据此放回
+        keys, operations = [], []
+        for (user_id, type, target_id), actors in groups.items():
+            preference = preferences.get(user_id)
+            if preference is None:
+                # 收件人已注销
+                continue
+            newest = list(reversed(actors))
+            update = {
+                "$set": {"updatedAt": now},
+                "$setOnInsert": {"createdAt": now},
+                "$inc": {"actorCount": len(newest)},
+                "$push": {"actorIds": {"$each": newest, "$position": 0, "$slice": self.max_actors}},
+            }
+            if preference["email"]:
+                update["$set"]["emailPending"] = True
+            else:
+                update["$setOnInsert"]["emailPending"] = False
+            keys.append((user_id, type, target_id))
+            operations.append(UpdateOne(
+                {"userId": user_id, "type": type, "targetId": target_id, "read": False}, update, upsert=True
+            ))
+        if not operations:
+            return 0
+        try:
+            await self._write(operations)
+        except BulkWriteError as bwe:
+            # 只放回失败的组，已写入的 $inc 不再重复
+            failed = {keys[error["index"]] for error in bwe.details.get("writeErrors", [])}
+            self._requeue({key: groups[key] for key in failed})
+            raise
+        except Exception:
+            self._requeue(groups)
+            raise
+
+        for (user_id, type, target_id), actors in groups.items():
+            if preferences.get(user_id, {}).get("push"):
+                self.pushed += broker.publish(inbox_topic(user_id), "notification", {
+                    "type": type,
+                    "targetId": str(target_id) if target_id else None,
+                    "actorIds": [str(actor_id) for actor_id in reversed(actors)],
+                })
+        await self._trim(list(preferences))
+        return len(operations)
+
+    async def _write(self, operations: list):
+        collection = Notification.get_motor_collection()
+        try:
+            await collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as bwe:
+            # 其他 worker 同时插入了同一组的未读通知，重试一次即合并到该通知上
+            errors = bwe.details.get("writeErrors", [])
+            indexes = [error["index"] for error in errors if error.get("code") == 11000]
+            if len(indexes) < len(errors) or not indexes:
+                raise
+            try:
+                await collection.bulk_write([operations[index] for index in indexes], ordered=False)
+            except BulkWriteError as retry_error:
+                # 换算回 operations 中的位置
+                for error in retry_error.details.get("writeErrors", []):
+                    error["index"] = indexes[error["index"]]
+                raise
+
+    async def _trim(self, user_ids: list):
+        """删除收件箱中超出 inbox_size 的旧通知"""
+        collection = Notification.get_motor_collection()
+        full = await collection.aggregate([
+            {"$match": {"userId": {"$in": user_ids}}},
+            {"$group": {"_id": "$userId", "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": self.inbox_size}}},
+        ]).to_list(length=None)
+        for row in full:
+            old = await collection.find({"userId": row["_id"]}, {"_id": 1}).sort(
+                cursor_sort(False, "updatedAt")
+            ).skip(self.inbox_size).to_list(length=None)
+            result = await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in old]}})
+            self.trimmed += result.deleted_count
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "emitted": self.emitted,
+            "pushed": self.pushed,
+            "trimmed": self.trimmed,
+        }
+
+
+class NotificationDigest:
+    """
+    定期把等待发送的通知合并为每人一封摘要邮件
+
+    每批最多 batch_size 个收件人，一批的邮件通过同一个 SMTP 连接发送；发送成功或已关闭邮件通知的
+    收件人清除 emailPending，发送失败的留到下次。清除时以读到的 actorCount 为条件，
+    发送期间又合并了新操作的通知会在下一封摘要中发送。
+    多个 worker 中只有持有 notification-digest 租约的一个发送，避免同一收件人收到重复的摘要。
+    """
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        # 租约在下一次发送前不会到期，持有者退出后由其他 worker 接手
+        self.lease = LeaderLease("notification-digest", ttl=interval * 2)
+        self.runs = 0
+        self.sent = 0
+        self.failed = 0
+        self.last_run_at = None
+        self._task = None
+
+    async def send_digests(self) -> int:
+        """发送所有等待中的摘要，返回发送的邮件数"""
+        sent = 0
+        while True:
+            batch_sent, more = await self._send_batch()
+            sent += batch_sent
+            if not more:
+                return sent
+
+    async def _send_batch(self) -> tuple:
+        """发送一批摘要，返回 (发送数, 是否应继续下一批)"""
+        collection = Notification.get_motor_collection()
+        rows = await collection.aggregate([
+            {"$match": {"emailPending": True}},
+            {"$group": {"_id": "$userId"}},
+            {"$limit": self.batch_size},
+        ]).to_list(length=None)
+        if not rows:
+            return 0, False
+        user_ids = [row["_id"] for row in rows]
+        users = await User.get_motor_collection().find(
+            {"_id": {"$in": user_ids}}, {"username": 1, "email": 1, "settings.notifications": 1}
+        ).to_list(length=None)
+        users = {user["_id"]: user for user in users}
+        notifications = await collection.find(
+            {"emailPending": True, "userId": {"$in": user_ids}}
+        ).sort(cursor_sort(False, "updatedAt")).to_list(length=None)
+        by_user = {}
+        for notification in notifications:
+            by_user.setdefault(notification["userId"], []).append(notification)
+        authors = await load_authors(
+            notification["actorIds"][0] for notification in notifications if notification.get("actorIds")
+        )
+
+        # 收件地址 -> 用户ID列表，多个账号可能使用同一个邮箱
+        messages, recipients = [], {}
+        for user_id in user_ids:
+            user = users.get(user_id)
+            if user is None or not notification_preferences(user)["email"]:
+                continue
+            items = [
+                {"text": notification_text(notification, authors),
+                 "time": notification["updatedAt"].strftime("%Y-%m-%d %H:%M")}
+                for notification in by_user.get(user_id, [])[:DIGEST_MAX_ITEMS]
+            ]
+            html_content = load_template(DIGEST_TEMPLATE).render(username=user["username"], items=items)
+            messages.append((user["email"], f"你有 {len(by_user.get(user_id, []))} 条新通知", html_content))
+            recipients.setdefault(user["email"], []).append(user_id)
+
+        delivered = await send_batch(messages) if messages else []
+        emailed = {user_id for ids in recipients.values() for user_id in ids}
+        done = {user_id for address in delivered for user_id in recipients[address]}
+        # 已注销或关闭了邮件通知的收件人不再发送
+        done.update(user_id for user_id in user_ids if user_id not in emailed)
+        operations = [
+            UpdateOne(
+                {"_id": notification["_id"], "actorCount": notification["actorCount"]},
+                {"$set": {"emailPending": False}}
+            )
+            for notification in notifications if notification["userId"] in done
+        ]
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+        self.sent += len(delivered)
+        failed = len(messages) - len(delivered)
+        if failed:
+            logger.warning("notification digest failed for %s recipients, retrying next run", failed)
+        # 有发送失败时停止，避免本次运行反复选中同一批收件人
+        return len(delivered), not failed and len(rows) == self.batch_size
+
+    async def run_once(self):
+        try:
+            if not await self.lease.acquire():
+                return
+            sent = await self.send_digests()
+            self.runs += 1
+            self.last_run_at = time.time()
+            if sent:
+                logger.info("sent %s notification digests", sent)
+        except Exception as e:
+            self.failed += 1
+            logger.error("notification digest failed: %s", e)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.lease.release()
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "sent": self.sent,
+            "lease": self.lease.stats(),
+            "failedRuns": self.failed,
+            "lastRunAt": self.last_run_at,
+            "interval": self.interval,
+        }
+
+
+notification_queue = NotificationQueue(
+    interval=settings.NOTIFY_FLUSH_INTERVAL,
+    max_pending=settings.NOTIFY_MAX_PENDING,
+    inbox_size=settings.NOTIFY_INBOX_SIZE,
+    max_actors=settings.NOTIFY_MAX_ACTORS
+)
+notification_digest = NotificationDigest(
+    interval=settings.NOTIFY_DIGEST_INTERVAL,
+    batch_size=settings.NOTIFY_DIGEST_BATCH
+)
@@ -0,0 +1,63 @@
+import base64
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from beanie import PydanticObjectId
+
+# 单页默认条数与上限
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def clamp_limit(limit: int) -> int:
+    """将分页大小限制在 [1, MAX_PAGE_SIZE]"""
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(created_at: datetime, doc_id) -> str:
+    """将 (createdAt, _id) 编码为不透明的游标字符串"""
+    if not created_at.tzinfo:
+        # 从 MongoDB 读出的时间不带时区，均为 UTC
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    millis = int(created_at.timestamp() * 1000)
+    raw = f"{millis}:{doc_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, PydanticObjectId]:
+    """解析游标，格式错误时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        millis, doc_id = base64.urlsafe_b64decode(padded).decode().split(":", 1)
+        # MongoDB 以 UTC 毫秒存储时间，这里同样使用不带时区的 UTC 时间比较
+        created_at = datetime.fromtimestamp(int(millis) / 1000, tz=timezone.utc).replace(tzinfo=None)
+        return created_at, PydanticObjectId(doc_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def cursor_filter(cursor: Optional[str], ascending: bool = True, field: str = "createdAt") -> dict:
+    """生成 (field, _id) 键集分页的查询条件"""
+    if not cursor:
+        return {}
+    created_at, doc_id = decode_cursor(cursor)
+    op = "$gt" if ascending else "$lt"
+    return {"$or": [
+        {field: {op: created_at}},
+        {field: created_at, "_id": {op: doc_id}},
+    ]}
+
+
+def cursor_sort(ascending: bool = True, field: str = "createdAt") -> list:
+    direction = 1 if ascending else -1
+    return [(field, direction), ("_id", direction)]
+
+
+def next_cursor(docs: list, limit: int, field: str = "createdAt") -> Optional[str]:
+    """取满一页时返回下一页游标，否则返回 None"""
+    if len(docs) < limit:
+        return None
+    last = docs[-1]
+    if isinstance(last, dict):
+        return encode_cursor(last[field], last["_id"])
+    return encode_cursor(getattr(last, field), last.id)
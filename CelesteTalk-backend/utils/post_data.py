@@ -0,0 +1,147 @@
+from beanie import PydanticObjectId
+from models.Comment import Comment
+from models.Post import NOT_DELETED, Post
+from models.User import User
+from utils.engagement_buffer import engagement_buffer
+from utils.loader import post_loader
+from utils.read_models import AUTHOR_PROJECTION, AuthorRead, PostRead
+
+# 批量查询接口单次最多接受的ID数
+MAX_BATCH_SIZE = 100
+
+
+def parse_ids(raw_ids: list) -> list:
+    """解析请求中的ID列表，非法ID返回 None 以便按位置报告未命中"""
+    ids = []
+    for raw_id in raw_ids:
+        try:
+            ids.append(PydanticObjectId(raw_id))
+        except Exception:
+            ids.append(None)
+    return ids
+
+
+async def comment_counts(post_ids: list) -> dict:
+    """一次聚合统计多个帖子的评论数"""
+    if not post_ids:
+        return {}
+    rows = await Comment.get_motor_collection().aggregate([
+        {"$match": {"postId": {"$in": post_ids}, **NOT_DELETED}},
+        {"$group": {"_id": "$postId", "count": {"$sum": 1}}},
+    ]).to_list(length=None)
+    return {row["_id"]: row["count"] for row in rows}
+
+
+async def load_authors(author_ids) -> dict:
+    """一次查询加载作者的用户名和头像，返回 {用户ID: AuthorRead}"""
+    author_ids = list(set(author_ids))
+    if not author_ids:
+        return {}
+    rows = await User.get_motor_collection().find(
+        {"_id": {"$in": author_ids}}, AUTHOR_PROJECTION
+    ).to_list(length=None)
+    return {row["_id"]: AuthorRead.from_raw(row) for row in rows}
+
+
+def author_data(author, author_id) -> dict:
+    return {
+        "username": author.username if author else None,
+        "handle": str(author_id),
+        "avatar": author.avatar if author else None
+    }
+
+
+def reference_ids(posts: list) -> list:
+    """一页帖子引用的原帖和被回复帖子的ID，非转发、非回复的帖子没有引用"""
+    return list({ref for post in posts for ref in (post.originalPost, post.replyTo) if ref})
+
+
+async def reference_versions(docs: list) -> list:
+    """
+    原始帖子文档引用的帖子及其作者的版本，供列表和详情的 ETag 使用
+
+    引用的帖子被编辑、删除，或其作者修改资料时嵌入的卡片随之变化，ETag 也要变化。
+    """
+    ref_ids = sorted({doc.get(field) for doc in docs for field in ("originalPost", "replyTo")} - {None})
+    if not ref_ids:
+        return []
+    refs = await Post.get_motor_collection().find(
+        {"_id": {"$in": ref_ids}}, {"authorId": 1, "updatedAt": 1, "deletedAt": 1}
+    ).to_list(length=None)
+    refs = {ref["_id"]: ref for ref in refs}
+    authors = await user_versions(ref["authorId"] for ref in refs.values())
+    versions = []
+    for ref_id in ref_ids:
+        # 已被级联删除的引用没有文档，版本为 None
+        ref = refs.get(ref_id, {})
+        versions.append((ref_id, ref.get("updatedAt"), ref.get("deletedAt"), authors.get(ref.get("authorId"))))
+    return versions
+
+
+async def user_versions(user_ids) -> dict:
+    """一次查询读取用户的 updatedAt，返回 {用户ID: updatedAt}"""
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return {}
+    rows = await User.get_motor_collection().find(
+        {"_id": {"$in": user_ids}}, {"updatedAt": 1}
+    ).to_list(length=None)
+    return {row["_id"]: row["updatedAt"] for row in rows}
+
+
+def last_change(*dates):
+    """版本中最晚的时间，用作 Last-Modified；忽略缺失的时间"""
+    return max((date for date in dates if date), default=None)
+
+
+def reference_card(post: PostRead, author) -> dict:
+    """被引用帖子的精简卡片，只包含渲染卡片需要的字段"""
+    return {
+        "_id": str(post.id),
+        "authorId": str(post.authorId),
+        "content": post.content,
+        "isRepost": post.isRepost,
+        "media": [{"type": media.type, "url": media.url} for media in post.media],
+        "createdAt": post.createdAt.isoformat(),
+        "author": author_data(author, post.authorId)
+    }
+
+
+async def load_reference_cards(posts: list) -> dict:
+    """一次批量加载一页帖子引用的帖子及其作者，返回 {帖子ID: 卡片}；已删除的帖子不返回"""
+    ref_ids = reference_ids(posts)
+    if not ref_ids:
+        return {}
+    refs = [PostRead.from_raw(raw) for raw in await post_loader.load_many_raw(ref_ids) if raw]
+    author_dict = await load_authors(ref.authorId for ref in refs)
+    return {ref.id: reference_card(ref, author_dict.get(ref.authorId)) for ref in refs}
+
+
+def embed_references(post_data: dict, post, cards: dict) -> dict:
+    """在帖子数据中嵌入原帖和被回复帖子的卡片，引用不存在或已删除时为 None"""
+    post_data["refs"] = {
+        "originalPost": cards.get(post.originalPost) if post.originalPost else None,
+        "replyTo": cards.get(post.replyTo) if post.replyTo else None,
+    }
+    return post_data
+
+
+async def hydrate_posts(posts: list) -> list:
+    """为一组只读帖子（PostRead）批量添加作者信息和统计信息"""
+    author_dict = await load_authors(post.authorId for post in posts)
+    counts = await comment_counts([post.id for post in posts])
+    cards = await load_reference_cards(posts)
+
+    posts_data = []
+    for post in posts:
+        engagement_buffer.apply_pending(post)
+        post_data = post.to_dict()
+        post_data["author"] = author_data(author_dict.get(post.authorId), post.authorId)
+        post_data["stats"] = {
+            "likes": len(post.likes),
+            "comments": counts.get(post.id, 0),
+            "shares": post.repostCount,
+            "views": post.views
+        }
+        posts_data.append(embed_references(post_data, post, cards))
+    return posts_data
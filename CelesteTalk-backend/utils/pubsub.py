@@ -0,0 +1,141 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from server.init import settings
+
+logger = logging.getLogger(__name__)
+
+# 主页信息流；单个帖子和单个用户的主题为 post:<id> / user:<id>，用户收到的通知为 inbox:<id>
+FEED_TOPIC = "feed"
+TOPIC_PREFIXES = ("post:", "user:", "inbox:")
+
+
+def post_topic(post_id) -> str:
+    return f"post:{post_id}"
+
+
+def user_topic(user_id) -> str:
+    return f"user:{user_id}"
+
+
+def inbox_topic(user_id) -> str:
+    return f"inbox:{user_id}"
+
+
+def is_valid_topic(topic: str) -> bool:
+    return topic == FEED_TOPIC or any(
+        topic.startswith(prefix) and len(topic) > len(prefix) for prefix in TOPIC_PREFIXES
+    )
+
+
+def encode_event(event: str, data: dict) -> bytes:
+    """编码为一条 SSE 消息"""
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+    return f"event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+class Subscription:
+    """
+    一个连接的订阅，队列有上限，满了丢弃最旧的消息
+
+    慢客户端只会丢失自己的旧消息，不会阻塞发布方或其他连接。
+    """
+
+    def __init__(self, topics: set, max_queue: int):
+        self.topics = topics
+        self.dropped = 0
+        self._queue = deque(maxlen=max_queue)
+        self._ready = asyncio.Event()
+
+    def put(self, message: bytes):
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(message)
+        self._ready.set()
+
+    async def get(self, timeout: float = None) -> list:
+        """等待并取出当前队列中的所有消息，超时返回空列表"""
+        if not self._queue:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        messages = list(self._queue)
+        self._queue.clear()
+        return messages
+
+    def take_dropped(self) -> int:
+        """返回并清零自上次以来丢弃的消息数"""
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class Broker:
+    """进程内的发布/订阅，每条消息只编码一次再分发给所有订阅者"""
+
+    def __init__(self, max_queue: int):
+        self.max_queue = max_queue
+        self.published = 0
+        self.delivered = 0
+        self._topics = {}
+
+    def subscribe(self, topics) -> Subscription:
+        subscription = Subscription(set(topics), self.max_queue)
+        for topic in subscription.topics:
+            self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for topic in subscription.topics:
+            subscribers = self._topics.get(topic)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._topics[topic]
+
+    def publish(self, topic: str, event: str, data: dict) -> int:
+        """发布一条增量消息，返回收到的订阅者数"""
+        subscribers = self._topics.get(topic)
+        self.published += 1
+        if not subscribers:
+            return 0
+        message = encode_event(event, {**data, "topic": topic, "ts": int(time.time() * 1000)})
+        for subscription in subscribers:
+            subscription.put(message)
+        self.delivered += len(subscribers)
+        return len(subscribers)
+
+    def stats(self) -> dict:
+        return {
+            "topics": len(self._topics),
+            "subscriptions": sum(len(subscribers) for subscribers in self._topics.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+
+async def event_stream(subscription: Subscription, heartbeat: float):
+    """
+    把订阅转换为 SSE 字节流
+
+    客户端断开时生成器被取消，由调用方负责退订。
+    丢弃过消息时先发送 dropped 事件，客户端据此重新拉取完整数据。
+    """
+    yield b"retry: 3000\n\n"
+    while True:
+        messages = await subscription.get(timeout=heartbeat)
+        dropped = subscription.take_dropped()
+        if dropped:
+            yield encode_event("dropped", {"count": dropped})
+        if messages:
+            yield b"".join(messages)
+        else:
+            # 注释行作为心跳，防止代理断开空闲连接
+            yield b": ping\n\n"
+
+
+broker = Broker(max_queue=settings.EVENTS_QUEUE_SIZE)
@@ -0,0 +1,59 @@
+import numpy as np
+
+# 热度衰减周期（小时）
+DECAY_HOURS = 72
+MS_PER_HOUR = 3600 * 1000
+
+# 主页候选帖子的列式投影：只取排序需要的字段
+CANDIDATE_PIPELINE = [
+    {"$match": {"deletedAt": None}},
+    {"$project": {
+        "_id": 1,
+        "createdAt": {"$toLong": "$createdAt"},
+        "likeCount": {"$size": {"$ifNull": ["$likes", []]}},
+        "repostCount": {"$ifNull": ["$repostCount", 0]},
+    }}
+]
+
+
+def candidate_columns(docs: list) -> tuple:
+    """将候选文档转换为紧凑列: (ids, createdAt毫秒, 点赞数, 转发数)"""
+    count = len(docs)
+    ids = np.empty(count, dtype=object)
+    created = np.empty(count, dtype=np.int64)
+    likes = np.empty(count, dtype=np.int64)
+    reposts = np.empty(count, dtype=np.int64)
+    for i, doc in enumerate(docs):
+        ids[i] = doc["_id"]
+        created[i] = doc["createdAt"]
+        likes[i] = doc["likeCount"]
+        reposts[i] = doc["repostCount"]
+    return ids, created, likes, reposts
+
+
+def hot_scores(created_ms: np.ndarray, likes: np.ndarray, reposts: np.ndarray, now_ms: int) -> np.ndarray:
+    """向量化计算热度: (点赞数 * 1 + 转发数 * 2) * exp(-小时差 / 72)"""
+    heat = likes + reposts * 2
+    hours = (now_ms - created_ms) / MS_PER_HOUR
+    return heat * np.exp(-hours / DECAY_HOURS)
+
+
+def top_k_indices(scores: np.ndarray, created_ms: np.ndarray, k: int) -> np.ndarray:
+    """只选出分数最高的 k 个下标，按分数降序、同分按发布时间降序排列"""
+    count = len(scores)
+    if k <= 0 or count == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < count:
+        # argpartition 为 O(n)，只对胜出的 k 个做完整排序
+        kth = -np.partition(-scores, k - 1)[k - 1]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)
+        need = k - len(above)
+        if len(ties) > need:
+            # 同分的帖子较多时（如大量零热度帖子）保留最新的
+            ties = ties[np.argpartition(-created_ms[ties], need - 1)[:need]]
+        candidates = np.concatenate([above, ties])
+    else:
+        candidates = np.arange(count)
+    order = np.lexsort((-created_ms[candidates], -scores[candidates]))
+    return candidates[order]
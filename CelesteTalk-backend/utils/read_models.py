@@ -0,0 +1,124 @@
+"""
+列表接口使用的只读模型
+
+Beanie 文档的 model_validator(mode='before') 在每次加载时补全写入时的默认值（取当前时间、
+多次 setdefault），再由 pydantic 逐字段校验。列表接口只读取已写入的数据，不需要这些步骤：
+这里直接从原始文档取值构造 __slots__ 对象，缺失字段使用静态默认值。
+需要保存、修改后写回或触发模型钩子时仍使用 Beanie 文档。
+"""
+from datetime import datetime
+
+
+def _iso(value: datetime):
+    return value.isoformat() if value is not None else None
+
+
+def _str(value):
+    return str(value) if value is not None else None
+
+
+class MediaRead:
+    __slots__ = ("type", "url")
+
+    def __init__(self, type: str, url: str):
+        self.type = type
+        self.url = url
+
+
+class PostRead:
+    """与 Post 字段相同的只读帖子，to_dict() 的结果与 jsonable_encoder(Post) 一致"""
+
+    __slots__ = (
+        "id", "authorId", "content", "createdAt", "isRepost", "media", "likes", "repostCount",
+        "views", "uniqueViews", "originalPost", "replyTo", "updatedAt", "deletedAt",
+    )
+
+    @classmethod
+    def from_raw(cls, raw: dict) -> "PostRead":
+        post = cls.__new__(cls)
+        post.id = raw["_id"]
+        post.authorId = raw["authorId"]
+        post.content = raw["content"]
+        post.createdAt = raw["createdAt"]
+        post.isRepost = raw.get("isRepost", False)
+        post.media = [MediaRead(media["type"], media["url"]) for media in raw.get("media") or ()]
+        # 点赞列表会被 engagement_buffer.apply_pending 替换，不修改原始文档
+        post.likes = list(raw.get("likes") or ())
+        post.repostCount = raw.get("repostCount", 0)
+        post.views = raw.get("views", 0)
+        post.uniqueViews = raw.get("uniqueViews", 0)
+        # 与 Post 校验器相同：旧数据为非转发帖填充的随机原帖ID不返回
+        post.originalPost = raw.get("originalPost") if post.isRepost else None
+        post.replyTo = raw.get("replyTo")
+        post.updatedAt = raw.get("updatedAt") or post.createdAt
+        post.deletedAt = raw.get("deletedAt")
+        return post
+
+    def to_dict(self) -> dict:
+        return {
+            "_id": str(self.id),
+            "authorId": str(self.authorId),
+            "content": self.content,
+            "createdAt": _iso(self.createdAt),
+            "isRepost": self.isRepost,
+            "media": [{"type": media.type, "url": media.url} for media in self.media],
+            "likes": [str(like) for like in self.likes],
+            "repostCount": self.repostCount,
+            "views": self.views,
+            "uniqueViews": self.uniqueViews,
+            "originalPost": _str(self.originalPost),
+            "replyTo": _str(self.replyTo),
+            "updatedAt": _iso(self.updatedAt),
+            "deletedAt": _iso(self.deletedAt),
+        }
+
+
+class CommentRead:
+    """与 Comment 字段相同的只读评论，to_dict() 的结果与 jsonable_encoder(Comment) 一致"""
+
+    __slots__ = ("id", "postId", "authorId", "content", "replyTo", "likes", "deletedAt", "createdAt", "updatedAt")
+
+    @classmethod
+    def from_raw(cls, raw: dict) -> "CommentRead":
+        comment = cls.__new__(cls)
+        comment.id = raw["_id"]
+        comment.postId = raw["postId"]
+        comment.authorId = raw["authorId"]
+        comment.content = raw["content"]
+        comment.replyTo = raw.get("replyTo")
+        comment.likes = raw.get("likes") or []
+        comment.deletedAt = raw.get("deletedAt")
+        comment.createdAt = raw["createdAt"]
+        comment.updatedAt = raw.get("updatedAt") or comment.createdAt
+        return comment
+
+    def to_dict(self) -> dict:
+        return {
+            "_id": str(self.id),
+            "postId": str(self.postId),
+            "authorId": str(self.authorId),
+            "content": self.content,
+            "replyTo": _str(self.replyTo),
+            "likes": [str(like) for like in self.likes],
+            "deletedAt": _iso(self.deletedAt),
+            "createdAt": _iso(self.createdAt),
+            "updatedAt": _iso(self.updatedAt),
+        }
+
+
+# 补全作者信息只需要这两个字段，不加载关注和粉丝列表
+AUTHOR_PROJECTION = {"username": 1, "avatar": 1}
+
+
+class AuthorRead:
+    """帖子和评论的作者信息"""
+
+    __slots__ = ("id", "username", "avatar")
+
+    @classmethod
+    def from_raw(cls, raw: dict) -> "AuthorRead":
+        author = cls.__new__(cls)
+        author.id = raw["_id"]
+        author.username = raw.get("username")
+        author.avatar = raw.get("avatar", "")
+        return author
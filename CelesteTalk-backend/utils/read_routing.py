@@ -0,0 +1,121 @@
+import base64
+import logging
+from contextlib import asynccontextmanager
+import bson
+from beanie.odm.utils.parsing import parse_obj
+from pymongo.read_preferences import Nearest, PrimaryPreferred, Secondary, SecondaryPreferred
+import server.init as server_init
+from server.init import settings
+
+logger = logging.getLogger(__name__)
+
+# 可用的读偏好，maxStalenessSeconds 对 primary 无效
+READ_MODES = {
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+# 客户端回传写入令牌的请求头，读路由到从节点时等待从节点追上该写入
+CAUSAL_TOKEN_HEADER = "X-Causal-Token"
+
+
+class ReadRouter:
+    """
+    按查询类别（feed、search、likes、followers 等）选择读偏好
+
+    未配置的类别读主节点，登录和写入路径不经过这里。读偏好对象按类别缓存，
+    路由后的集合与原集合共用同一个连接池。
+    """
+
+    def __init__(self, preferences: dict, max_staleness: int):
+        self.preferences = preferences
+        self.max_staleness = max_staleness
+        self._modes = {}
+        self.routed = {}
+        self.causal_reads = 0
+
+    def mode(self, query_class: str):
+        """返回查询类别的读偏好，None 表示读主节点"""
+        if query_class not in self._modes:
+            name = self.preferences.get(query_class)
+            mode_class = READ_MODES.get(name)
+            if name and name != "primary" and mode_class is None:
+                logger.warning("unknown read preference %s for %s, reading from primary", name, query_class)
+            self._modes[query_class] = mode_class(max_staleness=self.max_staleness) if mode_class else None
+        return self._modes[query_class]
+
+    def collection(self, model, query_class: str):
+        """返回按查询类别路由的原始集合"""
+        collection = model.get_motor_collection()
+        mode = self.mode(query_class)
+        if mode is None:
+            return collection
+        self.routed[query_class] = self.routed.get(query_class, 0) + 1
+        return collection.with_options(read_preference=mode)
+
+    def stats(self) -> dict:
+        return {
+            "preferences": {name: mode.mongos_mode if mode else "primary" for name, mode in self._modes.items()},
+            "routed": dict(self.routed),
+            "causalReads": self.causal_reads,
+        }
+
+
+async def find_routed(model, query_class: str, query: dict, sort=None, session=None, read_model=None) -> list:
+    """按查询类别路由的 find，返回解析后的模型列表；传入 read_model 时构造只读模型，跳过模型校验"""
+    cursor = read_router.collection(model, query_class).find(query, session=session)
+    if sort:
+        cursor = cursor.sort(sort)
+    raws = await cursor.to_list(length=None)
+    if read_model is not None:
+        return [read_model.from_raw(raw) for raw in raws]
+    return [parse_obj(model, raw) for raw in raws]
+
+
+def encode_causal_token(session) -> str:
+    """把写入会话的 clusterTime 和 operationTime 编码为令牌，单机部署没有这两个值时返回 None"""
+    if session is None or session.operation_time is None or session.cluster_time is None:
+        return None
+    data = bson.encode({"c": session.cluster_time, "o": session.operation_time})
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def decode_causal_token(token: str):
+    """解析令牌，格式错误时返回 None，按普通读处理"""
+    try:
+        data = bson.decode(base64.urlsafe_b64decode(token.encode()))
+        return data["c"], data["o"]
+    except Exception:
+        return None
+
+
+@asynccontextmanager
+async def causal_write_session():
+    """写入使用的因果一致会话，连接不可用时返回 None，写入照常在会话外执行"""
+    if server_init.client is None:
+        yield None
+        return
+    async with await server_init.client.start_session(causal_consistency=True) as session:
+        yield session
+
+
+@asynccontextmanager
+async def causal_read_session(token: str):
+    """
+    读取使用的会话：带有作者写入令牌时推进会话时间，
+    从节点上的读取会等待该节点复制到这次写入之后再返回
+    """
+    times = decode_causal_token(token) if token else None
+    if times is None or server_init.client is None:
+        yield None
+        return
+    async with await server_init.client.start_session(causal_consistency=True) as session:
+        session.advance_cluster_time(times[0])
+        session.advance_operation_time(times[1])
+        read_router.causal_reads += 1
+        yield session
+
+
+read_router = ReadRouter(settings.READ_PREFERENCES, settings.READ_MAX_STALENESS)
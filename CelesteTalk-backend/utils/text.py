@@ -0,0 +1,33 @@
+import re
+
+# \w 匹配 Unicode 字符，中文话题如 #天气 同样有效；前面紧跟字母数字时不算（如邮箱 a@b.com）
+HASHTAG_PATTERN = re.compile(r"(?<![\w#])#(\w{1,50})")
+MENTION_PATTERN = re.compile(r"(?<![\w@])@(\w{1,30})")
+
+# 单条帖子最多记录的话题/提及数，防止刷屏内容写入大量索引
+MAX_TAGS_PER_POST = 20
+
+
+def normalize_tag(tag: str) -> str:
+    """去掉前缀符号并转为小写，作为话题的存储和查询键"""
+    return tag.strip().lstrip("#@").lower()
+
+
+def _unique(matches) -> list:
+    """按规范化后的键去重，保留第一次出现时的原文"""
+    seen = {}
+    for match in matches:
+        seen.setdefault(normalize_tag(match), match)
+        if len(seen) >= MAX_TAGS_PER_POST:
+            break
+    return list(seen.values())
+
+
+def extract_hashtags(content: str) -> list:
+    """按出现顺序返回去重后的话题（小写）"""
+    return [normalize_tag(tag) for tag in _unique(HASHTAG_PATTERN.findall(content or ""))]
+
+
+def extract_mentions(content: str) -> list:
+    """按出现顺序返回去重后的被提及用户名，保留原文大小写用于查找用户"""
+    return _unique(MENTION_PATTERN.findall(content or ""))
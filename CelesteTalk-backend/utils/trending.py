@@ -0,0 +1,249 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne
+from models.PostTag import PostTag
+from models.TagBucket import TagBucket
+from models.User import User
+from server.init import settings
+from utils.notifications import notification_queue
+from utils.text import extract_hashtags, extract_mentions, normalize_tag
+from utils.write_buffer import WriteBuffer
+
+logger = logging.getLogger(__name__)
+
+# 分钟计数的保留时长，需长于热门统计窗口加上汇总的时间范围
+MINUTE_RETENTION = timedelta(hours=3)
+HOUR_RETENTION = timedelta(days=7)
+# 每次最多汇总最近几个完整小时，这些小时的分钟计数都还没有过期
+ROLLUP_HOURS = 2
+# 计算增长率的基线时长（小时）
+BASELINE_HOURS = 24
+
+
+def utc_now() -> datetime:
+    # MongoDB 中的时间为不带时区的 UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def floor_minute(dt: datetime) -> datetime:
+    return dt.replace(second=0, microsecond=0)
+
+
+def floor_hour(dt: datetime) -> datetime:
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+class TagCounter(WriteBuffer):
+    """
+    按 (话题, 分钟) 合并话题使用次数，定期以 bulk_write 的 $inc 写入分钟计数
+
+    多个 worker 写入同一个分钟计数时由唯一索引上的 upsert 合并。
+    """
+
+    def __init__(self, interval: float, max_pending: int):
+        super().__init__("tag counter", interval, max_pending)
+        # (tag, minute) -> 次数
+        self._counts = {}
+        self._pending = 0
+
+    def pending(self) -> int:
+        return self._pending
+
+    def add(self, tags: list, at: datetime = None):
+        """记录一条帖子使用的话题，只修改内存"""
+        minute = floor_minute(at or utc_now())
+        for tag in tags:
+            key = (tag, minute)
+            self._counts[key] = self._counts.get(key, 0) + 1
+            self._pending += 1
+        self._maybe_flush_early()
+
+    async def _flush(self) -> int:
+        counts = self._counts
+        self._counts, self._pending = {}, 0
+        operations = [
+            UpdateOne(
+                {"granularity": "minute", "tag": tag, "start": minute},
+                {
+                    "$inc": {"total": count},
+                    "$setOnInsert": {"hour": floor_hour(minute), "expiresAt": minute + MINUTE_RETENTION}
+                },
+                upsert=True
+            )
+            for (tag, minute), count in counts.items()
+        ]
+        try:
+            await TagBucket.get_motor_collection().bulk_write(operations, ordered=False)
+        except Exception:
+            # $inc 不是幂等的，部分写入后无法安全重试，热门榜只是近似值
+            logger.error("tag counter lost up to %s tag uses", sum(counts.values()))
+            raise
+        return sum(counts.values())
+
+
+class TrendingTracker:
+    """
+    定期汇总小时计数并预先计算热门话题榜，请求直接返回内存中的结果
+
+    热门榜按最近 window_minutes 分钟内的使用次数排序，growth 为相对过去 24 小时平均水平的倍数。
+    小时汇总以 $set 写入重新求和的结果，可重复执行，多个 worker 同时执行互不影响。
+    """
+
+    def __init__(self, interval: float, window_minutes: int, size: int):
+        self.interval = interval
+        self.window_minutes = window_minutes
+        self.size = size
+        self.snapshot = {"tags": [], "windowMinutes": window_minutes, "updatedAt": None}
+        self.refreshed = 0
+        self.failed = 0
+        self._rolled_up_to = None
+        self._task = None
+
+    async def rollup(self, now: datetime):
+        """把已结束的小时的分钟计数汇总为小时计数"""
+        current_hour = floor_hour(now)
+        # 留出一个刷新周期，等待各 worker 写完上一小时的最后几分钟
+        if now - current_hour < timedelta(seconds=settings.TRENDING_FLUSH_INTERVAL * 2):
+            current_hour -= timedelta(hours=1)
+        since = current_hour - timedelta(hours=ROLLUP_HOURS)
+        if self._rolled_up_to is not None:
+            since = max(since, self._rolled_up_to)
+        if since >= current_hour:
+            return
+
+        rows = await TagBucket.get_motor_collection().aggregate([
+            {"$match": {"granularity": "minute", "hour": {"$gte": since, "$lt": current_hour}}},
+            {"$group": {"_id": {"tag": "$tag", "hour": "$hour"}, "count": {"$sum": "$total"}}},
+        ]).to_list(length=None)
+        if rows:
+            await TagBucket.get_motor_collection().bulk_write([
+                UpdateOne(
+                    {"granularity": "hour", "tag": row["_id"]["tag"], "start": row["_id"]["hour"]},
+                    {"$set": {
+                        "total": row["count"],
+                        "hour": row["_id"]["hour"],
+                        "expiresAt": row["_id"]["hour"] + HOUR_RETENTION
+                    }},
+                    upsert=True
+                )
+                for row in rows
+            ], ordered=False)
+        self._rolled_up_to = current_hour
+
+    async def compute(self, now: datetime) -> dict:
+        """统计窗口内使用最多的话题"""
+        collection = TagBucket.get_motor_collection()
+        rows = await collection.aggregate([
+            {"$match": {"granularity": "minute", "start": {"$gte": now - timedelta(minutes=self.window_minutes)}}},
+            {"$group": {"_id": "$tag", "count": {"$sum": "$total"}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": self.size},
+        ]).to_list(length=None)
+
+        baselines = {}
+        if rows:
+            baseline_rows = await collection.aggregate([
+                {"$match": {
+                    "granularity": "hour",
+                    "tag": {"$in": [row["_id"] for row in rows]},
+                    "start": {"$gte": floor_hour(now) - timedelta(hours=BASELINE_HOURS)}
+                }},
+                {"$group": {"_id": "$tag", "count": {"$sum": "$total"}}},
+            ]).to_list(length=None)
+            # 换算为一个统计窗口内的平均次数
+            scale = self.window_minutes / 60 / BASELINE_HOURS
+            baselines = {row["_id"]: row["count"] * scale for row in baseline_rows}
+
+        return {
+            "tags": [
+                {
+                    "tag": row["_id"],
+                    "count": row["count"],
+                    "growth": round(row["count"] / (baselines.get(row["_id"], 0) + 1), 2)
+                }
+                for row in rows
+            ],
+            "windowMinutes": self.window_minutes,
+            "updatedAt": now.replace(tzinfo=timezone.utc).isoformat()
+        }
+
+    async def refresh(self):
+        try:
+            now = utc_now()
+            await self.rollup(now)
+            self.snapshot = await self.compute(now)
+            self.refreshed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error("trending refresh failed: %s", e)
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "tags": len(self.snapshot["tags"]),
+            "updatedAt": self.snapshot["updatedAt"],
+            "refreshes": self.refreshed,
+            "failedRefreshes": self.failed,
+        }
+
+
+async def index_post_tags(post):
+    """发帖后写入话题和提及索引并累计话题计数，失败只记录日志，不影响发帖"""
+    hashtags = extract_hashtags(post.content)
+    mentions = extract_mentions(post.content)
+    if not hashtags and not mentions:
+        return
+    try:
+        users = {}
+        if mentions:
+            rows = await User.get_motor_collection().find(
+                {"username": {"$in": mentions}}, {"username": 1}
+            ).to_list(length=None)
+            users = {normalize_tag(row["username"]): row["_id"] for row in rows}
+
+        tags = [
+            PostTag(tag=tag, kind="hashtag", postId=post.id, authorId=post.authorId, createdAt=post.createdAt)
+            for tag in hashtags
+        ]
+        tags.extend(
+            PostTag(
+                tag=normalize_tag(name), kind="mention", postId=post.id, authorId=post.authorId,
+                userId=users.get(normalize_tag(name)), createdAt=post.createdAt
+            )
+            for name in mentions
+        )
+        await PostTag.insert_many(tags)
+        tag_counter.add(hashtags)
+        for user_id in set(users.values()):
+            notification_queue.emit(user_id, "mention", post.authorId, post.id)
+    except Exception as e:
+        logger.error("Error indexing tags for post %s: %s", post.id, e)
+
+
+tag_counter = TagCounter(
+    interval=settings.TRENDING_FLUSH_INTERVAL,
+    max_pending=settings.TRENDING_MAX_PENDING
+)
+trending_tracker = TrendingTracker(
+    interval=settings.TRENDING_REFRESH_INTERVAL,
+    window_minutes=settings.TRENDING_WINDOW_MINUTES,
+    size=settings.TRENDING_SIZE
+)
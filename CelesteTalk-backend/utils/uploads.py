@@ -0,0 +1,229 @@
+import asyncio
+import os
+import shutil
+import uuid
+from datetime import timedelta
+from pathlib import Path
+import aiofiles
+from bson import ObjectId
+from pymongo import ReturnDocument
+from models.Post import Media
+from models.UploadSession import UploadSession
+from server.init import settings
+from utils.file_handler import UPLOAD_DIR, get_media_type
+from utils.time import format_datetime_now
+
+# 认领一个分片写入的有效期（秒），写入中断后其他请求在此之后才能写同一偏移
+WRITE_CLAIM_SECONDS = 60
+
+
+class UploadOffsetError(ValueError):
+    """分片偏移与服务端已接收的字节数不一致，客户端应从 received 处续传"""
+
+    def __init__(self, received: int):
+        super().__init__(f"Expected chunk at offset {received}")
+        self.received = received
+
+
+class UploadBusyError(RuntimeError):
+    """会话正由其他请求完成"""
+
+
+class UploadManager:
+    """
+    分片上传：按偏移顺序写入临时文件，断线后从已接收的字节数续传，完成后移入上传目录
+
+    进度以数据库中的 received 为准，多个 worker 都可以接收同一会话的分片：写文件前先在数据库中
+    以 received 为条件认领这个偏移，同一会话同时只有一个请求写入。写分片不截断文件，中断的写入
+    留下的多余字节在完成时截断到 size。完成时先把状态改为 completing 再移动文件，并发的完成请求不会重复移动。
+    所有会话共用一个信号量限制同时写磁盘的分片数。
+    """
+
+    def __init__(self, part_dir: str, max_size: int, chunk_size: int, max_concurrent_writes: int, session_ttl: float):
+        self.part_dir = Path(part_dir)
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.session_ttl = session_ttl
+        self._write_slots = asyncio.Semaphore(max_concurrent_writes)
+        # 本进程内正在写入的会话
+        self._writing = set()
+        self.created = 0
+        self.chunks = 0
+        self.bytes_written = 0
+        self.completed = 0
+        self.conflicts = 0
+        self.waiting = 0
+
+    def part_path(self, session_id) -> Path:
+        return self.part_dir / str(session_id)
+
+    def _expires_at(self):
+        return format_datetime_now() + timedelta(seconds=self.session_ttl)
+
+    async def create(self, owner_id, filename: str, content_type: str, size: int) -> UploadSession:
+        media_type = get_media_type(content_type)
+        if not media_type:
+            raise ValueError(f"Invalid file type for {filename}")
+        if size <= 0 or size > self.max_size:
+            raise ValueError(f"File size must be between 1 and {self.max_size} bytes")
+        session = UploadSession(
+            ownerId=owner_id,
+            filename=filename,
+            contentType=content_type,
+            mediaType=media_type,
+            size=size,
+            expiresAt=self._expires_at()
+        )
+        await session.insert()
+        self.part_dir.mkdir(parents=True, exist_ok=True)
+        async with aiofiles.open(self.part_path(session.id), "wb"):
+            pass
+        self.created += 1
+        return session
+
+    async def _conflict(self, session: UploadSession) -> UploadOffsetError:
+        self.conflicts += 1
+        current = await UploadSession.get_motor_collection().find_one({"_id": session.id}, {"received": 1})
+        return UploadOffsetError(current["received"] if current else session.received)
+
+    async def write_chunk(self, session: UploadSession, offset: int, data: bytes) -> int:
+        """在 offset 处写入一个分片，返回写入后已接收的字节数"""
+        if session.status != "uploading":
+            raise ValueError("Upload already completed")
+        if offset != session.received or session.id in self._writing:
+            self.conflicts += 1
+            raise UploadOffsetError(session.received)
+        if not data or offset + len(data) > session.size:
+            raise ValueError("Chunk is empty or exceeds the declared file size")
+
+        collection = UploadSession.get_motor_collection()
+        writer = ObjectId()
+        now = format_datetime_now()
+        # 写文件前认领这个偏移，其他 worker 上持有旧会话的请求不会写同一段
+        claimed = await collection.find_one_and_update(
+            {"_id": session.id, "received": offset, "status": "uploading",
+             "$or": [{"writer": None}, {"writingUntil": {"$lt": now}}]},
+            {"$set": {"writer": writer, "writingUntil": now + timedelta(seconds=WRITE_CLAIM_SECONDS)}},
+            projection={"_id": 1}
+        )
+        if claimed is None:
+            raise await self._conflict(session)
+
+        self._writing.add(session.id)
+        updated = None
+        try:
+            self.waiting += 1
+            try:
+                await self._write_slots.acquire()
+            finally:
+                self.waiting -= 1
+            try:
+                async with aiofiles.open(self.part_path(session.id), "r+b") as part:
+                    await part.seek(offset)
+                    await part.write(data)
+            finally:
+                self._write_slots.release()
+            updated = await collection.find_one_and_update(
+                {"_id": session.id, "writer": writer, "received": offset},
+                {"$set": {"received": offset + len(data), "writer": None, "writingUntil": None,
+                          "updatedAt": format_datetime_now(), "expiresAt": self._expires_at()}},
+                projection={"received": 1},
+                return_document=ReturnDocument.AFTER
+            )
+        finally:
+            self._writing.discard(session.id)
+            if updated is None:
+                # 写入失败或认领已过期被接手，释放认领，客户端从 received 处重试
+                await asyncio.shield(collection.update_one(
+                    {"_id": session.id, "writer": writer}, {"$set": {"writer": None, "writingUntil": None}}
+                ))
+
+        if updated is None:
+            raise await self._conflict(session)
+        self.chunks += 1
+        self.bytes_written += len(data)
+        return updated["received"]
+
+    async def complete(self, session: UploadSession) -> UploadSession:
+        """所有字节到齐后把临时文件移入上传目录，会话的ID即为 mediaId"""
+        if session.status == "complete":
+            return session
+        if session.received != session.size:
+            raise UploadOffsetError(session.received)
+
+        collection = UploadSession.get_motor_collection()
+        # 先在数据库中认领完成操作，只有认领成功的请求移动文件
+        claimed = await collection.find_one_and_update(
+            {"_id": session.id, "status": "uploading", "received": session.size},
+            {"$set": {"status": "completing", "updatedAt": format_datetime_now()}}
+        )
+        if claimed is None:
+            current = await collection.find_one({"_id": session.id})
+            if current is None:
+                raise ValueError("Upload session not found")
+            if current["status"] == "complete":
+                return UploadSession.model_validate(current)
+            if current["status"] == "completing":
+                raise UploadBusyError("Upload is being completed by another request")
+            raise UploadOffsetError(current["received"])
+
+        upload_dir = Path(UPLOAD_DIR) / session.mediaType
+        url = str(upload_dir / f"{uuid.uuid4()}{os.path.splitext(session.filename)[1]}")
+        try:
+            await asyncio.to_thread(self._finish_part, session, upload_dir, url)
+        except BaseException:
+            await asyncio.shield(collection.update_one(
+                {"_id": session.id, "status": "completing"}, {"$set": {"status": "uploading"}}
+            ))
+            raise
+
+        # 完成后在有效期内可被帖子引用，过期后未被引用的文件由清理任务删除
+        updated = await collection.find_one_and_update(
+            {"_id": session.id, "status": "completing"},
+            {"$set": {"status": "complete", "url": url, "updatedAt": format_datetime_now(),
+                      "expiresAt": self._expires_at()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated is None:
+            # 会话在完成期间过期被删除，文件未被引用，由清理任务删除
+            raise ValueError("Upload session not found")
+        self.completed += 1
+        return UploadSession.model_validate(updated)
+
+    def _finish_part(self, session: UploadSession, upload_dir: Path, url: str):
+        # 丢弃中断的写入留下的多余字节
+        os.truncate(self.part_path(session.id), session.size)
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        shutil.move(self.part_path(session.id), url)
+
+    async def media_for(self, owner_id, media_ids: list) -> list:
+        """按顺序返回已完成上传的媒体，只能引用自己上传的文件"""
+        sessions = await UploadSession.get_motor_collection().find(
+            {"_id": {"$in": media_ids}, "ownerId": owner_id, "status": "complete"},
+            {"mediaType": 1, "url": 1}
+        ).to_list(length=None)
+        found = {session["_id"]: session for session in sessions}
+        missing = [str(media_id) for media_id in media_ids if media_id not in found]
+        if missing:
+            raise ValueError(f"Unknown or incomplete media: {', '.join(missing)}")
+        return [Media(type=found[media_id]["mediaType"], url=found[media_id]["url"]) for media_id in media_ids]
+
+    def stats(self) -> dict:
+        return {
+            "created": self.created,
+            "chunks": self.chunks,
+            "bytesWritten": self.bytes_written,
+            "completed": self.completed,
+            "conflicts": self.conflicts,
+            "writing": len(self._writing),
+            "waitingForDisk": self.waiting,
+        }
+
+
+upload_manager = UploadManager(
+    part_dir=settings.UPLOAD_PART_DIR,
+    max_size=settings.UPLOAD_MAX_SIZE,
+    chunk_size=settings.UPLOAD_CHUNK_SIZE,
+    max_concurrent_writes=settings.UPLOAD_MAX_CONCURRENT_WRITES,
+    session_ttl=settings.UPLOAD_SESSION_TTL
+)
@@ -0,0 +1,151 @@
+import logging
+from bson import Binary
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from models.Post import Post
+from models.PostView import PostView
+from server.init import settings
+from utils.hyperloglog import HyperLogLog
+from utils.time import format_datetime_now
+from utils.write_buffer import WriteBuffer
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class ViewBuffer(WriteBuffer):
+    """
+    按帖子合并浏览数，定期以一次 bulk_write 的 $inc 写入
+
+    独立访客数使用 HyperLogLog 估算，草图按帖子存放在 post_views 集合中。
+    多个 worker 并发合并同一草图时通过 rev 字段做乐观锁，冲突的草图留到下次刷新。
+    """
+
+    def __init__(self, interval: float, max_pending: int):
+        super().__init__("view buffer", interval, max_pending)
+        self._counts = {}
+        self._sketches = {}
+        self._pending = 0
+
+    def pending(self) -> int:
+        return self._pending
+
+    def record(self, post_id, viewer: str):
+        """记录一次浏览，只修改内存"""
+        self._counts[post_id] = self._counts.get(post_id, 0) + 1
+        sketch = self._sketches.get(post_id)
+        if sketch is None:
+            sketch = self._sketches[post_id] = HyperLogLog()
+        sketch.add(viewer)
+        self._pending += 1
+        self._maybe_flush_early()
+
+    def _requeue(self, counts: dict, sketches: dict):
+        """写入失败时把数据放回缓冲区"""
+        for post_id, count in counts.items():
+            self._counts[post_id] = self._counts.get(post_id, 0) + count
+            self._pending += count
+        for post_id, sketch in sketches.items():
+            # 只有草图的帖子也计入待写入数，否则没有新浏览时不会再刷新
+            if post_id not in counts:
+                self._pending += 1
+            current = self._sketches.get(post_id)
+            if current is None:
+                self._sketches[post_id] = sketch
+            else:
+                current.merge(sketch)
+
+    async def _merge_sketches(self, sketches: dict) -> tuple:
+        """将内存草图合并进数据库，返回 (合并后的估算值, 冲突的草图)"""
+        collection = PostView.get_motor_collection()
+        stored = await collection.find(
+            {"_id": {"$in": list(sketches)}}
+        ).to_list(length=None)
+        stored = {doc["_id"]: doc for doc in stored}
+
+        now = format_datetime_now()
+        post_ids = []
+        operations = []
+        estimates = {}
+        for post_id, sketch in sketches.items():
+            doc = stored.get(post_id)
+            merged = HyperLogLog(doc["sketch"]) if doc else HyperLogLog()
+            merged.merge(sketch)
+            estimates[post_id] = merged.estimate()
+            post_ids.append(post_id)
+            # 文档不存在或 rev 已变化时 upsert 会触发重复键错误，视为冲突
+            operations.append(UpdateOne(
+                {"_id": post_id, "rev": doc["rev"] if doc else 0},
+                {
+                    "$set": {
+                        "sketch": Binary(merged.to_bytes()),
+                        "uniqueViewers": estimates[post_id],
+                        "updatedAt": now
+                    },
+                    "$inc": {"rev": 1}
+                },
+                upsert=True
+            ))
+
+        conflicts = {}
+        try:
+            await collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as bwe:
+            for error in bwe.details.get("writeErrors", []):
+                if error.get("code") != DUPLICATE_KEY:
+                    raise
+                post_id = post_ids[error["index"]]
+                conflicts[post_id] = sketches[post_id]
+                estimates.pop(post_id, None)
+        return estimates, conflicts
+
+    async def _flush(self) -> int:
+        counts, sketches = self._counts, self._sketches
+        self._counts, self._sketches, self._pending = {}, {}, 0
+
+        try:
+            # 忽略不存在的帖子，避免为其创建草图
+            # 上次冲突放回的草图没有浏览数，按草图查询
+            existing = await Post.get_motor_collection().find(
+                {"_id": {"$in": list(sketches)}}, {"_id": 1}
+            ).to_list(length=None)
+            existing = {doc["_id"] for doc in existing}
+            counts = {post_id: count for post_id, count in counts.items() if post_id in existing}
+            sketches = {post_id: sketch for post_id, sketch in sketches.items() if post_id in existing}
+            if not sketches:
+                return 0
+
+            estimates, conflicts = await self._merge_sketches(sketches)
+        except Exception:
+            # 此时还没有写入浏览数，草图合并可重复执行，全部放回缓冲区
+            self._requeue(counts, sketches)
+            raise
+
+        # 冲突的草图留到下次刷新，浏览数正常写入
+        self._requeue({}, conflicts)
+
+        operations = []
+        for post_id in sketches:
+            update = {}
+            if counts.get(post_id):
+                update["$inc"] = {"views": counts[post_id]}
+            if post_id in estimates:
+                update["$set"] = {"uniqueViews": estimates[post_id]}
+            if update:
+                operations.append(UpdateOne({"_id": post_id}, update))
+        if not operations:
+            return 0
+        try:
+            await Post.get_motor_collection().bulk_write(operations, ordered=False)
+        except Exception:
+            # $inc 不是幂等的，部分写入后无法安全重试，记录丢失的上限
+            logger.error("view buffer lost up to %s views", sum(counts.values()))
+            raise
+        return sum(counts.values())
+
+
+view_buffer = ViewBuffer(
+    interval=settings.VIEW_FLUSH_INTERVAL,
+    max_pending=settings.VIEW_MAX_PENDING
+)
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from utils.deadline import detach
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBuffer(ABC):
+    """
+    在内存中合并写操作并定期批量刷新的基类
+
+    子类实现 pending() 和 _flush()。进程崩溃时最多丢失一个刷新周期
+    （interval 秒）内、且不超过 max_pending 条的未刷新数据。
+    """
+
+    def __init__(self, name: str, interval: float, max_pending: int):
+        self.name = name
+        self.interval = interval
+        self.max_pending = max_pending
+        self.flushed = 0
+        self.failed = 0
+        self.last_flush_at = None
+        self._task = None
+        self._lock = asyncio.Lock()
+        self._early_flush = None
+
+    @abstractmethod
+    def pending(self) -> int:
+        """尚未落库的操作数"""
+
+    @abstractmethod
+    async def _flush(self) -> int:
+        """将缓冲区写入数据库，返回写入的操作数"""
+
+    async def flush(self):
+        # 同一时刻只允许一个刷新在进行
+        async with self._lock:
+            if not self.pending():
+                return
+            try:
+                self.flushed += await self._flush()
+                self.last_flush_at = time.time()
+            except Exception as e:
+                self.failed += 1
+                logger.error("%s flush failed: %s", self.name, e)
+
+    def _maybe_flush_early(self):
+        """缓冲区超过上限时立即安排一次刷新，限制崩溃时的丢失量"""
+        if self.pending() >= self.max_pending and (self._early_flush is None or self._early_flush.done()):
+            # 刷新由请求触发，但不受该请求截止时间的限制
+            self._early_flush = detach(self.flush())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                "%s started: flush every %ss, at most %s pending ops lost on crash",
+                self.name, self.interval, self.max_pending
+            )
+
+    async def stop(self):
+        """停止定时刷新，并把剩余数据写入数据库"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        remaining = self.pending()
+        if remaining:
+            logger.warning("%s stopped with %s pending ops not written", self.name, remaining)
+        else:
+            logger.info("%s drained, %s ops written", self.name, self.flushed)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending(),
+            "flushed": self.flushed,
+            "failedFlushes": self.failed,
+            "lastFlushAt": self.last_flush_at,
+            "flushInterval": self.interval,
+            "maxPending": self.max_pending,
+        }